@@ -0,0 +1,190 @@
+import gc
+import os
+import platform as host_platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+from ..FileInterfaces.GeomInterface import GeomInterface
+from ..FileInterfaces.SkelInterface import SkelInterface
+from ..FileInterfaces.AnimInterface import AnimInterface
+from ..FileInterfaces.PhysInterface import PhysInterface
+from ..FileReaders.Profiler import Profiler
+from .Synthesis import synthesise_geom, synthesise_skel, synthesise_anim, synthesise_phys
+
+
+class BenchmarkCase:
+    """
+    A single synthetic file to benchmark.
+
+    Inputs
+    ------
+    name -- a unique name for the case, used in the results table.
+    filetype -- one of 'geom', 'skel', 'anim', or 'phys'.
+    platform -- the platform to write geom files for; None for other file types.
+    parameters -- keyword arguments for the synthesise_* function of the file type.
+    """
+    def __init__(self, name, filetype, platform=None, **parameters):
+        self.name = name
+        self.filetype = filetype
+        self.platform = platform
+        self.parameters = parameters
+
+    def get_operators(self, skel):
+        """
+        Returns a function that parses the contents of the file into an interface, plus a function that writes an
+        interface back to a file.
+        """
+        if self.filetype == 'geom':
+            return (lambda data, **kwargs: GeomInterface.from_bytes(data, self.platform, **kwargs),
+                    lambda interface, path: interface.to_file(path, self.platform))
+        elif self.filetype == 'skel':
+            return (lambda data, **kwargs: SkelInterface.from_bytes(data, **kwargs),
+                    lambda interface, path: interface.to_file(path))
+        elif self.filetype == 'anim':
+            return (lambda data, **kwargs: AnimInterface.from_bytes(data, skel, **kwargs),
+                    lambda interface, path: interface.to_file(path, skel, False))
+        elif self.filetype == 'phys':
+            return (lambda data, **kwargs: PhysInterface.from_bytes(data, **kwargs),
+                    lambda interface, path: interface.to_file(path))
+        raise ValueError(f"Unknown file type '{self.filetype}'.")
+
+    def synthesise(self):
+        if self.filetype == 'geom':
+            return synthesise_geom(**self.parameters)
+        elif self.filetype == 'skel':
+            return synthesise_skel(**self.parameters)
+        elif self.filetype == 'anim':
+            return synthesise_anim(**self.parameters)
+        elif self.filetype == 'phys':
+            return synthesise_phys(**self.parameters)
+        raise ValueError(f"Unknown file type '{self.filetype}'.")
+
+    def write(self, interface, path, skel):
+        self.get_operators(skel)[1](interface, path)
+
+
+def default_cases(quick=False):
+    """
+    The standard set of benchmark cases. 'quick' gives a much smaller set of files, to check that the suite runs.
+    """
+    scale = 10 if quick else 1
+    cases = []
+    for platform in ('PC', 'PS4', 'Megido'):
+        for vertex_layout in ('minimal', 'full'):
+            cases.append(BenchmarkCase(f'geom_{platform}_{vertex_layout}', 'geom', platform,
+                                       num_meshes=8, num_vertices=5000 // scale, vertex_layout=vertex_layout,
+                                       num_bones=64, max_weights=4))
+    cases.append(BenchmarkCase('skel_256', 'skel', num_bones=256 // scale))
+    for density in (0.1, 0.5):
+        cases.append(BenchmarkCase(f'anim_dense{int(density * 100)}', 'anim',
+                                   num_bones=64, num_frames=600 // scale, density=density))
+    cases.append(BenchmarkCase('phys_64', 'phys', num_bones=64 // scale, colliders_per_bone=2))
+    return cases
+
+
+def time_call(function, repeats):
+    """
+    Returns the return value of 'function' and the fastest of 'repeats' timings of it.
+    """
+    best_time = float('inf')
+    result = None
+    for _ in range(repeats):
+        gc.collect()
+        start_time = time.perf_counter()
+        result = function()
+        best_time = min(best_time, time.perf_counter() - start_time)
+    return result, best_time
+
+
+def get_interpret_time(profiler):
+    """
+    Sums the time spent in the interpret_* sections recorded by 'profiler', counting nested sections only once.
+    """
+    total_time = 0.
+    for record in profiler.get_records():
+        method_names = [frame.split('.')[-1] for frame in record['stack']]
+        if method_names[-1].startswith('interpret_') and \
+                not any([method_name.startswith('interpret_') for method_name in method_names[:-1]]):
+            total_time += record['time']
+    return total_time
+
+
+def run_case(case, skel, directory, repeats=3):
+    """
+    Synthesises the file for 'case', then measures:
+        - read_s: the time to parse the file into an interface, from bytes already in memory
+        - interpret_s: the part of read_s spent in the interpret_* methods of the readers
+        - write_s: the time to write the parsed interface back out to a file
+        - peak_memory_bytes: the peak memory allocated by Python while parsing the file
+    """
+    path = os.path.join(directory, f'{case.name}.{case.filetype}')
+    case.write(case.synthesise(), path, skel)
+    with open(path, 'rb') as F:
+        data = F.read()
+
+    read, write = case.get_operators(skel)
+    interface, read_time = time_call(lambda: read(data), repeats)
+
+    profiler = Profiler()
+    read(data, profiler=profiler)
+    interpret_time = get_interpret_time(profiler)
+
+    gc.collect()
+    tracemalloc.start()
+    read(data)
+    peak_memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    # The phys reader does not interpret its data yet, so the round trip has to start from the synthetic file
+    if case.filetype == 'phys':
+        interface = case.synthesise()
+    round_trip_path = os.path.join(directory, f'{case.name}_round_trip.{case.filetype}')
+    _, write_time = time_call(lambda: write(interface, round_trip_path), repeats)
+
+    return {'case': case.name,
+            'filetype': case.filetype,
+            'platform': case.platform,
+            'parameters': ' '.join([f'{key}={value}' for key, value in case.parameters.items()]),
+            'file_bytes': len(data),
+            'read_s': read_time,
+            'interpret_s': interpret_time,
+            'write_s': write_time,
+            'read_MB_per_s': len(data) / read_time / 1e6,
+            'peak_memory_bytes': peak_memory}
+
+
+def run_benchmarks(cases=None, repeats=3, quick=False, directory=None):
+    """
+    Runs each benchmark case and returns the results as a dict of 'metadata' about the machine the benchmarks were run
+    on, plus a list of 'results' with one row per case.
+    """
+    if cases is None:
+        cases = default_cases(quick)
+
+    with tempfile.TemporaryDirectory() as temp_directory:
+        directory = temp_directory if directory is None else directory
+        os.makedirs(directory, exist_ok=True)
+
+        # The anim files need a skeleton with the right number of bones
+        skels = {}
+        results = []
+        for case in cases:
+            skel = None
+            if case.filetype == 'anim':
+                num_bones = case.parameters.get('num_bones', 32)
+                if num_bones not in skels:
+                    skels[num_bones] = synthesise_skel(num_bones)
+                skel = skels[num_bones]
+            results.append(run_case(case, skel, directory, repeats))
+
+    metadata = {'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'python': sys.version.split()[0],
+                'numpy': np.__version__,
+                'machine': host_platform.platform(),
+                'processor': host_platform.processor(),
+                'repeats': repeats}
+    return {'metadata': metadata, 'results': results}
@@ -0,0 +1,157 @@
+import numpy as np
+
+from ..FileInterfaces.GeomInterface import GeomInterface
+from ..FileInterfaces.SkelInterface import SkelInterface
+from ..FileInterfaces.AnimInterface import AnimInterface
+from ..FileInterfaces.PhysInterface import PhysInterface
+from ..FileReaders.GeomReader.ShaderUniforms import shader_uniforms_from_names
+from ..Utilities.StringHashing import dscs_name_hash
+from ..Utilities.TrackTable import KeyframeTrack
+from ..Utilities.VertexTable import VertexTable
+
+
+# The vertex attributes present in each vertex layout
+vertex_layouts = {'minimal': ('Position', 'Normal', 'UV'),
+                  'standard': ('Position', 'Normal', 'UV', 'Tangent', 'Binormal'),
+                  'full': ('Position', 'Normal', 'UV', 'UV2', 'UV3', 'Colour', 'Tangent', 'Binormal')}
+
+
+def random_unit_vectors(rng, count, dims=3):
+    vectors = rng.normal(size=(count, dims))
+    return vectors / np.linalg.norm(vectors, axis=1)[:, np.newaxis]
+
+
+def make_grid_triangles(num_vertices):
+    """
+    Connects the vertices into a grid of quads, split into two triangles each, as a stand-in for a real mesh surface.
+    """
+    num_columns = max(int(np.ceil(np.sqrt(num_vertices))), 2)
+    num_rows = num_vertices // num_columns
+    triangles = []
+    for row in range(num_rows - 1):
+        for column in range(num_columns - 1):
+            top_left = row * num_columns + column
+            bottom_left = top_left + num_columns
+            triangles.append((top_left, bottom_left, top_left + 1))
+            triangles.append((top_left + 1, bottom_left, bottom_left + 1))
+    return triangles
+
+
+def synthesise_vertices(rng, num_vertices, vertex_layout, num_vertex_groups, max_weights):
+    """
+    Generates a VertexTable of vertices laid out on a slightly perturbed grid, with random attribute values.
+    """
+    num_columns = max(int(np.ceil(np.sqrt(num_vertices))), 2)
+    grid_positions = np.array([(i % num_columns, i // num_columns, 0.) for i in range(num_vertices)], dtype=float)
+    positions = grid_positions / num_columns + rng.normal(scale=0.01, size=(num_vertices, 3))
+    attributes = {'Position': positions,
+                  'Normal': random_unit_vectors(rng, num_vertices),
+                  'UV': rng.random((num_vertices, 2)),
+                  'UV2': rng.random((num_vertices, 2)),
+                  'UV3': rng.random((num_vertices, 2)),
+                  'Colour': rng.random((num_vertices, 4)),
+                  'Tangent': np.hstack([random_unit_vectors(rng, num_vertices), np.ones((num_vertices, 1))]),
+                  'Binormal': random_unit_vectors(rng, num_vertices)}
+
+    vertices = VertexTable({attribute: attributes[attribute] for attribute in vertex_layouts[vertex_layout]})
+
+    max_weights = min(max_weights, num_vertex_groups)
+    bone_ids = []
+    bone_weights = []
+    for i in range(num_vertices):
+        num_weights = 1 + i % max_weights
+        bone_ids.append(rng.choice(num_vertex_groups, num_weights, replace=False))
+        weights = rng.random(num_weights) + 0.1
+        bone_weights.append(weights / np.sum(weights))
+    vertices.set_vertex_groups(bone_ids, bone_weights)
+    return vertices
+
+
+def synthesise_geom(num_meshes=4, num_vertices=1000, vertex_layout='standard', num_bones=32, max_weights=4,
+                    seed=0):
+    """
+    Generates a GeomInterface containing 'num_meshes' meshes of 'num_vertices' vertices each, with the attributes of
+    'vertex_layout' (see 'vertex_layouts') and up to 'max_weights' bone weights per vertex.
+    """
+    rng = np.random.default_rng(seed)
+    interface = GeomInterface()
+    for mesh_idx in range(num_meshes):
+        mesh = interface.add_mesh()
+        mesh.meshflags = 0
+        mesh.name_hash = dscs_name_hash(f"mesh_{mesh_idx}")
+        mesh.material_id = 0
+        mesh.bounding_sphere_radius = 1.
+        mesh.vertex_group_bone_idxs = list(range(num_bones))
+        mesh.vertices = synthesise_vertices(rng, num_vertices, vertex_layout, num_bones, max_weights)
+        mesh.polygons = make_grid_triangles(num_vertices)
+
+    material = interface.add_material()
+    material.name_hash = dscs_name_hash("material_0")
+    material.shader_hex = "088100c1_00880111_00000000_00058000"
+    material.enable_shadows = 1
+    material.shader_uniforms = {'DiffuseColor': shader_uniforms_from_names['DiffuseColor']([1., 1., 1., 1.]),
+                                'ColorSampler': shader_uniforms_from_names['ColorSampler']([0, 0, 0])}
+    interface.texture_data = ['texture_0']
+    interface.inverse_bind_pose_matrices = [np.eye(4) for _ in range(num_bones)]
+    interface.unknown_footer_data = b''
+    return interface
+
+
+def synthesise_skel(num_bones=32, seed=0):
+    """
+    Generates a SkelInterface for a binary tree of 'num_bones' bones.
+    """
+    rng = np.random.default_rng(seed)
+    interface = SkelInterface()
+    interface.num_uv_channels = 0
+    rotations = random_unit_vectors(rng, num_bones, 4)
+    interface.rest_pose = [[list(rotations[i]), [*rng.random(3), 1.], [1., 1., 1., 1.]] for i in range(num_bones)]
+    interface.parent_bones = [(i, (i - 1) // 2) for i in range(num_bones)]
+    interface.bone_name_hashes = [bytes.fromhex(dscs_name_hash(f"bone_{i}")) for i in range(num_bones)]
+    return interface
+
+
+def synthesise_keyframe_frames(rng, num_frames, density):
+    # Always key the first and last frames, so that every track covers the whole animation
+    num_keyframes = min(max(int(round(density * num_frames)), 2), num_frames)
+    inner_frames = rng.choice(np.arange(1, num_frames - 1), num_keyframes - 2, replace=False)
+    return sorted([0, num_frames - 1, *[int(frame) for frame in inner_frames]])
+
+
+def synthesise_anim(num_bones=32, num_frames=300, density=0.25, static_fraction=0.25, seed=0):
+    """
+    Generates an AnimInterface for 'num_bones' bones over 'num_frames' frames. A fraction 'static_fraction' of the
+    transforms have a single keyframe, and the remainder are keyed on a fraction 'density' of the frames.
+    """
+    rng = np.random.default_rng(seed)
+    interface = AnimInterface()
+    interface.playback_rate = 30.
+    interface.num_bones = num_bones
+    for transforms, num_components in ((interface.rotations, 4), (interface.locations, 3), (interface.scales, 3)):
+        for bone_idx in range(num_bones):
+            if rng.random() < static_fraction:
+                frames = [0]
+            else:
+                frames = synthesise_keyframe_frames(rng, num_frames, density)
+            if num_components == 4:
+                values = random_unit_vectors(rng, len(frames), 4)
+            else:
+                values = rng.random((len(frames), num_components))
+            transforms[bone_idx] = KeyframeTrack(frames, values, num_components)
+    return interface
+
+
+def synthesise_phys(num_bones=32, colliders_per_bone=1, seed=0):
+    """
+    Generates a PhysInterface with 'colliders_per_bone' box colliders for each of 'num_bones' bones.
+    """
+    rng = np.random.default_rng(seed)
+    interface = PhysInterface()
+    interface.bone_names = [f"ragdoll_bone_{i}" for i in range(num_bones)]
+    interface.material_names = ["material_0"]
+    for bone_idx in range(num_bones):
+        for _ in range(colliders_per_bone):
+            vertex_positions, triangles = PhysInterface.bound_box_to_mesh(rng.random(3) + 0.1)
+            interface.add_collider(list(rng.random(3)), list(random_unit_vectors(rng, 1, 4)[0]),
+                                   vertex_positions, triangles, 0, bone_idx)
+    return interface
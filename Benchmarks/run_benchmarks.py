@@ -0,0 +1,54 @@
+"""
+Runs the benchmark suite from the command line, without Blender, and writes the results table as JSON or CSV.
+
+Usage: python Benchmarks/run_benchmarks.py [--format json|csv] [--output PATH] [--repeats N] [--quick]
+"""
+import argparse
+import csv
+import importlib
+import json
+import os
+import sys
+import types
+
+
+def import_suite():
+    # The top-level __init__ of the addon imports bpy, so the package is registered without running it
+    package_name = 'DSCSTools'
+    if package_name not in sys.modules:
+        package = types.ModuleType(package_name)
+        package.__path__ = [os.path.dirname(os.path.dirname(os.path.abspath(__file__)))]
+        sys.modules[package_name] = package
+    return importlib.import_module(f'{package_name}.Benchmarks.Suite')
+
+
+def write_results(results, output_format, stream):
+    if output_format == 'json':
+        json.dump(results, stream, indent=4)
+        stream.write('\n')
+    else:
+        writer = csv.DictWriter(stream, fieldnames=list(results['results'][0].keys()))
+        writer.writeheader()
+        writer.writerows(results['results'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks the DSCS file readers and writers on synthetic files.")
+    parser.add_argument('--format', choices=('json', 'csv'), default='json', help="format of the results table")
+    parser.add_argument('--output', default=None, help="file to write the results to; defaults to stdout")
+    parser.add_argument('--repeats', type=int, default=3, help="number of timings to take the fastest of")
+    parser.add_argument('--quick', action='store_true', help="run on small files, to check that the suite works")
+    parser.add_argument('--directory', default=None, help="directory to keep the synthetic files in")
+    args = parser.parse_args()
+
+    suite = import_suite()
+    results = suite.run_benchmarks(repeats=args.repeats, quick=args.quick, directory=args.directory)
+    if args.output is None:
+        write_results(results, args.format, sys.stdout)
+    else:
+        with open(args.output, 'w', newline='') as F:
+            write_results(results, args.format, F)
+
+
+if __name__ == '__main__':
+    main()
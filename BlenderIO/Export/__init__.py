@@ -1,4 +1,3 @@
-import array
 import copy
 import numpy as np
 import os
@@ -19,6 +18,8 @@ from ...Utilities.ActionDataRetrieval import get_action_data
 from ...Utilities.StringHashing import dscs_name_hash
 from ...Utilities.OpenGLResources import id_to_glfunc, glBool_options, glEnable_options, glBlendFunc_options, glBlendEquationSeparate_options, glCullFace_options, glComparison_options
 from ...Utilities.Lists import flip_dict, natural_sort
+from ...Utilities.VertexTable import VertexTable
+from ...Utilities.VertexWelding import weld_loops, assign_local_vertex_groups
 
 from ...Utilities.Paths import normalise_abs_path
 from ..DSCSBlenderUtils import ReportableException
@@ -36,6 +37,9 @@ class ExportMediaVision(bpy.types.Operator):
     vweight_floor: None
     export_anim_mode = None
     generate_physics = None
+    use_triangle_strips = None
+    optimise_vertex_order = None
+    optimise_animation_chunks = None
 
     def export_file(self, context, filepath):
         # Grab the parent object
@@ -89,7 +93,10 @@ class ExportMediaVision(bpy.types.Operator):
         self.clean_up_model(model_data)
         generate_files_from_intermediate_format(filepath, model_data, filename, self.platform,
                                                 animation_only=False,#self.export_mode=="Animation",
-                                                create_physics=self.generate_physics)
+                                                create_physics=self.generate_physics,
+                                                use_triangle_strips=self.use_triangle_strips,
+                                                optimise_vertex_order=self.optimise_vertex_order,
+                                                optimise_animation_chunks=self.optimise_animation_chunks)
 
     def export_skeleton(self, armature, base_animation, model_data):
         bone_name_list = [bone.name for bone in armature.data.bones]
@@ -141,36 +148,25 @@ class ExportMediaVision(bpy.types.Operator):
                 mesh.normals_split_custom_set(res)
                 print(f"Done.")
 
-            link_loops = self.generate_link_loops(mesh)
-            face_link_loops = self.generate_face_link_loops(mesh)
-            export_verts, export_faces, vgroup_verts, vgroup_wgts = self.split_verts_by_loop_data(mesh_obj, link_loops, face_link_loops, model_data, self.vweight_floor)
+            md.vertices, export_faces, vertex_group_bone_ids = self.split_verts_by_loop_data(mesh_obj, model_data, self.vweight_floor)
             if self.flip_uvs:
                 for key in ['UV', 'UV2', 'UV3']:
-                    if key in export_verts[0]:
-                        for vert in export_verts:
-                            u, v = vert[key]
-                            vert[key] = (u, 1. - v)
-
-            # Remap any groups that were culled in the split...
-            old_groups = get_all_nonempty_vertex_groups(mesh_obj)
-            for i, group in enumerate(old_groups):
-                bone_name = group.name
-                bone_id = model_data.skeleton.bone_names.index(bone_name)
-                old_groups[i] = bone_id
-
-            group_map = {old_groups.index(bone_id) : new_idx for new_idx, bone_id in enumerate(vgroup_verts.keys())}
-            if "WeightedBoneID" in export_verts[0]:
-                for vert in export_verts:
-                    vert["WeightedBoneID"] = [group_map[idx] for idx in vert["WeightedBoneID"]]
+                    if key in md.vertices:
+                        md.vertices.attributes[key][:, 1] = 1. - md.vertices.attributes[key][:, 1]
 
             # Now get on with exporting the mesh
-            md.vertices = export_verts
             for j, face in enumerate(export_faces):
                 assert len(face) == 3, f"Polygon {j} is not a triangle."
                 md.add_polygon(face)
 
-            for bone_id in vgroup_verts:
-                md.add_vertex_group(bone_id, vgroup_verts[bone_id], vgroup_wgts[bone_id])
+            for bone_id in vertex_group_bone_ids:
+                md.add_vertex_group(bone_id, [], [])
+            if md.vertices.has_vertex_groups:
+                md.vertices.normalise_vertex_weights()
+                members = md.vertices.get_vertex_group_members(len(md.vertex_groups))
+                for vertex_group, (vertex_indices, weights) in zip(md.vertex_groups, members):
+                    vertex_group.vertex_indices.extend(vertex_indices)
+                    vertex_group.weights.extend(weights)
 
             matname = mesh.materials[0].name
             if matname not in mat_names:
@@ -183,51 +179,35 @@ class ExportMediaVision(bpy.types.Operator):
             md.unknown_data['meshflags'] = 1  # Support this later... # mesh_obj.get('unknown_0x31', 1)
             md.name_hash = mesh_obj.get('name_hash', dscs_name_hash(mesh_obj.name))
 
-    def generate_link_loops(self, mesh):
-        link_loops = {}
-        for loop in mesh.loops:
-            if loop.vertex_index not in link_loops:
-                link_loops[loop.vertex_index] = []
-            link_loops[loop.vertex_index].append(loop.index)
-        return link_loops
-
-    def generate_face_link_loops(self, mesh):
-        face_link_loops = {}
-        for face in mesh.polygons:
-            for loop_idx in face.loop_indices:
-                face_link_loops[loop_idx] = face.index
-        return face_link_loops
-
     def fetch_data(self, obj, element, sigfigs):
         dsize = len(getattr(obj[0], element))
-        data = array.array('f', [0.0] * (len(obj) * dsize))
+        data = np.zeros(len(obj) * dsize, dtype=np.float32)
         obj.foreach_get(element, data)
-        return [tuple(round_to_sigfigs(datum, sigfigs)) for datum in zip(*(iter(data),) * dsize)]
+        return round_to_sigfigs(data.astype(float).reshape((-1, dsize)), sigfigs)
 
     def fetch_tangent(self, obj, sigfigs):
-        dsize = len(getattr(obj[0], "tangent"))
-        data = array.array('f', [0.0] * (len(obj) * dsize))
-        obj.foreach_get("tangent", data)
-
-        signs = array.array('f', [0.0] * (len(obj)))
-        obj.foreach_get("bitangent_sign", data)
-        return [(*round_to_sigfigs(datum, sigfigs), sign) for datum, sign in zip(zip(*(iter(data),) * dsize), signs)]
-
-    def split_verts_by_loop_data(self, mesh_obj, link_loops, face_link_loops, model_data, vweight_floor):
+        tangents = self.fetch_data(obj, "tangent", sigfigs)
+
+        signs = np.zeros(len(obj), dtype=np.float32)
+        obj.foreach_get("bitangent_sign", signs)
+        return np.hstack([tangents, signs.astype(float).reshape((-1, 1))])
+
+    def split_verts_by_loop_data(self, mesh_obj, model_data, vweight_floor):
+        """
+        Creates one exported vertex for each set of loops of a mesh vertex with the same normal, UVs, colour, tangent,
+        and binormal, after rounding these to a few significant figures.
+
+        Returns
+        ------
+        A VertexTable of the exported vertices, with vertex groups given as indices into the returned list of bone ids,
+        the polygons as lists of exported vertex indices, and the list of bone ids.
+        """
         print(">>> Splitting", mesh_obj)
         mesh = mesh_obj.data
         has_uvs = len(mesh.uv_layers) > 0
 
-        exported_vertices = []
-        vgroup_verts = {}
-        vgroup_wgts = {}
-        faces = [{l: mesh.loops[l].vertex_index for l in f.loop_indices} for f in mesh.polygons]
-        group_map = {g.index: i for i, g in enumerate(get_all_nonempty_vertex_groups(mesh_obj))}
-
         map_ids = list(mesh.uv_layers.keys())[:3]
         colour_map = list(mesh.vertex_colors.keys())[:1]
-        n_uvs = len(map_ids)
-        n_colours = len(colour_map)
 
         use_normals = mesh_obj.get("export_normals", True)
         use_tangents = mesh_obj.get("export_tangents", False)
@@ -239,98 +219,54 @@ class ExportMediaVision(bpy.types.Operator):
             mesh.calc_tangents(uvmap=map_name)
 
         sigfigs = 4
-        nloops = len(mesh.loops)
-
-        # Extract normals
+        loop_attributes = {}
         if use_normals:
-            normals = [(elem,) for elem in self.fetch_data(mesh.loops, "normal", sigfigs)]
-        else:
-            normals = [tuple()]*nloops
-
-        # Extract UVs
-        UV_data = [None]*n_uvs
-        for i, map_id in enumerate(map_ids):
-            UV_data[i] = self.fetch_data(mesh.uv_layers[map_id].data, "uv", sigfigs+2)
-        if len(UV_data):
-            UV_data = [tuple(elems) for elems in zip(*UV_data)]
-        else:
-            UV_data = [tuple()]*nloops
-
-        # Extract colours
-        col_data = [None]*n_colours
-        for i, map_id in enumerate(colour_map):
-            col_data[i] = self.fetch_data(mesh.vertex_colors[map_id].data, "color", sigfigs)
-        if len(col_data):
-            col_data = [tuple(elems) for elems in zip(*col_data)]
-        else:
-            col_data = [tuple()]*nloops
-
-        # Extract tangents
+            loop_attributes['Normal'] = self.fetch_data(mesh.loops, "normal", sigfigs)
+        for key, map_id in zip(['UV', 'UV2', 'UV3'], map_ids):
+            loop_attributes[key] = self.fetch_data(mesh.uv_layers[map_id].data, "uv", sigfigs+2)
+        for key, map_id in zip(['Colour'], colour_map):
+            loop_attributes[key] = self.fetch_data(mesh.vertex_colors[map_id].data, "color", sigfigs)
         if can_export_tangents:
-            tangents = [(elem,) for elem in self.fetch_tangent(mesh.loops, sigfigs)]
-        else:
-            tangents = [tuple()]*nloops
-
-        # Calculate binormals
-        if use_binormals and can_export_tangents:
-            bitangents = [(tuple(round_to_sigfigs(tangent[0][3] * np.cross(normal, tangent[0][:3]), sigfigs)),) for normal, tangent in zip(normals, tangents)]
-        else:
-            bitangents = [tuple()]*nloops
-
-        # Make loop -> unique value lookup maps
-        loop_idx_to_key = [key for key in (zip(normals, UV_data, col_data, tangents, bitangents))]
-        unique_val_map = {key: i for i, key in enumerate(list(set(loop_idx_to_key)))}
-        loop_idx_to_unique_key = {i: unique_val_map[key] for i, key in enumerate(loop_idx_to_key)}
-
-        for vert_idx, linked_loops in link_loops.items():
-            vertex = mesh.vertices[vert_idx]
-
-            unique_ids = {i: [] for i in list(set(loop_idx_to_unique_key[ll] for ll in linked_loops))}
-            for ll in linked_loops:
-                unique_ids[loop_idx_to_unique_key[ll]].append(ll)
-            unique_values = [(loop_idx_to_key[lids[0]], lids) for id_, lids in unique_ids.items()]
-
-            for unique_value, loops_with_this_value in unique_values:
-                group_indices = [grp for grp in vertex.groups if grp.weight > vweight_floor]
-                group_bone_ids = [get_bone_id(mesh_obj, model_data.skeleton.bone_names, grp) for grp in group_indices]
-                group_weights = [grp.weight for grp in group_indices]
-
-
-                # Normalise the group weights
-                total_weight = sum(group_weights)
-                if total_weight > 0.:
-                    group_weights = [wght / total_weight for wght in group_weights]
-
-                # Set to None for export if no vertices are left
-                group_bone_ids = None if len(group_bone_ids) == 0 else group_bone_ids
-                group_weights = None if len(group_weights) == 0 else group_weights
-                group_indices = None if len(group_indices) == 0 else group_indices
-
-                vert = {'Position': vertex.co,
-                        **{key: value for key, value in zip(['Normal'], unique_value[0])},
-                        **{key: value for key, value in zip(['UV', 'UV2', 'UV3'], unique_value[1])},
-                        **{key: value for key, value in zip(['Colour'], unique_value[2])},
-                        **{key: value for key, value in zip(['Tangent'], unique_value[3])},
-                        **{key: value for key, value in zip(['Binormal'], unique_value[4])},
-                        'WeightedBoneID': [group_map[grp.group] for grp in group_indices],
-                        'BoneWeight': group_weights}
-
-                n_verts = len(exported_vertices)
-                exported_vertices.append(vert)
-
-                for l in loops_with_this_value:
-                    face_idx = face_link_loops[l]
-                    faces[face_idx][l] = n_verts
-
-                if group_bone_ids is not None:
-                    for group_bone_id, weight in zip(group_bone_ids, group_weights):
-                        if group_bone_id not in vgroup_verts:
-                            vgroup_verts[group_bone_id] = []
-                            vgroup_wgts[group_bone_id] = []
-                        vgroup_verts[group_bone_id].append(n_verts)
-                        vgroup_wgts[group_bone_id].append(weight)
-        faces = [list(face_verts.values()) for face_verts in faces]
-        return exported_vertices, faces, vgroup_verts, vgroup_wgts
+            tangents = self.fetch_tangent(mesh.loops, sigfigs)
+            loop_attributes['Tangent'] = tangents
+            if use_binormals:
+                binormals = tangents[:, 3:] * np.cross(loop_attributes['Normal'], tangents[:, :3])
+                loop_attributes['Binormal'] = round_to_sigfigs(binormals, sigfigs)
+
+        # Weld the loops into vertices
+        loop_vertex_idxs = np.zeros(len(mesh.loops), dtype=np.int32)
+        mesh.loops.foreach_get("vertex_index", loop_vertex_idxs)
+        first_loops, loop_vertices = weld_loops(loop_vertex_idxs, list(loop_attributes.values()))
+
+        # Vertex groups cannot be fetched with foreach_get, so they are gathered once per mesh vertex rather than per loop
+        positions = np.zeros(len(mesh.vertices) * 3, dtype=np.float32)
+        mesh.vertices.foreach_get("co", positions)
+        mesh_vertices = VertexTable({'Position': positions.reshape((-1, 3))})
+        group_bone_ids = {}
+        bone_ids = []
+        bone_weights = []
+        for vertex in mesh.vertices:
+            groups = [grp for grp in vertex.groups if grp.weight > vweight_floor]
+            for grp in groups:
+                if grp.group not in group_bone_ids:
+                    group_bone_ids[grp.group] = get_bone_id(mesh_obj, model_data.skeleton.bone_names, grp)
+            bone_ids.append([group_bone_ids[grp.group] for grp in groups])
+            bone_weights.append([grp.weight for grp in groups])
+        mesh_vertices.set_vertex_groups(bone_ids, bone_weights)
+
+        vertices = mesh_vertices.take(loop_vertex_idxs[first_loops])
+        for key, data in loop_attributes.items():
+            vertices.set_attribute(key, data[first_loops])
+        vertex_group_bone_ids = assign_local_vertex_groups(vertices)
+
+        loop_starts = np.zeros(len(mesh.polygons), dtype=np.int64)
+        loop_totals = np.zeros(len(mesh.polygons), dtype=np.int64)
+        mesh.polygons.foreach_get("loop_start", loop_starts)
+        mesh.polygons.foreach_get("loop_total", loop_totals)
+        face_ends = np.cumsum(loop_totals)
+        face_loops = np.repeat(loop_starts - face_ends + loop_totals, loop_totals) + np.arange(face_ends[-1] if len(face_ends) else 0)
+        faces = [face.tolist() for face in np.split(loop_vertices[face_loops], face_ends[:-1])]
+        return vertices, faces, vertex_group_bone_ids
 
     def export_materials(self, model_data, used_materials, used_textures):
         tex_names = []
@@ -558,11 +494,8 @@ class ExportMediaVision(bpy.types.Operator):
             for i, mesh in enumerate(model_data.meshes):
                 if self.vweights_adjust == "Pad4":
                     width = 4
-                    if "WeightedBoneID" in mesh.vertices[0]:
-                        for i, vertex in enumerate(mesh.vertices):
-                            vertex["WeightedBoneID"] = [*vertex["WeightedBoneID"], *([0] * (width - len(vertex["WeightedBoneID"])))]
-                            vertex["BoneWeight"] = [*vertex["BoneWeight"], *([0.] * (width - len(vertex["BoneWeight"])))]
-                            mesh.vertices[i] = vertex
+                    if mesh.vertices.has_vertex_groups:
+                        mesh.vertices.pad_vertex_groups(width)
 
                 key = (mesh.material_id, get_required_shader_width(mesh))
                 if key not in all_required_materials:
@@ -588,7 +521,7 @@ class ExportMediaVision(bpy.types.Operator):
 
 
 def get_required_shader_width(mesh):
-    n_verts = max([len(vtx['WeightedBoneID']) if vtx['WeightedBoneID'] is not None else 0 for vtx in mesh.vertices])
+    n_verts = mesh.vertices.max_vertex_groups
     n_verts = 0 if len(mesh.vertex_groups) == 1 else n_verts
     return f"{0x40 + 8 * n_verts:0>2X}"
 
@@ -881,6 +814,21 @@ class ExportDSCS(ExportMediaVision, ExportHelper):
         description="Whether to create a PHYS file from the model. Only used for Map models."
     )
 
+    use_triangle_strips: BoolProperty(
+        name="Use Triangle Strips",
+        description="Writes each mesh's polygons as a triangle strip when this is smaller than a triangle list."
+    )
+
+    optimise_vertex_order: BoolProperty(
+        name="Optimise Vertex Order",
+        description="Reorders each mesh's triangles and vertices so that the GPU can reuse more transformed vertices when rendering."
+    )
+
+    optimise_animation_chunks: BoolProperty(
+        name="Optimise Animation Chunks",
+        description="Chooses where to split each animation into keyframe chunks so that the exported animation files are as small as possible."
+    )
+
 
 class ExportMegido(ExportMediaVision, ExportHelper):
     bl_idname = 'export_file.export_megido'
@@ -909,3 +857,18 @@ class ExportMegido(ExportMediaVision, ExportHelper):
         items=[("As Required", "As Required", "Recalculates normals for meshes with invalid loop normals", "", 0),
                ("Always", "Always", "Recalculates loop normals for every mesh", "", 1),
                ("Never", "Never", "Exports whatever loop normals Blender holds, even if they are zero", "", 2)])
+
+    use_triangle_strips: BoolProperty(
+        name="Use Triangle Strips",
+        description="Writes each mesh's polygons as a triangle strip when this is smaller than a triangle list."
+    )
+
+    optimise_vertex_order: BoolProperty(
+        name="Optimise Vertex Order",
+        description="Reorders each mesh's triangles and vertices so that the GPU can reuse more transformed vertices when rendering."
+    )
+
+    optimise_animation_chunks: BoolProperty(
+        name="Optimise Animation Chunks",
+        description="Chooses where to split each animation into keyframe chunks so that the exported animation files are as small as possible."
+    )
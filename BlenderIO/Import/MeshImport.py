@@ -1,12 +1,12 @@
 import bpy
-from mathutils import Vector, Matrix
+from mathutils import Matrix
 import array
 
 import numpy as np
 
 
-def set_mesh_vertex_attribute_labels(vert, mesh):
-    attributes = set(list(vert.keys()))
+def set_mesh_vertex_attribute_labels(vertices, mesh):
+    attributes = set(list(vertices.keys()))
     mesh['export_normals'] = 'Normal' in attributes
     mesh['export_tangents'] = 'Tangent' in attributes
     mesh['export_binormals'] = 'Binormal' in attributes
@@ -41,7 +41,7 @@ def import_meshes(parent_obj, filename, model_data, armature_name, merge_vertice
                 map_of_loops_to_model_verts[loop_idx] = old_vert_idx
                 # map_of_model_verts_to_blender_verts[old_vert_idx] = new_vert_idx
 
-        loop_data = [IF_mesh.vertices[map_of_loops_to_model_verts[loop_idx]] for loop_idx in range(n_loops)]
+        loop_data = IF_mesh.vertices.take([map_of_loops_to_model_verts[loop_idx] for loop_idx in range(n_loops)])
 
         # Assign materials
         material_name = model_data.materials[IF_mesh.material_id].name
@@ -50,16 +50,14 @@ def import_meshes(parent_obj, filename, model_data, armature_name, merge_vertice
 
         # Assign UVs
         for uv_type in ['UV', 'UV2', 'UV3']:
-            if uv_type in IF_mesh.vertices[0]:
+            if uv_type in IF_mesh.vertices:
                 uv_layer = mesh.uv_layers.new(name=f"{uv_type}Map", do_init=True)
-                for loop_idx, loop in enumerate(mesh.loops):
-                    uv_layer.data[loop_idx].uv = loop_data[loop_idx][uv_type]
+                uv_layer.data.foreach_set("uv", loop_data.attributes[uv_type].astype(np.float32).ravel())
 
         # Assign vertex colours
-        if 'Colour' in IF_mesh.vertices[0]:
+        if 'Colour' in IF_mesh.vertices:
             colour_map = mesh.vertex_colors.new(name=f"Map", do_init=True)
-            for loop_idx, loop in enumerate(mesh.loops):
-                colour_map.data[loop_idx].color = loop_data[loop_idx]['Colour']
+            colour_map.data.foreach_set("color", loop_data.attributes['Colour'].astype(np.float32).ravel())
 
         # Rig the vertices
         vertex_groups = make_vertex_groups(new_verts, [vg.bone_idx for vg in IF_mesh.vertex_groups])
@@ -79,14 +77,13 @@ def import_meshes(parent_obj, filename, model_data, armature_name, merge_vertice
         # Works thanks to this stackexchange answer https://blender.stackexchange.com/a/75957
         # which a few of these comments below are also taken from
         # Do this LAST because it can remove some loops
-        if 'Normal' in IF_mesh.vertices[0]:
+        if 'Normal' in IF_mesh.vertices:
             mesh.create_normals_split()
             for face in mesh.polygons:
                 face.use_smooth = True  # loop normals have effect only if smooth shading ?
 
             # Set loop normals
-            loop_normals = [Vector(l["Normal"]) for l in loop_data]
-            mesh.loops.foreach_set("normal", [subitem for item in loop_normals for subitem in item])
+            mesh.loops.foreach_set("normal", loop_data.attributes["Normal"].astype(np.float32).ravel())
 
             mesh.validate(clean_customdata=False)  # important to not remove loop normals here!
             mesh.update()
@@ -107,7 +104,7 @@ def import_meshes(parent_obj, filename, model_data, armature_name, merge_vertice
             mesh.use_auto_smooth = True
 
         mesh.validate(verbose=True, clean_customdata=False)
-        set_mesh_vertex_attribute_labels(IF_mesh.vertices[0], mesh_object)
+        set_mesh_vertex_attribute_labels(IF_mesh.vertices, mesh_object)
         mesh.update()
 
     # Top-level unknown data
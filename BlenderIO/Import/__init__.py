@@ -5,6 +5,7 @@ import os
 from bpy.props import BoolProperty, EnumProperty, CollectionProperty
 from bpy_extras.io_utils import ImportHelper
 from ...CollatedData.FromReadWrites import generate_intermediate_format_from_files
+from ...CollatedData.ModelCache import ModelCache
 from .AnimationImport import import_animations
 from .ArmatureImport import import_skeleton
 from .MaterialImport import import_materials
@@ -20,12 +21,21 @@ class ImportMediaVision(bpy.types.Operator):
     img_to_dds = None
     use_custom_nodes = None
     merge_vertices = None
+    validation_level = None
+    use_cache = None
 
     files: CollectionProperty(type=bpy.types.PropertyGroup)
 
     def import_file(self, context, filepath):
         bpy.ops.object.select_all(action='DESELECT')
-        model_data = generate_intermediate_format_from_files(filepath, self.platform, self.import_anims)
+        cache = None
+        if self.use_cache:
+            try:
+                cache = ModelCache()
+            except PermissionError as e:
+                print(f"Not using the model cache: {e}")
+        model_data = generate_intermediate_format_from_files(filepath, self.platform, self.import_anims,
+                                                             self.validation_level, cache)
         filename = os.path.split(filepath)[-1]
         armature_name = filename + "_armature"
         parent_obj = bpy.data.objects.new(filename, None)
@@ -125,6 +135,19 @@ class ImportDSCS(ImportMediaVision, ImportHelper):
         default=True
     )
 
+    validation_level: EnumProperty(
+        name="File Validation",
+        description="How strictly to check that the files match the expected file format.",
+        items=[("strict", "Strict", "Stop at the first unexpected value in the files", "", 0),
+               ("deferred", "Report All", "Read the whole file, then report every unexpected value found", "", 1),
+               ("trusted", "None", "Skip the checks. Faster, but only use this on unmodified game files", "", 2)])
+
+    use_cache: BoolProperty(
+        name="Use Model Cache",
+        description="Keep a copy of the parsed files on disk, so that re-importing unchanged files is faster.",
+        default=False
+    )
+
 
 class ImportMegido(ImportMediaVision, ImportHelper):
     bl_idname = 'import_file.import_megido'
@@ -161,4 +184,17 @@ class ImportMegido(ImportMediaVision, ImportHelper):
         name="Merge Vertices",
         description="Merge the OpenGL vertices (which look like duplicates in Blender) to Blender vertices.",
         default=True
+    )
+
+    validation_level: EnumProperty(
+        name="File Validation",
+        description="How strictly to check that the files match the expected file format.",
+        items=[("strict", "Strict", "Stop at the first unexpected value in the files", "", 0),
+               ("deferred", "Report All", "Read the whole file, then report every unexpected value found", "", 1),
+               ("trusted", "None", "Skip the checks. Faster, but only use this on unmodified game files", "", 2)])
+
+    use_cache: BoolProperty(
+        name="Use Model Cache",
+        description="Keep a copy of the parsed files on disk, so that re-importing unchanged files is faster.",
+        default=False
     )
\ No newline at end of file
@@ -0,0 +1,62 @@
+import bisect
+from collections import OrderedDict
+import os
+
+
+class AnimationIndex:
+    """
+    A sorted list of the overlay anim files in a directory, so that the anims belonging to a model can be found by
+    binary search on the model name instead of by checking every file in the directory.
+
+    Base anims, i.e. anims with a skel file of the same name, are not included, since these belong to a model
+    rather than being an overlay animation of one.
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        self.mtime_ns = os.stat(directory).st_mtime_ns
+
+        files = os.listdir(directory)
+        skel_stems = {os.path.normcase(file[:-4]) for file in files if file[-4:] == 'skel'}
+        self.anim_files = sorted([file for file in files
+                                  if file[-4:] == 'anim' and os.path.normcase(file[:-4]) not in skel_stems])
+
+    def is_stale(self):
+        """
+        Returns True if files have been added to, removed from, or renamed in the directory since it was indexed.
+        """
+        try:
+            return os.stat(self.directory).st_mtime_ns != self.mtime_ns
+        except FileNotFoundError:
+            return True
+
+    def find(self, prefix):
+        """
+        Returns the paths of every anim file in the directory whose name starts with 'prefix', in sorted order.
+        """
+        start_idx = bisect.bisect_left(self.anim_files, prefix)
+        end_idx = start_idx
+        while end_idx < len(self.anim_files) and self.anim_files[end_idx].startswith(prefix):
+            end_idx += 1
+        return [os.path.join(self.directory, file) for file in self.anim_files[start_idx:end_idx]]
+
+
+# Only the most recently used directories are kept, so that importing from many directories in one session doesn't
+# hold on to a file list for every one of them
+max_cached_indices = 8
+animation_indices = OrderedDict()
+
+
+def get_animation_index(directory):
+    """
+    Returns the AnimationIndex of 'directory', re-using the last index built for it unless the directory has changed
+    since.
+    """
+    key = os.path.abspath(directory)
+    index = animation_indices.get(key)
+    if index is None or index.is_stale():
+        index = AnimationIndex(directory)
+        animation_indices[key] = index
+    animation_indices.move_to_end(key)
+    while len(animation_indices) > max_cached_indices:
+        animation_indices.popitem(last=False)
+    return index
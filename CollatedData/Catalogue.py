@@ -0,0 +1,74 @@
+from ..FileReaders.GeomReader import GeomReader
+from ..FileReaders.AnimReader import AnimReader
+from ..FileReaders.SkelReader import SkelReader
+from ..FileReaders.NameReader import NameReader
+
+from concurrent.futures import ProcessPoolExecutor
+import os
+
+
+catalogue_readers = {'.geom': lambda F, platform: GeomReader.for_platform(F, platform),
+                     '.anim': lambda F, platform: AnimReader(F),
+                     '.skel': lambda F, platform: SkelReader(F),
+                     '.name': lambda F, platform: NameReader(F)}
+
+
+def scan_file(filepath, platform, validation_level='strict'):
+    """
+    Reads the header of a single geom, anim, skel, or name file.
+
+    Returns
+    ------
+    A dict of the header fields of the file, plus its 'path' and 'extension'. If the file could not be read, the dict
+    instead holds the 'path' and 'extension' plus the 'error' that was raised.
+    """
+    file_extension = os.path.splitext(filepath)[-1]
+    record = {'path': filepath, 'extension': file_extension}
+    try:
+        with open(filepath, 'rb') as F:
+            readwriter = catalogue_readers[file_extension](F, platform)
+            readwriter.set_validation_level(validation_level)
+            record.update(readwriter.scan())
+    except Exception as e:
+        record['error'] = f"{type(e).__name__}: {e}"
+    return record
+
+
+def find_catalogue_files(directory, recursive=True):
+    filepaths = []
+    for root, dirs, files in os.walk(directory):
+        filepaths.extend([os.path.join(root, file) for file in files
+                          if os.path.splitext(file)[-1] in catalogue_readers])
+        if not recursive:
+            break
+    return sorted(filepaths)
+
+
+def generate_catalogue(directory, platform, recursive=True, max_workers=None, validation_level='strict'):
+    """
+    Scans the headers of every geom, anim, skel, and name file in a directory, e.g. to build an inventory of an
+    extracted game data dump. The files are split across a pool of processes, so this is intended to be run outside
+    of Blender.
+
+    Inputs
+    ------
+    directory -- the directory to scan.
+    platform -- the platform the geom files are for; 'PC', 'PS4', or 'Megido'.
+    recursive -- whether to also scan the sub-directories of 'directory'.
+    max_workers -- the number of processes to use. If None, one per processor is used. If 1, the files are scanned in
+                   this process.
+    validation_level -- one of 'strict', 'deferred', or 'trusted'; see FileReaders.BaseRW.validation_levels.
+
+    Returns
+    ------
+    A list of dicts returned by scan_file, one per file, sorted by path.
+    """
+    filepaths = find_catalogue_files(directory, recursive)
+    platforms = [platform] * len(filepaths)
+    validation_levels = [validation_level] * len(filepaths)
+    if max_workers == 1:
+        return list(map(scan_file, filepaths, platforms, validation_levels))
+
+    with ProcessPoolExecutor(max_workers) as executor:
+        # Header scans are very short jobs, so hand them to the workers in batches
+        return list(executor.map(scan_file, filepaths, platforms, validation_levels, chunksize=64))
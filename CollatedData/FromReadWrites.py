@@ -3,57 +3,43 @@ from ..FileInterfaces.SkelInterface import SkelInterface
 from ..FileInterfaces.GeomInterface import GeomInterface
 from ..FileInterfaces.AnimInterface import AnimInterface
 from .IntermediateFormat import IntermediateFormat
+from .AnimationIndex import get_animation_index
 from ..Utilities.Rotation import normalise_quaternion, quat_to_matrix, rotation_matrix_to_quat
 
 from ..Utilities.StringHashing import dscs_name_hash, int_to_BE_hex
 from ..Utilities.Exceptions import BadAnimationBoneCount, BadAnimationUVChannels
 
 
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 import os
 import numpy as np
 
 
-def generate_intermediate_format_from_files(filepath, platform, import_anims=True):
+def generate_intermediate_format_from_files(filepath, platform, import_anims=True, validation_level='strict', cache=None,
+                                            max_workers=None, use_processes=False):
     """
     Opens name, skel, geom, and anim files associated with the given filename and generates an
     IntermediateFormat object. Images are assumed to be in a sub-directory of the given file's directory named 'images'.
+    'validation_level' is one of 'strict', 'deferred', or 'trusted'; see FileReaders.BaseRW.validation_levels.
+    If a ModelCache is passed as 'cache', the result is loaded from it if none of the files have changed since they
+    were last read, and otherwise is stored in it.
+    The files are read concurrently by up to 'max_workers' threads, or processes if 'use_processes' is True; see
+    load_model_files.
 
     Returns
     ------
     An IntermediateFormat representation of the data.
     """
-    imported_namedata = NameInterface.from_file(filepath + '.name')
-    imported_skeldata = SkelInterface.from_file(filepath + '.skel')
-    imported_geomdata = GeomInterface.from_file(filepath + '.geom', platform)
+    anim_filepaths = find_anim_files(filepath, platform) if import_anims else []
+    if cache is not None:
+        input_filepaths = [filepath + ext for ext in ('.name', '.skel', '.geom', '.anim')] + anim_filepaths
+        cache_key = cache.make_key(input_filepaths, platform, import_anims, validation_level)
+        model_data = cache.load(cache_key)
+        if model_data is not None:
+            return model_data
 
-    directory = os.path.split(filepath)
-    filename = directory[-1]
-    directory = os.path.join(*directory[:-1])
-
-    # Always import the base anim, because it plays a special role in skeleton construction
-    # Also makes the pattern-matched anim load below simpler
-    imported_animdata = {filename: AnimInterface.from_file(filepath + '.anim', imported_skeldata)}
-    if import_anims:
-        for afile in os.listdir(directory):
-            afilepath = os.path.join(directory, afile)
-
-            # Some of the Megido files have a different animation name convention
-            if platform == 'Megido' and filename[-3:-1] == 's0':
-                matches_name_pattern = afile[:len(filename) - 3] == filename[:-3]
-            else:
-                matches_name_pattern = afile[:len(filename)] == filename
-
-            is_an_anim_file = afile[-4:] == 'anim'
-            is_a_base_animation = os.path.exists(afilepath[:-4] + "skel")
-            if matches_name_pattern and not is_a_base_animation and is_an_anim_file:
-                afile_name, afile_ext = os.path.splitext(afile)
-                print(afile)
-                try:
-                    imported_animdata[afile_name] = AnimInterface.from_file(afilepath, imported_skeldata)
-                except BadAnimationBoneCount:
-                    print("Encountered a conflicting bone count: probably not an animation for this skeleton.")
-                except BadAnimationUVChannels:
-                    print("Encountered a conflicting shader uniform channel count: probably not an animation for this skeleton.")
+    imported_namedata, imported_skeldata, imported_geomdata, imported_animdata = \
+        load_model_files(filepath, platform, anim_filepaths, validation_level, max_workers, use_processes)
 
     images_directory = os.path.join(*os.path.split(filepath)[:-1], 'images')
     model_data = IntermediateFormat()
@@ -68,9 +54,76 @@ def generate_intermediate_format_from_files(filepath, platform, import_anims=Tru
     add_lights(model_data, imported_geomdata.light_sources)
     model_data.cameras = imported_geomdata.cameras
 
+    if cache is not None:
+        cache.store(cache_key, model_data)
+
     return model_data
 
 
+def load_model_files(filepath, platform, anim_filepaths, validation_level='strict', max_workers=None,
+                     use_processes=False):
+    """
+    Reads the name, skel, geom, and base anim files of a model, plus the anims in 'anim_filepaths', using a pool of
+    'max_workers' threads or processes. The name and geom files are read in parallel with the skel file, and then
+    every anim file is read in parallel, since only the anims depend on the skeleton.
+
+    A thread pool is used by default, since process pools cannot be started reliably from inside Blender.
+
+    Returns
+    ------
+    The NameInterface, SkelInterface, and GeomInterface of the model, plus a dict of AnimInterfaces keyed by anim name,
+    starting with the base anim and then in the order of 'anim_filepaths'.
+    """
+    filename = os.path.split(filepath)[-1]
+    executor_type = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+    with executor_type(max_workers) as executor:
+        namedata_job = executor.submit(NameInterface.from_file, filepath + '.name', validation_level)
+        geomdata_job = executor.submit(GeomInterface.from_file, filepath + '.geom', platform, validation_level)
+        imported_skeldata = SkelInterface.from_file(filepath + '.skel', validation_level)
+
+        # Always import the base anim, because it plays a special role in skeleton construction
+        base_anim_job = executor.submit(AnimInterface.from_file, filepath + '.anim', imported_skeldata, validation_level)
+        anim_jobs = [executor.submit(AnimInterface.from_file, afilepath, imported_skeldata, validation_level)
+                     for afilepath in anim_filepaths]
+
+        # Collect the results in submission order, so the output does not depend on which job finishes first
+        imported_animdata = {filename: base_anim_job.result()}
+        for afilepath, anim_job in zip(anim_filepaths, anim_jobs):
+            afile = os.path.split(afilepath)[-1]
+            afile_name, afile_ext = os.path.splitext(afile)
+            print(afile)
+            try:
+                imported_animdata[afile_name] = anim_job.result()
+            except BadAnimationBoneCount:
+                print("Encountered a conflicting bone count: probably not an animation for this skeleton.")
+            except BadAnimationUVChannels:
+                print("Encountered a conflicting shader uniform channel count: probably not an animation for this skeleton.")
+
+        return namedata_job.result(), imported_skeldata, geomdata_job.result(), imported_animdata
+
+
+def find_anim_files(filepath, platform):
+    """
+    Finds the anim files that belong to the model at 'filepath' by matching their filenames against the model name.
+    The base anim of the model, and the base anims of any other models in the directory, are not included.
+
+    Returns
+    ------
+    A sorted list of paths to the anim files.
+    """
+    directory = os.path.split(filepath)
+    filename = directory[-1]
+    directory = os.path.join(*directory[:-1])
+
+    # Some of the Megido files have a different animation name convention
+    if platform == 'Megido' and filename[-3:-1] == 's0':
+        prefix = filename[:-3]
+    else:
+        prefix = filename
+
+    return get_animation_index(directory).find(prefix)
+
+
 def add_meshes(model_data, imported_geomdata):
     for mesh in imported_geomdata.meshes:
         model_data.new_mesh()
@@ -78,16 +131,15 @@ def add_meshes(model_data, imported_geomdata):
         for bone_id in mesh.vertex_group_bone_idxs:
             current_IF_mesh.add_vertex_group(bone_id, [], [])
 
-        if 'WeightedBoneID' in mesh.vertices[0]:
-            for i, vertex in enumerate(mesh.vertices):
-                for vertex_group_idx, weight in zip(vertex['WeightedBoneID'], vertex['BoneWeight']):
-                    current_IF_mesh.vertex_groups[vertex_group_idx].vertex_indices.append(i)
-                    current_IF_mesh.vertex_groups[vertex_group_idx].weights.append(weight)
+        vertices = mesh.vertices
+        if vertices.has_vertex_groups:
+            members = vertices.get_vertex_group_members(len(current_IF_mesh.vertex_groups))
+            for vertex_group, (vertex_indices, weights) in zip(current_IF_mesh.vertex_groups, members):
+                vertex_group.vertex_indices.extend(vertex_indices)
+                vertex_group.weights.extend(weights)
         for uv_type in ['UV', 'UV2', 'UV3']:
-            if uv_type in mesh.vertices[0]:
-                for vertex in mesh.vertices:
-                    u, v = vertex[uv_type]
-                    vertex[uv_type] = (u, 1. - v)
+            if uv_type in vertices:
+                vertices.attributes[uv_type][:, 1] = 1. - vertices.attributes[uv_type][:, 1]
 
         current_IF_mesh.vertices = mesh.vertices
 
@@ -175,12 +227,12 @@ def add_anims(model_data, imported_animdata):
         ad.playback_rate = ar.playback_rate
 
         # Set up some data holders
-        rotation_fcurves_frames = {bone_idx: list(bone_rotations.keys()) for bone_idx, bone_rotations in ar.rotations.items()}
-        rotation_fcurves_values = {bone_idx: list(bone_rotations.values()) for bone_idx, bone_rotations in ar.rotations.items()}
-        location_fcurves_frames = {bone_idx: list(bone_locations.keys()) for bone_idx, bone_locations in ar.locations.items()}
-        location_fcurves_values = {bone_idx: list(bone_locations.values()) for bone_idx, bone_locations in ar.locations.items()}
-        scale_fcurves_frames = {bone_idx: list(bone_scales.keys()) for bone_idx, bone_scales in ar.scales.items()}
-        scale_fcurves_values = {bone_idx: list(bone_scales.values()) for bone_idx, bone_scales in ar.scales.items()}
+        rotation_fcurves_frames = {bone_idx: track.frames.tolist() for bone_idx, track in ar.rotations.items()}
+        rotation_fcurves_values = {bone_idx: track.values.tolist() for bone_idx, track in ar.rotations.items()}
+        location_fcurves_frames = {bone_idx: track.frames.tolist() for bone_idx, track in ar.locations.items()}
+        location_fcurves_values = {bone_idx: track.values.tolist() for bone_idx, track in ar.locations.items()}
+        scale_fcurves_frames = {bone_idx: track.frames.tolist() for bone_idx, track in ar.scales.items()}
+        scale_fcurves_values = {bone_idx: track.values.tolist() for bone_idx, track in ar.scales.items()}
 
         # Having iterated through the data, we can now add the keyframe data to the intermediate format object.
         for bone_idx in range(ar.num_bones):
@@ -189,7 +241,7 @@ def add_anims(model_data, imported_animdata):
             ad.add_scale_fcurve(bone_idx, scale_fcurves_frames[bone_idx], scale_fcurves_values[bone_idx])
 
         # Do this properly in the future
-        ad.uv_data = ar.user_channels
+        ad.uv_data = {channel_idx: track.to_dict() for channel_idx, track in ar.user_channels.items()}
 
 
 def add_lights(model_data, imported_lightdata):
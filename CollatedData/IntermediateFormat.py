@@ -1,5 +1,8 @@
+from ..Utilities.VertexTable import VertexTable
+
+
 class IntermediateFormat:
-    _version = 0.2
+    _version = 0.3
     f"""
     Intermediate Format: v{_version}.
     
@@ -56,7 +59,7 @@ class IntermediateFormat:
 class MeshData:
     def __init__(self):
         self.name_hash = None
-        self.vertices = []
+        self.vertices = VertexTable()
         self.vertex_groups = []
         self.polygons = []
         self.material_id = None
@@ -0,0 +1,184 @@
+from .IntermediateFormat import IntermediateFormat
+
+import hashlib
+import hmac
+import os
+import pickle
+import secrets
+import stat
+import tempfile
+
+
+def get_user_cache_directory():
+    """
+    Returns the per-user cache directory of the platform: %LOCALAPPDATA% on Windows, ~/Library/Caches on macOS, and
+    $XDG_CACHE_HOME or ~/.cache elsewhere.
+    """
+    if os.name == 'nt':
+        return os.environ.get('LOCALAPPDATA', os.path.expanduser('~'))
+    elif os.uname().sysname == 'Darwin':
+        return os.path.join(os.path.expanduser('~'), 'Library', 'Caches')
+    return os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+
+
+class ModelCache:
+    """
+    An on-disk cache of IntermediateFormat objects, so that a model that has already been imported once does not need
+    to be re-parsed from its files.
+
+    Each entry is keyed by the paths, sizes, and modification times of every file the model was read from, plus the
+    import settings and the IntermediateFormat version, so any change to the files or a bump of
+    IntermediateFormat._version causes a cache miss. Once the total size of the cache exceeds 'max_size' bytes, the
+    least-recently-used entries are deleted.
+
+    The entries are pickled, so the cache directory is private to the current user: it is created with mode 0o700,
+    and a PermissionError is raised if it is owned by another user or can be written to by other users. Each entry is
+    also signed with an HMAC of a secret key kept in the directory, and entries with a bad signature are deleted
+    without being unpickled.
+    """
+    default_directory = os.path.join(get_user_cache_directory(), 'DSCSModelCache')
+    extension = '.pickle'
+    key_filename = 'cache.key'
+    digest = hashlib.sha256
+
+    def __init__(self, directory=None, max_size=1024**3):
+        self.directory = self.default_directory if directory is None else directory
+        self.max_size = max_size
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+        self.check_directory_permissions()
+        self.secret = self.load_secret()
+
+    def check_directory_permissions(self):
+        """
+        Raises a PermissionError if the cache directory could have been written to by another user.
+        """
+        # Windows has no POSIX owners or modes; the default location there is already inside the user's profile
+        if not hasattr(os, 'getuid'):
+            return
+        directory_stat = os.lstat(self.directory)
+        if not stat.S_ISDIR(directory_stat.st_mode):
+            raise PermissionError(f"Model cache location '{self.directory}' is not a directory.")
+        if directory_stat.st_uid != os.getuid():
+            raise PermissionError(f"Model cache directory '{self.directory}' is not owned by the current user.")
+        if directory_stat.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+            raise PermissionError(f"Model cache directory '{self.directory}' can be written to by other users.")
+
+    def load_secret(self):
+        """
+        Returns the secret key used to sign the cache entries, generating it the first time the cache is used.
+        """
+        key_path = os.path.join(self.directory, self.key_filename)
+        try:
+            fd = os.open(key_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        except FileExistsError:
+            with open(key_path, 'rb') as F:
+                secret = F.read()
+            if len(secret) == 32:
+                return secret
+            # A truncated key can't have signed any valid entries, so start again with a new one
+            self.clear()
+            self.remove_entry(key_path)
+            return self.load_secret()
+        secret = secrets.token_bytes(32)
+        with os.fdopen(fd, 'wb') as F:
+            F.write(secret)
+        return secret
+
+    def sign(self, data):
+        return hmac.new(self.secret, data, self.digest).digest()
+
+    def make_key(self, filepaths, *settings):
+        """
+        Generates the key of the cache entry for a model read from the files in 'filepaths' with the given import
+        settings.
+        """
+        file_stats = []
+        for filepath in filepaths:
+            filepath = os.path.abspath(filepath)
+            file_stat = os.stat(filepath)
+            file_stats.append((filepath, file_stat.st_size, file_stat.st_mtime_ns))
+        key_data = repr((IntermediateFormat._version, file_stats, settings))
+        return hashlib.sha1(key_data.encode('utf8')).hexdigest()
+
+    def get_entry_path(self, key):
+        return os.path.join(self.directory, key + self.extension)
+
+    def load(self, key):
+        """
+        Returns the IntermediateFormat stored under 'key', or None if there is no such entry.
+        """
+        entry_path = self.get_entry_path(key)
+        try:
+            with open(entry_path, 'rb') as F:
+                data = F.read()
+        except FileNotFoundError:
+            return None
+
+        signature_size = self.digest().digest_size
+        signature, data = data[:signature_size], data[signature_size:]
+        if not hmac.compare_digest(signature, self.sign(data)):
+            # Never unpickle an entry that this user's cache did not write
+            self.remove_entry(entry_path)
+            return None
+        try:
+            model_data = pickle.loads(data)
+        except Exception:
+            # Entries written by an incompatible version of the addon, or truncated entries, are just cache misses
+            self.remove_entry(entry_path)
+            return None
+
+        # The modification time of an entry doubles as its last access time for the LRU eviction
+        os.utime(entry_path)
+        return model_data
+
+    def store(self, key, model_data):
+        """
+        Stores 'model_data' under 'key', and then evicts old entries if the cache has grown too large.
+        """
+        entry_path = self.get_entry_path(key)
+        # Write to a temporary file first so that a concurrent load never sees a partially-written entry
+        fd, temp_path = tempfile.mkstemp(suffix='.tmp', dir=self.directory)
+        try:
+            data = pickle.dumps(model_data, protocol=pickle.HIGHEST_PROTOCOL)
+            with os.fdopen(fd, 'wb') as F:
+                F.write(self.sign(data))
+                F.write(data)
+            os.replace(temp_path, entry_path)
+        except BaseException:
+            self.remove_entry(temp_path)
+            raise
+        self.evict()
+
+    def evict(self):
+        """
+        Deletes the least-recently-used entries until the cache is no larger than 'max_size'.
+        """
+        entries = []
+        for file in os.listdir(self.directory):
+            if os.path.splitext(file)[-1] != self.extension:
+                continue
+            entry_path = os.path.join(self.directory, file)
+            try:
+                entry_stat = os.stat(entry_path)
+            except FileNotFoundError:
+                continue
+            entries.append((entry_stat.st_mtime_ns, entry_stat.st_size, entry_path))
+
+        total_size = sum([size for _, size, _ in entries])
+        for _, size, entry_path in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            self.remove_entry(entry_path)
+            total_size -= size
+
+    def clear(self):
+        for file in os.listdir(self.directory):
+            if os.path.splitext(file)[-1] == self.extension:
+                self.remove_entry(os.path.join(self.directory, file))
+
+    @staticmethod
+    def remove_entry(entry_path):
+        try:
+            os.remove(entry_path)
+        except FileNotFoundError:
+            pass
@@ -11,21 +11,25 @@ from ..FileInterfaces.PhysInterface import PhysInterface
 from ..FileReaders.GeomReader.ShaderUniforms import shader_uniforms_from_names
 from ..Utilities.StringHashing import dscs_name_hash
 from ..Utilities.Matrices import get_total_transform_matrix
+from ..Utilities.TrackTable import KeyframeTrack
+from ..Utilities.VertexCache import get_acmr, optimise_vertex_cache
 
 
-def generate_files_from_intermediate_format(filepath, model_data, model_name, platform='PC', animation_only=False, create_physics=False):
+def generate_files_from_intermediate_format(filepath, model_data, model_name, platform='PC', animation_only=False, create_physics=False,
+                                            use_triangle_strips=False, optimise_vertex_order=False,
+                                            optimise_animation_chunks=False):
     file_folder = os.path.join(*os.path.split(filepath)[:-1])
         
     si = make_skelinterface(filepath, model_data, not animation_only)
     if not animation_only:
         ni = make_nameinterface(filepath, model_data)
-        gi = make_geominterface(filepath, model_data, si, platform)
+        gi = make_geominterface(filepath, model_data, si, platform, use_triangle_strips, optimise_vertex_order)
         if create_physics:
             pi = PhysInterface.from_model(ni, si, gi)
             pi.to_file(filepath + ".phys")
 
     for animation_name in model_data.animations:
-        make_animreader(file_folder, model_data, animation_name, model_name, si)
+        make_animreader(file_folder, model_data, animation_name, model_name, si, optimise_animation_chunks)
 
 
 def make_nameinterface(filepath, model_data):
@@ -55,21 +59,19 @@ def make_skelinterface(filepath, model_data, export=True):
 
 
 def get_transformed_vertices(gi_mesh, transforms, switch_idx=2):
-    if "WeightedBoneID" in gi_mesh.vertices[0]:
-        transformed_vertices = np.array([np.zeros(3)] * len(gi_mesh.vertices))
-        transformed_vertices[switch_idx, 2] = transformed_vertices[2, switch_idx]
-        for i, vertex in enumerate(gi_mesh.vertices):
-            bone_ids = vertex["WeightedBoneID"]
-            bone_weights = vertex["BoneWeight"]
-            vertex_transform = np.sum([weight * transforms[gi_mesh.vertex_group_bone_idxs[_id]] for _id, weight in
-                                       zip(bone_ids, bone_weights)], axis=0)
-            transformed_vertices[i] = np.dot(vertex_transform, [*vertex["Position"], 1])[:3]
+    vertices = gi_mesh.vertices
+    if vertices.has_vertex_groups:
+        group_transforms = np.array([transforms[bone_idx] for bone_idx in gi_mesh.vertex_group_bone_idxs]).reshape((-1, 4, 4))
+        bone_weights = np.where(vertices.get_vertex_group_mask(), vertices.bone_weights, 0.)
+        vertex_transforms = np.einsum('nw,nwij->nij', bone_weights, group_transforms[vertices.bone_ids])
+        positions = np.hstack([vertices.attributes["Position"], np.ones((len(vertices), 1))])
+        transformed_vertices = np.einsum('nij,nj->ni', vertex_transforms, positions)[:, :3]
     else:
-        transformed_vertices = np.array([vertex["Position"] for vertex in gi_mesh.vertices])
+        transformed_vertices = vertices.attributes["Position"].copy()
     return transformed_vertices
 
 
-def make_geominterface(filepath, model_data, sk, platform):
+def make_geominterface(filepath, model_data, sk, platform, use_triangle_strips=False, optimise_vertex_order=False):
     geomInterface = GeomInterface()
 
     bone_matrices = [get_total_transform_matrix(i, {p: c for p, c in sk.parent_bones}, sk.rest_pose) for i in range(sk.num_bones)]
@@ -83,16 +85,20 @@ def make_geominterface(filepath, model_data, sk, platform):
         gi_mesh.name_hash = mesh.name_hash
 
         for uv_type in ['UV', 'UV2', 'UV3']:
-            if uv_type in mesh.vertices[0]:
-                for vertex in mesh.vertices:
-                    u, v = vertex[uv_type]
-                    vertex[uv_type] = (u, 1. - v)
+            if uv_type in mesh.vertices:
+                mesh.vertices.attributes[uv_type][:, 1] = 1. - mesh.vertices.attributes[uv_type][:, 1]
 
         gi_mesh.vertex_group_bone_idxs = [vg.bone_idx for vg in mesh.vertex_groups]
         gi_mesh.vertices = mesh.vertices
         gi_mesh.polygons = [p.indices for p in mesh.polygons]
         gi_mesh.material_id = mesh.material_id
 
+        if optimise_vertex_order and len(gi_mesh.polygons) and all([len(poly) == 3 for poly in gi_mesh.polygons]):
+            acmr_before = get_acmr(gi_mesh.polygons)
+            gi_mesh.vertices, triangles = optimise_vertex_cache(gi_mesh.vertices, gi_mesh.polygons)
+            gi_mesh.polygons = [tuple(triangle) for triangle in triangles.tolist()]
+            print(f"Mesh {len(geomInterface.meshes) - 1}: vertex cache ACMR {acmr_before:.3f} -> {get_acmr(gi_mesh.polygons):.3f}")
+
         transformed_vertices = list(get_transformed_vertices(gi_mesh, transforms))
 
         is_billboard = False  # Fix by (presumably) asking the shader hex if it's a billboard... figure that out later
@@ -109,7 +115,7 @@ def make_geominterface(filepath, model_data, sk, platform):
         gi_mesh.mesh_centre = (maxvs + minvs) / 2
         gi_mesh.bounding_box_lengths = (maxvs - minvs) / 2
 
-        bind_vertices = np.array([vertex["Position"] for vertex in gi_mesh.vertices])
+        bind_vertices = gi_mesh.vertices.attributes["Position"]
         maxrad = np.max(np.sum((bind_vertices - gi_mesh.mesh_centre) ** 2, axis=1))
 
         gi_mesh.bounding_sphere_radius = maxrad ** .5
@@ -172,21 +178,21 @@ def make_geominterface(filepath, model_data, sk, platform):
     geomInterface.unknown_footer_data = model_data.unknown_data['unknown_footer_data']
 
     print(">> USED MATERIALS BEFORE DUMP", len(geomInterface.material_data))
-    geomInterface.to_file(filepath + ".geom", platform)
+    geomInterface.to_file(filepath + ".geom", platform, use_triangle_strips=use_triangle_strips)
     return geomInterface
 
 
-def validate_anim_data(fcurve):
+def validate_anim_data(fcurve, num_components):
     use_frames = fcurve.frames
     use_values = fcurve.values
     if len(use_frames):
         if use_frames[0] != 0:
             use_frames = [0, *use_frames]
             use_values = [use_values[0], *use_values]
-    return {k: v for k, v in zip(use_frames, use_values)}
+    return KeyframeTrack(use_frames, use_values, num_components)
 
 
-def make_animreader(file_folder, model_data, animation_name, base_name, sk):
+def make_animreader(file_folder, model_data, animation_name, base_name, sk, optimise_chunks=False):
     anim_interface = AnimInterface()
     animation = model_data.animations[animation_name]
 
@@ -194,18 +200,20 @@ def make_animreader(file_folder, model_data, animation_name, base_name, sk):
     anim_interface.num_bones = sk.num_bones
 
     for bone_idx, fcurve in animation.rotations.items():
-        data = validate_anim_data(fcurve)
+        data = validate_anim_data(fcurve, 4)
         anim_interface.rotations[bone_idx] = data
 
     for bone_idx, fcurve in animation.locations.items():
-        data = validate_anim_data(fcurve)
+        data = validate_anim_data(fcurve, 3)
         anim_interface.locations[bone_idx] = data
 
     for bone_idx, fcurve in animation.scales.items():
-        data = validate_anim_data(fcurve)
+        data = validate_anim_data(fcurve, 3)
         anim_interface.scales[bone_idx] = data
 
     # Do this properly later
-    anim_interface.user_channels = animation.uv_data
+    for channel_idx, keyframes in animation.uv_data.items():
+        anim_interface.user_channels[channel_idx] = keyframes
 
-    anim_interface.to_file(os.path.join(file_folder, animation_name) + '.anim', sk, animation_name == base_name)
+    anim_interface.to_file(os.path.join(file_folder, animation_name) + '.anim', sk, animation_name == base_name,
+                           optimise_chunks=optimise_chunks)
@@ -1,9 +1,17 @@
-import itertools
 import numpy as np
 
 from ..FileReaders.AnimReader import AnimReader
+from ..FileReaders.BaseRW import BufferWriter
 from ..Utilities.Interpolation import lerp, slerp
 from ..Utilities.Rounding import roundup
+from ..Utilities.TrackTable import TrackTable, as_track_table
+
+
+# The limits on the size of a single keyframe chunk, shared by the greedy and the size-optimal chunk splitting
+maximum_chunk_bytes = 0x2000
+maximum_chunk_frames = 129
+# Each chunk also adds an 'HHI' pointer and an 'HH' keyframe count to the file header
+chunk_header_overhead = 8 + 4
 
 
 class AnimInterface:
@@ -11,76 +19,74 @@ class AnimInterface:
         self.playback_rate = None
         self.num_bones = None
 
-        self.rotations = {}
-        self.locations = {}
-        self.scales = {}
-        self.user_channels = {}
+        self.rotations = TrackTable(4)
+        self.locations = TrackTable(3)
+        self.scales = TrackTable(3)
+        self.user_channels = TrackTable()
 
     @classmethod
-    def from_file(cls, path, sk):
-        instance = cls()
+    def from_file(cls, path, sk, validation_level='strict', profiler=None):
         with open(path, 'rb') as F:
-            readwriter = AnimReader(F, sk)
-            readwriter.read()
+            return cls.from_bytes(F.read(), sk, validation_level, profiler)
+
+    @classmethod
+    def from_bytes(cls, data, sk, validation_level='strict', profiler=None):
+        instance = cls()
+        readwriter = AnimReader(data, sk)
+        readwriter.set_validation_level(validation_level)
+        readwriter.set_profiler(profiler)
+        readwriter.read()
 
         # Only need to take the playback rate; duration can be calculated from this and the total number of frames
         instance.playback_rate = readwriter.playback_rate
         instance.num_bones = readwriter.num_bones
 
-        # Set up the data holder variables
-        for idx in range(readwriter.num_bones):
-            instance.rotations[idx] = {}
-            instance.locations[idx] = {}
-            instance.scales[idx] = {}
-        for idx in range(sk.num_uv_channels):
-            instance.user_channels[idx] = {}
+        # Collect the channel index, frame, and value of every keyframe of each transform type, in the order
+        # rotations->locations->scales->user channels, so that the tracks can be built in one go at the end
+        num_components = (4, 3, 3, None)
+        keyframes = [([], [], []) for _ in num_components]
+
+        def add_keyframes(transform_idx, channel_idxs, frames, values):
+            count = min(len(channel_idxs), len(frames), len(values))
+            shape = (-1,) if num_components[transform_idx] is None else (-1, num_components[transform_idx])
+            channel_idx_list, frame_list, value_list = keyframes[transform_idx]
+            channel_idx_list.append(np.asarray(channel_idxs, dtype=np.int64)[:count])
+            frame_list.append(np.asarray(frames, dtype=np.int64)[:count])
+            value_list.append(np.asarray(values[:count], dtype=np.float32).reshape(shape))
 
         # Get the bits that are constant throughout the animation
-        for bone_idx, rotation in zip(readwriter.static_pose_rotations_bone_idxs, readwriter.static_pose_bone_rotations):
-            instance.rotations[bone_idx][0] = rotation
-        for bone_idx, location in zip(readwriter.static_pose_locations_bone_idxs, readwriter.static_pose_bone_locations):
-            instance.locations[bone_idx][0] = location
-        for bone_idx, scale in zip(readwriter.static_pose_scales_bone_idxs, readwriter.static_pose_bone_scales):
-            instance.scales[bone_idx][0] = scale
-        for channel_idx, channel_data in zip(readwriter.static_pose_shader_uniform_channels_idxs, readwriter.static_pose_shader_uniform_channels):
-            instance.user_channels[channel_idx][0] = channel_data
+        static_pose_data = ((readwriter.static_pose_rotations_bone_idxs, readwriter.static_pose_bone_rotations),
+                            (readwriter.static_pose_locations_bone_idxs, readwriter.static_pose_bone_locations),
+                            (readwriter.static_pose_scales_bone_idxs, readwriter.static_pose_bone_scales),
+                            (readwriter.static_pose_shader_uniform_channels_idxs, readwriter.static_pose_shader_uniform_channels))
+        for transform_idx, (channel_idxs, values) in enumerate(static_pose_data):
+            add_keyframes(transform_idx, channel_idxs, np.zeros(len(channel_idxs), dtype=np.int64), values)
 
         # Now add in the rotations, locations, and scales that change throughout the animation
+        animated_channel_idxs = (readwriter.animated_rotations_bone_idxs,
+                                 readwriter.animated_locations_bone_idxs,
+                                 readwriter.animated_scales_bone_idxs,
+                                 readwriter.animated_shader_uniform_channels_idxs)
         for (cumulative_frames, nframes), substructure in zip(readwriter.keyframe_counts, readwriter.keyframe_chunks):
             # Each keyframe chunk begins with a single frame
-            for bone_idx, value in zip(readwriter.animated_rotations_bone_idxs, substructure.frame_0_rotations):
-                instance.rotations[bone_idx][cumulative_frames] = value
-            for bone_idx, value in zip(readwriter.animated_locations_bone_idxs, substructure.frame_0_locations):
-                instance.locations[bone_idx][cumulative_frames] = value
-            for bone_idx, value in zip(readwriter.animated_scales_bone_idxs, substructure.frame_0_scales):
-                instance.scales[bone_idx][cumulative_frames] = value
-
-            for channel_idx, value in zip(readwriter.animated_shader_uniform_channels_idxs, substructure.frame_0_shader_uniform_values):
-                instance.user_channels[channel_idx][cumulative_frames] = value
+            frame_0_values = (substructure.frame_0_rotations, substructure.frame_0_locations,
+                              substructure.frame_0_scales, substructure.frame_0_shader_uniform_values)
+            for transform_idx, (channel_idxs, values) in enumerate(zip(animated_channel_idxs, frame_0_values)):
+                add_keyframes(transform_idx, channel_idxs, np.full(len(channel_idxs), cumulative_frames), values)
 
             # The keyframe rotations, locations, etc. for all bones are all concatenated together into one big list
             # per transform type.
             # The keyframes that use each transform are stored in a bit-vector with an equal length to the number of
             # frames. These bit-vectors are all concatenated together in one huge bit-vector, in the order
             # rotations->locations->scales->unknown_4
-            # Therefore, it's pretty reasonable to turn these lists of keyframe rotations, locations, etc.
-            # into generators using the built-in 'iter' function or the 'chunks' function defined at the bottom of the
-            # file.
+            # The reader unpacks this into a boolean array, so it can be reshaped into one row of frames per bone; these
+            # rows are labelled 'masks'.
             if nframes != 0:
                 assert len(substructure.keyframes_in_use) % nframes == 0, f"{len(substructure.keyframes_in_use)} keyframes cannot be split into chunks of {nframes}."
-                masks = chunks(substructure.keyframes_in_use, nframes)
+                masks = substructure.keyframes_in_use.reshape((-1, nframes))
             else:
-                masks = []
-
-            rotations = iter(substructure.keyframed_rotations)
-            locations = iter(substructure.keyframed_locations)
-            scales = iter(substructure.keyframed_scales)
-            user_channels = iter(substructure.keyframed_shader_uniform_values)
+                masks = np.zeros((0, 0), dtype=bool)
 
-            # The benefit of doing this is that generators behave like a Queue. We can pop the next element off these
-            # generators and never have to worry about keeping track of the state of each generator, because the
-            # generator keeps track of it for us.
-            # In this function, the bit-vector is chunked and labelled 'masks'.
             # Schematically, the bit-vector might look like this: (annotated)
             #
             # <------------------ Rotations -------------------><------------- Locations --------------><-Scales->
@@ -96,65 +102,50 @@ class AnimInterface:
             # that we need to record the indices of these 1s (modulo 11, the number of frames) and then take the first
             # 5 elements from the big list of keyframe rotations. We then record these frame indices and rotation
             # values as the keyframe data (points on the 'f-curve') for whichever bone this first set of 11 frames
-            # corresponds to. We continue iterating through this bit-vector by grabbing the next mask from 'masks',
-            # and we should consume the entire generator of rotation data after 5 masks. The next mask we grab should
-            # then correspond to location data, so we move onto the next for-loop below, and so on for the scale data.
-            for bone_idx, mask in zip(readwriter.animated_rotations_bone_idxs, masks):
-                frames = [j+cumulative_frames+1 for j, elem in enumerate(mask) if elem == '1']
-                values = itertools.islice(rotations, len(frames))  # Pop the next num_frames rotations
-                for frame, value in zip(frames, values):
-                    instance.rotations[bone_idx][frame] = value
-            for bone_idx, mask in zip(readwriter.animated_locations_bone_idxs, masks):
-                frames = [j+cumulative_frames+1 for j, elem in enumerate(mask) if elem == '1']
-                values = itertools.islice(locations, len(frames))  # Pop the next num_frames locations
-                for frame, value in zip(frames, values):
-                    instance.locations[bone_idx][frame] = value
-            for bone_idx, mask in zip(readwriter.animated_scales_bone_idxs, masks):
-                frames = [j+cumulative_frames+1 for j, elem in enumerate(mask) if elem == '1']
-                values = itertools.islice(scales, len(frames))  # Pop the next num_frames scales
-                for frame, value in zip(frames, values):
-                    instance.scales[bone_idx][frame] = value
-            for channel_idx, mask in zip(readwriter.animated_shader_uniform_channels_idxs, masks):
-                frames = [j+cumulative_frames+1 for j, elem in enumerate(mask) if elem == '1']
-                values = itertools.islice(user_channels, len(frames))  # Pop the next num_frames user channel data
-                for frame, value in zip(frames, values):
-                    instance.user_channels[channel_idx][frame] = value
+            # corresponds to. The set bits of the masks of all the rotation bones, read row by row, are therefore in
+            # the same order as the list of keyframe rotations. The next masks then correspond to location data, and
+            # so on for the scale data.
+            keyframed_values = (substructure.keyframed_rotations, substructure.keyframed_locations,
+                                substructure.keyframed_scales, substructure.keyframed_shader_uniform_values)
+            mask_idx = 0
+            for transform_idx, (channel_idxs, values) in enumerate(zip(animated_channel_idxs, keyframed_values)):
+                transform_masks = masks[mask_idx:mask_idx + len(channel_idxs)]
+                mask_rows, mask_frames = np.nonzero(transform_masks)
+                add_keyframes(transform_idx, np.asarray(channel_idxs, dtype=np.int64)[mask_rows],
+                              mask_frames + cumulative_frames + 1, values)
+                mask_idx += len(channel_idxs)
 
             # We should now have consumed all the keyframe bitvectors, so let's just check that is the case...
             # If any masks are left over, they should just be padding bits required to fill their containing byte
-            for mask in masks:
-                assert all([item == '0' for item in mask]), f"Leftover keyframes bitvector was not padding: {mask}."
+            for mask in masks[mask_idx:]:
+                assert not np.any(mask), f"Leftover keyframes bitvector was not padding: {mask}."
+
+        num_channels = (readwriter.num_bones, readwriter.num_bones, readwriter.num_bones, sk.num_uv_channels)
+        instance.rotations, instance.locations, instance.scales, instance.user_channels = \
+            [TrackTable.from_keyframes(np.concatenate(channel_idxs), np.concatenate(frames), np.concatenate(values),
+                                       components, channels)
+             for (channel_idxs, frames, values), components, channels in zip(keyframes, num_components, num_channels)]
 
         # Recover quaternion signs lost during compression
-        for bone_idx, rotations in instance.rotations.items():
-            instance.rotations[bone_idx] = match_quat_signs_in_dict(instance.rotations[bone_idx])
+        for track in instance.rotations.values():
+            track.values[:] = match_quaternion_signs(track.values)
 
         return instance
 
-    def to_file(self, path, sk, isBase):
-        try:
-            max_rotations = max([list(self.rotations[bone_idx].keys())[-1] if len(self.rotations[bone_idx].keys()) else 0 for bone_idx in self.rotations])
-        except:
-            max_rotations = 0
-        try:
-            max_locations = max([list(self.locations[bone_idx].keys())[-1] if len(self.locations[bone_idx].keys()) else 0 for bone_idx in self.locations])
-        except:
-            max_locations = 0
-        try:
-            max_scales = max([list(self.scales[bone_idx].keys())[-1] if len(self.scales[bone_idx].keys()) else 0 for bone_idx in self.scales])
-        except:
-            max_scales = 0
-        try:
-            max_user_channels = max([list(self.user_channels[channel_idx].keys())[-1] if len(self.user_channels[channel_idx].keys()) else 0 for channel_idx in self.user_channels])
-        except:
-            max_user_channels = 0
-
-        num_frames = int(max([max_rotations, max_locations, max_scales, max_user_channels]))
+    def to_file(self, path, sk, isBase, atomic=False, profiler=None, optimise_chunks=False):
+        # The tracks may have been filled in as nested {bone_idx: {frame: value}} dicts
+        rotations = as_track_table(self.rotations, 4)
+        locations = as_track_table(self.locations, 3)
+        scales = as_track_table(self.scales, 3)
+        user_channels = as_track_table(self.user_channels)
+
+        num_frames = max([rotations.last_frame, locations.last_frame, scales.last_frame, user_channels.last_frame])
         num_frames += 1  # This is because the frames start from index 0
         num_bones = self.num_bones
 
-        with open(path, 'wb') as F:
+        with BufferWriter(path, atomic) as F:
             readwriter = AnimReader(F, sk)
+            readwriter.set_profiler(profiler)
             readwriter.filetype = '40AE'
             readwriter.animation_duration = (num_frames - 1)/self.playback_rate
             readwriter.playback_rate = self.playback_rate
@@ -166,10 +157,10 @@ class AnimInterface:
             readwriter.always_16384 = 16384
 
             # Time to figure out how to organise the keyframes...
-            static_rots, anim_rots, unused_rots = split_keyframes_by_role(self.rotations)
-            static_locs, anim_locs, unused_locs = split_keyframes_by_role(self.locations)
-            static_scls, anim_scls, unused_scls = split_keyframes_by_role(self.scales)
-            static_uvcs, anim_uvcs, unused_uvcs = split_keyframes_by_role(self.user_channels)
+            static_rots, anim_rots, unused_rots = split_keyframes_by_role(rotations)
+            static_locs, anim_locs, unused_locs = split_keyframes_by_role(locations)
+            static_scls, anim_scls, unused_scls = split_keyframes_by_role(scales)
+            static_uvcs, anim_uvcs, unused_uvcs = split_keyframes_by_role(user_channels)
 
             unused_bones = sorted(list(set(unused_rots).intersection(unused_locs).intersection(unused_scls)))
 
@@ -258,7 +249,8 @@ class AnimInterface:
 
             # Now for the really tough bit
             # It's time to figure out how to divvy up the keyframes into chunks
-            chunk_holders = generate_keyframe_chunks(anim_rots, anim_locs, anim_scls, anim_uvcs, num_frames)
+            chunk_holders = generate_keyframe_chunks(anim_rots, anim_locs, anim_scls, anim_uvcs, num_frames,
+                                                     optimise_chunks)
             readwriter.num_keyframe_chunks = len(chunk_holders)
             readwriter.prepare_read_op()  # This creates enough empty KeyFrameChunk objects for us to fill
 
@@ -346,6 +338,7 @@ class AnimInterface:
                 kf_chunk.keyframed_scales = flatten_list(chunk.later_scales)
                 kf_chunk.keyframed_shader_uniform_values = flatten_list(chunk.later_uvcs)
 
+            F.reserve(virtual_pointer + final_chunk_size)
             readwriter.write()
 
 
@@ -364,13 +357,13 @@ def split_keyframes_by_role(keyframe_set):
     animated = {}
     unused = []
 
-    for bone_idx, keyframes in keyframe_set.items():
-        if len(keyframes) == 0:
+    for bone_idx, track in keyframe_set.items():
+        if len(track) == 0:
             unused.append(bone_idx)
-        elif len(keyframes) == 1:
-            statics[bone_idx] = list(keyframes.values())[0]
+        elif len(track) == 1:
+            statics[bone_idx] = track.values[0]
         else:
-            animated[bone_idx] = keyframes
+            animated[bone_idx] = track
     return statics, animated, unused
 
 
@@ -393,13 +386,13 @@ def staticify_malformed_blend_bones(blend_rots, blend_locs, blend_scls):
 
 def populate_frames(num_frames, animation_data):
     """
-    Takes a dictionary of frame_id: data pairs and produces a list of length num_frames with data inserted at indices
-    specified by frame_id, and None everywhere else.
+    Takes a dictionary of KeyframeTracks and produces a list of length num_frames for each track with the keyframe
+    values inserted at the indices of their frames, and None everywhere else.
     """
     frame_data = {}
-    for bone_id, keyframes in animation_data.items():
+    for bone_id, track in animation_data.items():
         frame_data[bone_id] = [None] * num_frames
-        for frame_id, frame_value in keyframes.items():
+        for frame_id, frame_value in zip(track.frames.tolist(), track.values):
             frame_data[bone_id][frame_id] = frame_value
     return frame_data
 
@@ -411,55 +404,57 @@ def chunk_frames(frames, chunksize):
     return chunked_frames
 
 
-def adaptive_chunk_frames(rotation_frames, location_frames, scale_frames, uvc_frames, num_frames):
-    cuts = [0]
-
+def adaptive_chunk_frames(rotation_frames, location_frames, scale_frames, uvc_frames, keyframe_masks, num_frames,
+                          optimise_chunks=False):
     # Calculate how many bytes each frame will cost to store
-    rotation_costs = bytecost_per_frame(rotation_frames, num_frames, 6)
-    location_costs = bytecost_per_frame(location_frames, num_frames, 12)
-    scale_costs = bytecost_per_frame(scale_frames, num_frames, 12)
-    uvc_costs = bytecost_per_frame(uvc_frames, num_frames, 4)
-    frame_costs = [sum(frames) for frames in zip(rotation_costs, location_costs, scale_costs, uvc_costs)]
+    rotation_masks, location_masks, scale_masks, uvc_masks = keyframe_masks
+    rotation_costs = bytecost_per_frame(rotation_masks, 6)
+    location_costs = bytecost_per_frame(location_masks, 12)
+    scale_costs = bytecost_per_frame(scale_masks, 12)
+    uvc_costs = bytecost_per_frame(uvc_masks, 4)
+    frame_costs = rotation_costs + location_costs + scale_costs + uvc_costs
+    # The cost of the frames after the first frame of a chunk up to frame_idx is then a difference of two of these
+    cumulative_costs = np.concatenate([[0], np.cumsum(frame_costs)]).tolist()
 
     # Calculate how many bits need to get added to the bitvector per frame
     # Do this by determining how many bones are kept track of per animation type
     # and adding one bit per bone, if any bones are animated at all
-    include_rotation_bitvector = sum(rotation_costs) != 0
+    include_rotation_bitvector = np.any(rotation_costs)
     rotation_bitvector_price = len(rotation_frames) * include_rotation_bitvector
-    include_location_bitvector = sum(location_costs) != 0
+    include_location_bitvector = np.any(location_costs)
     location_bitvector_price = len(location_frames) * include_location_bitvector
-    include_scale_bitvector = sum(scale_costs) != 0
+    include_scale_bitvector = np.any(scale_costs)
     scale_bitvector_price = len(scale_frames) * include_scale_bitvector
-    include_uvc_bitvector = sum(uvc_costs) != 0
+    include_uvc_bitvector = np.any(uvc_costs)
     uvc_bitvector_price = len(uvc_frames) * include_uvc_bitvector
 
-    bitvector_frame_cost = rotation_bitvector_price + location_bitvector_price + scale_bitvector_price + uvc_bitvector_price
+    bitvector_frame_cost = int(rotation_bitvector_price + location_bitvector_price + scale_bitvector_price + uvc_bitvector_price)
 
 
     # The rot + loc + scale gets rounded up to nearest 4
-    first_frame_price = roundup(frame_costs[0], 4)
-    # This is the cost of a chunk containing only the first-frame data. Includes a 16-byte header + round up to 16
-    additional_cost = roundup(first_frame_price + 16, 16)
-    bitvector_bitcost = 0
-    maximum_cost = 0xFFFF - additional_cost   # Presumably, need to subtract off the cost of the final frame chunk: the first frame price?
-    maximum_cost = 0x2000
-    # Skip the first frame, we already know how much that one costs
-    for frame_idx in range(1, num_frames):
-        animation_cost = sum(frame_costs[cuts[-1]+1:frame_idx+1])
-        bitvector_bitcost += bitvector_frame_cost
-        bitvector_cost = roundup(bitvector_bitcost, 8) // 8
-
-        total_chunk_cost = roundup(roundup(16 + first_frame_price + bitvector_cost + animation_cost, 4), 16)
-
-        exceeded_cost = total_chunk_cost >= maximum_cost
-        at_maximum_frames = frame_idx - cuts[-1] == 130  # Not sure if this limitation is necessary, implements 128 per chunk
-        if exceeded_cost or at_maximum_frames:
-            assert frame_idx-1 != cuts[-1], "Frame {frame_idx} too expensive to convert to DSCS frame [requires {current_cost}/{maximum_cost} available bytes]. Reduce number of animated bones in this frame to export."
-            cuts.append(frame_idx-1)
-            # Don't count this frame, since it will be replaced by the maximum cost as the new "frame 0" of the new
-            # chunk
-            bitvector_bitcost = 0
-    cuts.append(num_frames)
+    first_frame_price = roundup(int(frame_costs[0]), 4)
+    if optimise_chunks:
+        cuts = get_optimal_chunk_cuts(cumulative_costs, first_frame_price, bitvector_frame_cost, num_frames)
+    else:
+        cuts = [0]
+        # The bitvector is only counted from the frame after the last cut was made
+        bitvector_start = 0
+        # Skip the first frame, we already know how much that one costs
+        for frame_idx in range(1, num_frames):
+            animation_cost = cumulative_costs[frame_idx+1] - cumulative_costs[cuts[-1]+1]
+            bitvector_bitcost = (frame_idx - bitvector_start) * bitvector_frame_cost
+            total_chunk_cost = get_chunk_cost(first_frame_price, bitvector_bitcost, animation_cost)
+
+            exceeded_cost = total_chunk_cost >= maximum_chunk_bytes
+            # Not sure if this limitation is necessary, implements 128 per chunk
+            at_maximum_frames = frame_idx - 1 - cuts[-1] == maximum_chunk_frames
+            if exceeded_cost or at_maximum_frames:
+                assert frame_idx-1 != cuts[-1], "Frame {frame_idx} too expensive to convert to DSCS frame [requires {current_cost}/{maximum_chunk_bytes} available bytes]. Reduce number of animated bones in this frame to export."
+                cuts.append(frame_idx-1)
+                # Don't count this frame, since it will be replaced by the maximum cost as the new "frame 0" of the new
+                # chunk
+                bitvector_start = frame_idx
+        cuts.append(num_frames)
 
     rotation_chunks = {}
     location_chunks = {}
@@ -478,30 +473,78 @@ def adaptive_chunk_frames(rotation_frames, location_frames, scale_frames, uvc_fr
     return rotation_chunks, location_chunks, scale_chunks, uvc_chunks, chunksizes
 
 
-def bytecost_per_frame(frames, num_frames, cost):
+def get_optimal_chunk_cuts(cumulative_costs, first_frame_price, bitvector_frame_cost, num_frames):
+    """
+    Finds the frames to cut the animation at so that the keyframe chunks take up the fewest bytes in total, by dynamic
+    programming over the position of the last cut before each frame. Every chunk repeats a full first frame, so this
+    trades the cost of cutting against the per-chunk limits of 'maximum_chunk_bytes' bytes and 'maximum_chunk_frames'
+    frames.
+
+    generate_keyframe_chunks moves the final frame of the animation into a chunk of its own, so the last chunk is
+    priced without it and has to contain at least two frames.
+    """
+    if num_frames <= 2:
+        return [0, num_frames]
+
+    cumulative_costs = np.asarray(cumulative_costs, dtype=np.int64)
+    smallest_sizes = np.full(num_frames + 1, np.inf)
+    smallest_sizes[0] = 0.
+    previous_cuts = np.zeros(num_frames + 1, dtype=np.int64)
+    for end in range(1, num_frames + 1):
+        starts = np.arange(max(end - maximum_chunk_frames, 0), end)
+        last_frame = end
+        if end == num_frames:
+            starts = starts[starts <= end - 2]
+            last_frame = end - 1
+        animation_costs = cumulative_costs[last_frame] - cumulative_costs[starts + 1]
+        bitvector_bitcosts = (last_frame - starts - 1) * bitvector_frame_cost
+        chunk_costs = get_chunk_cost(first_frame_price, bitvector_bitcosts, animation_costs)
+
+        sizes = np.where(chunk_costs < maximum_chunk_bytes, smallest_sizes[starts] + chunk_costs + chunk_header_overhead,
+                         np.inf)
+        best_idx = int(np.argmin(sizes))
+        smallest_sizes[end] = sizes[best_idx]
+        previous_cuts[end] = starts[best_idx]
+    assert np.isfinite(smallest_sizes[num_frames]), f"Animation cannot be split into keyframe chunks of fewer than {maximum_chunk_bytes} bytes. Reduce number of animated bones to export."
+
+    cuts = [num_frames]
+    while cuts[-1] != 0:
+        cuts.append(int(previous_cuts[cuts[-1]]))
+    return cuts[::-1]
+
+
+def get_chunk_cost(first_frame_price, bitvector_bitcost, animation_cost):
+    """
+    The size in bytes of a keyframe chunk, given the size of its first frame, the number of bits in its keyframe
+    bitvector, and the size of its remaining keyframes. Includes the 16-byte header and rounding up to 16 bytes.
+    """
+    bitvector_cost = roundup(bitvector_bitcost, 8) // 8
+    return roundup(roundup(16 + first_frame_price + bitvector_cost + animation_cost, 4), 16)
+
+
+def get_keyframe_masks(num_frames, animation_data):
+    """
+    Takes a dictionary of KeyframeTracks and produces a boolean array of shape (num_tracks, num_frames) that is True
+    at the frames of each track's keyframes.
+    """
+    masks = np.zeros((len(animation_data), num_frames), dtype=bool)
+    for row, track in enumerate(animation_data.values()):
+        masks[row, track.frames] = True
+    return masks
+
+
+def bytecost_per_frame(masks, cost):
     """
-    Count the number of bytes required to store each frame in a series of frames organised in a nested dict as
-    {bone_idxs: {frame_idxs: value}}
+    Count the number of bytes required to store each frame in a series of frames, given the keyframe masks of each
+    track as an array of shape (num_tracks, num_frames)
     """
-    costs = [0]*num_frames
-    for bone_id, data in frames.items():
-        for frame_idx, value in enumerate(data):
-            if value is not None:
-                costs[frame_idx] += cost
-    return costs
+    return np.count_nonzero(masks, axis=0) * cost
 
 
 def boil_down_chunk(chunk):
-    bitvector = ''
-    reduced_chunk = []
-    indices = []
-    for j, value in enumerate(chunk):
-        if value is None:
-            bitvector += '0'
-        else:
-            bitvector += '1'
-            reduced_chunk.append(value)
-            indices.append(j)
+    bitvector = np.array([value is not None for value in chunk], dtype=bool)
+    indices = np.flatnonzero(bitvector).tolist()
+    reduced_chunk = [chunk[j] for j in indices]
     return reduced_chunk, bitvector, indices
 
 
@@ -535,7 +578,7 @@ def strip_and_validate(keyframes, chunksizes, method):
         skipped_chunks = []
         # This should *never* be the case for the first chunk
         # Every chunk must have data in its first frame, so check if what we have does...
-        if bitvector[0] == '0':
+        if not bitvector[0]:
             if chunk_idx == 0:
                 assert 0, "Invalid input data to animation: first frame has no data."
             # If it doesn't, we'll need to interpolate it using the closest data in the past (from the previous chunk)
@@ -548,7 +591,7 @@ def strip_and_validate(keyframes, chunksizes, method):
             for i, (iter_initial_pair, bv) in enumerate(zip(initial_values[chunk_idx:], bitvectors[chunk_idx:])):
                 # If the chunk doesn't have an initial value, we need to interpolate that value
                 # So keep track of the chunk if we need to interpolate its first value
-                if bv[0] == '0':
+                if not bv[0]:
                     skipped_chunks.append(chunk_idx + i)
                 # If the chunk contains *some* data, stop here because we've found the next non-zero value
                 # We'll carry this value forward and use it as the end point of the interpolation.
@@ -568,9 +611,10 @@ def strip_and_validate(keyframes, chunksizes, method):
                 interpolation_index = sum(chunksizes[:skipped_chunk_idx])
                 t = ((interpolation_index - absolute_start_frame_index) / (absolute_end_frame_index - absolute_start_frame_index))
                 # Interpolate
-                interpolated_frame_data = method(np.array(interp_start_data), np.array(interp_end_data), t)  # Needs to be lerp for pos, slerp for quat
+                interpolated_frame_data = method(np.array(interp_start_data, dtype=float), np.array(interp_end_data, dtype=float), t)  # Needs to be lerp for pos, slerp for quat
                 # Make relevant assignments to register the interpolated frame
-                bitvectors[skipped_chunk_idx] = '1' + bitvectors[skipped_chunk_idx][1:]
+                bitvectors[skipped_chunk_idx] = bitvectors[skipped_chunk_idx].copy()
+                bitvectors[skipped_chunk_idx][0] = True
                 reduced_chunks[skipped_chunk_idx] = [interpolated_frame_data, *reduced_chunks[skipped_chunk_idx]]
                 already_handled_chunks.extend(skipped_chunks)
 
@@ -587,11 +631,12 @@ def strip_and_validate_all_bones(frame_data, chunksizes, interpolation_method):
         bitvector_data[bone_idx] = bitvectors
     for (bone_idx, bone_data), bitvectors in zip(keyframe_chunks_data.items(), bitvector_data.values()):
         for subdata, bitvector in zip(bone_data, bitvectors):
-            assert len(subdata) == sum([elem == '1' for elem in bitvector]), f"{bone_idx}"
+            assert len(subdata) == np.count_nonzero(bitvector), f"{bone_idx}"
     return keyframe_chunks_data, bitvector_data
 
 
-def generate_keyframe_chunks(animated_rotations, animated_locations, animated_scales, animated_uvcs, num_frames):
+def generate_keyframe_chunks(animated_rotations, animated_locations, animated_scales, animated_uvcs, num_frames,
+                             optimise_chunks=False):
     """
     This function has a very high bug potential...
     """
@@ -601,8 +646,12 @@ def generate_keyframe_chunks(animated_rotations, animated_locations, animated_sc
     scales = populate_frames(num_frames, animated_scales)
     uvcs = populate_frames(num_frames, animated_uvcs)
 
-    # The above is done so that the frames can be easily chunked by this function:
-    rotations, locations, scales, uvcs, chunksizes = adaptive_chunk_frames(rotations, locations, scales, uvcs, num_frames)
+    # The above is done so that the frames can be easily chunked by this function, which prices each frame using the
+    # keyframe masks of the tracks:
+    keyframe_masks = [get_keyframe_masks(num_frames, animation_data)
+                      for animation_data in (animated_rotations, animated_locations, animated_scales, animated_uvcs)]
+    rotations, locations, scales, uvcs, chunksizes = adaptive_chunk_frames(rotations, locations, scales, uvcs,
+                                                                           keyframe_masks, num_frames, optimise_chunks)
         
     # And now we can iterate through the chunks and strip out the None values, and save the results
     # We also might need to perform some interpolation inside these functions in order to satisfy the requirements of
@@ -629,10 +678,10 @@ def generate_keyframe_chunks(animated_rotations, animated_locations, animated_sc
             chunk_data[i][3][channel_idx] = uvc_data
 
     # We also need the final elements of each animation
-    final_rotations = {bone_id: [list(data.values())[-1]] for bone_id, data in animated_rotations.items()}
-    final_locations = {bone_id: [list(data.values())[-1]] for bone_id, data in animated_locations.items()}
-    final_scales = {bone_id: [list(data.values())[-1]] for bone_id, data in animated_scales.items()}
-    final_uvcs = {channel_id: [list(data.values())[-1]] for channel_id, data in animated_uvcs.items()}
+    final_rotations = {bone_id: [track.values[-1]] for bone_id, track in animated_rotations.items()}
+    final_locations = {bone_id: [track.values[-1]] for bone_id, track in animated_locations.items()}
+    final_scales = {bone_id: [track.values[-1]] for bone_id, track in animated_scales.items()}
+    final_uvcs = {channel_id: [track.values[-1]] for channel_id, track in animated_uvcs.items()}
 
     chunks = []
     if num_frames > 1:
@@ -660,8 +709,8 @@ def generate_keyframe_chunks(animated_rotations, animated_locations, animated_sc
                                                          pen_r_bitvecs, pen_l_bitvecs, pen_s_bitvecs, pen_u_bitvecs,
                                                          chunksizes[-1]))
     chunks.append(ChunkHolder(final_rotations, final_locations, final_scales, final_uvcs,
-                              ['1' for _ in final_rotations], ['1' for _ in final_locations],
-                              ['1' for _ in final_scales], ['1' for _ in final_uvcs],
+                              [np.ones(1, dtype=bool) for _ in final_rotations], [np.ones(1, dtype=bool) for _ in final_locations],
+                              [np.ones(1, dtype=bool) for _ in final_scales], [np.ones(1, dtype=bool) for _ in final_uvcs],
                               1))
 
     return chunks
@@ -693,12 +742,12 @@ class ChunkHolder:
         bytes_read += (4 - (bytes_read % 4)) % 4
         bytes_read += self.initial_uvc_bytes
 
-        total_rotation_bitvector = ''.join([elem[1:] for elem in rotation_bitvector])
-        total_location_bitvector = ''.join([elem[1:] for elem in location_bitvector])
-        total_scale_bitvector = ''.join([elem[1:] for elem in scale_bitvector])
-        total_uvc_bitvector = ''.join([elem[1:] for elem in uvc_bitvector])
+        total_rotation_bitvector = join_bitvectors([elem[1:] for elem in rotation_bitvector])
+        total_location_bitvector = join_bitvectors([elem[1:] for elem in location_bitvector])
+        total_scale_bitvector = join_bitvectors([elem[1:] for elem in scale_bitvector])
+        total_uvc_bitvector = join_bitvectors([elem[1:] for elem in uvc_bitvector])
 
-        self.total_bitvector = total_rotation_bitvector + total_location_bitvector + total_scale_bitvector + total_uvc_bitvector
+        self.total_bitvector = join_bitvectors([total_rotation_bitvector, total_location_bitvector, total_scale_bitvector, total_uvc_bitvector])
         self.bitvector_size = roundup(len(self.total_bitvector), 8) // 8
         bytes_read += self.bitvector_size
 
@@ -745,11 +794,11 @@ class ChunkHolder:
         self.contained_frames = contained_frames
 
         # Error checking
-        assert len(flatten_list(self.later_rotations)) == sum([elem == '1' for elem in total_rotation_bitvector]), \
+        assert len(flatten_list(self.later_rotations)) == np.count_nonzero(total_rotation_bitvector), \
                "Number of rotation frames in keyframe chunk did not equal the number of rotations."
-        assert len(flatten_list(self.later_locations)) == sum([elem == '1' for elem in total_location_bitvector]), \
+        assert len(flatten_list(self.later_locations)) == np.count_nonzero(total_location_bitvector), \
                "Number of location frames in keyframe chunk did not equal the number of locations."
-        assert len(flatten_list(self.later_scales)) == sum([elem == '1' for elem in total_scale_bitvector]), \
+        assert len(flatten_list(self.later_scales)) == np.count_nonzero(total_scale_bitvector), \
                "Number of scale frames in keyframe chunk did not equal the number of scales."
         # Do UVCs? Needs to be handled differently because 1 float per channel instead of a list of floats
 
@@ -772,7 +821,7 @@ def cut_final_frame(data, bitvector):
     return_bitvector = {}
     for i, ((bidx, datum), bv) in enumerate(zip(data.items(), bitvector)):
         # If the data contains the final frame, remove it
-        if bv[-1] == '1' and len(datum) > 1:
+        if bv[-1] and len(datum) > 1:
             return_data[bidx] = list(datum)[:-1]
         else:
             return_data[bidx] = list(datum)
@@ -782,20 +831,20 @@ def cut_final_frame(data, bitvector):
     return return_data, list(return_bitvector.values())
 
 
-def match_quat_signs_in_dict(dictquats):
-    keys = list(dictquats.keys())
-    quats = list(dictquats.values())
-    if len(quats) > 0:
-        to_return = [quats[0]]
-        for quat in quats[1:]:
-            to_return.append(match_quaternion_signs(to_return[-1], quat))
-        return {key: value for key, value in zip(keys, to_return)}
-    else:
-        return dictquats
-
+def join_bitvectors(bitvectors):
+    """
+    Concatenates a list of boolean keyframe bitvectors into a single bitvector, which may be empty.
+    """
+    return np.concatenate([np.zeros(0, dtype=bool), *bitvectors])
 
-def match_quaternion_signs(comparison_quat, quat):
-    dp = np.dot(comparison_quat, quat)
-    sign = np.sign(dp)
 
-    return sign * quat
+def match_quaternion_signs(quats):
+    """
+    Flips the signs of an array of quaternions of shape (num_quaternions, 4) so that each quaternion is in the same
+    hemisphere as the one before it, once that one has been flipped.
+    """
+    if len(quats) < 2:
+        return quats
+    # Each sign flip carries on to every later quaternion, so the signs are a running product
+    signs = np.cumprod(np.concatenate([[1.], np.sign(np.einsum('ij,ij->i', quats[:-1], quats[1:], dtype=float))]))
+    return (quats * signs[:, np.newaxis]).astype(quats.dtype)
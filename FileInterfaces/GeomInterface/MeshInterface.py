@@ -1,40 +1,124 @@
 import numpy as np
 from ...FileReaders.GeomReader.VertexComponents import vertex_components_from_names_dscs, vertex_components_from_names_megido
 from ...Utilities.StringHashing import int_to_BE_hex, BE_hex_to_int
+from ...Utilities.VertexTable import VertexTable, as_vertex_table
 
 
 ##################################
 #  Polygon data type converters  #
 ##################################
 def triangle_strips_to_polys(idxs):
-    triangles = []
-    for i, tri in enumerate(zip(idxs, idxs[1:], idxs[2:])):
-        order = i % 2
-        tri = (tri[0 + order], tri[1 - order], tri[2])
-        triangle = set(tri)
-        if not (len(triangle) != 3 or tri in triangles):
-            triangles.append(tri)
-    return triangles
+    """
+    Converts a triangle strip into an array of triangles of shape (num_triangles, 3). Degenerate triangles, and repeats
+    of triangles that have already appeared in the strip, are removed.
+    """
+    idxs = np.asarray(idxs, dtype=np.int64)
+    if len(idxs) < 3:
+        return np.zeros((0, 3), dtype=np.int64)
+    triangles = np.stack([idxs[:-2], idxs[1:-1], idxs[2:]], axis=1)
+    # Every other triangle in the strip has the opposite winding order
+    triangles[1::2, :2] = triangles[1::2][:, [1, 0]]
+
+    degenerate = (triangles[:, 0] == triangles[:, 1]) | (triangles[:, 1] == triangles[:, 2]) | (triangles[:, 0] == triangles[:, 2])
+    triangles = triangles[~degenerate]
+
+    # Pack each triangle into a single integer so that repeats can be found with np.unique, keeping first occurrences
+    base = np.max(idxs) + 1
+    keys = (triangles[:, 0] * base + triangles[:, 1]) * base + triangles[:, 2]
+    _, first_occurrences = np.unique(keys, return_index=True)
+    return triangles[np.sort(first_occurrences)]
 
 
 def triangles_to_polys(idxs):
-    triangles = []
-    for tri, (idx_a, idx_b, idx_c) in enumerate(zip(idxs[::3], idxs[1::3], idxs[2::3])):
-        triangles.append((idx_a, idx_b, idx_c))
-    return triangles
+    idxs = np.asarray(idxs, dtype=np.int64)
+    return idxs[:3 * (len(idxs) // 3)].reshape((-1, 3))
 
 
 triangle_converters = {'Triangles': triangles_to_polys,
                        'TriangleStrips': triangle_strips_to_polys}
 
 
+def polys_to_triangle_strips(polys):
+    """
+    Greedily joins triangles that share an edge into strips, and stitches the strips into a single triangle strip with
+    degenerate triangles. The winding order of every triangle is kept.
+
+    Returns None if the triangles cannot be represented exactly by a strip, e.g. if a triangle is degenerate or
+    repeated, since these are removed when strips are read.
+    """
+    triangles = [tuple(int(idx) for idx in poly) for poly in polys]
+    if not len(triangles) or any([len(set(triangle)) != 3 for triangle in triangles]):
+        return None
+
+    # Directed edge -> the triangles with that edge in their winding order
+    edge_triangles = {}
+    for triangle_idx, (idx_a, idx_b, idx_c) in enumerate(triangles):
+        for edge in ((idx_a, idx_b), (idx_b, idx_c), (idx_c, idx_a)):
+            edge_triangles.setdefault(edge, []).append(triangle_idx)
+    used = [False] * len(triangles)
+
+    def find_unused_triangle(edge):
+        for triangle_idx in edge_triangles.get(edge, []):
+            if not used[triangle_idx]:
+                return triangle_idx
+        return None
+
+    def get_next_edge(strip):
+        # Triangles at odd positions in a strip have their first two vertices swapped when the strip is read
+        if (len(strip) - 2) % 2:
+            return strip[-1], strip[-2]
+        return strip[-2], strip[-1]
+
+    strips = []
+    for start_idx, (idx_a, idx_b, idx_c) in enumerate(triangles):
+        if used[start_idx]:
+            continue
+        used[start_idx] = True
+
+        # Start from whichever rotation of the triangle can be continued into a neighbouring triangle
+        rotations = ([idx_a, idx_b, idx_c], [idx_b, idx_c, idx_a], [idx_c, idx_a, idx_b])
+        strip = next((rotation for rotation in rotations if find_unused_triangle(get_next_edge(rotation)) is not None),
+                     rotations[0])
+        while True:
+            edge = get_next_edge(strip)
+            triangle_idx = find_unused_triangle(edge)
+            if triangle_idx is None:
+                break
+            used[triangle_idx] = True
+            strip.append(sum(triangles[triangle_idx]) - edge[0] - edge[1])
+        strips.append(strip)
+
+    idxs = strips[0]
+    for strip in strips[1:]:
+        # Each strip has to start on an even position so that the winding order of its triangles is kept
+        if len(idxs) % 2:
+            idxs.append(idxs[-1])
+        idxs.extend([idxs[-1], strip[0]])
+        idxs.extend(strip)
+
+    # Check that the strip reads back as the same triangles, up to the rotation of each triangle
+    if not np.array_equal(sort_triangles(triangle_strips_to_polys(idxs)), sort_triangles(triangles)):
+        return None
+    return idxs
+
+
+def sort_triangles(triangles):
+    """
+    Rotates each triangle to start at its smallest index, keeping its winding order, and sorts the triangles.
+    """
+    triangles = np.asarray(triangles, dtype=np.int64).reshape((-1, 3))
+    rotations = np.argmin(triangles, axis=1)[:, np.newaxis]
+    triangles = np.take_along_axis(triangles, (rotations + np.arange(3)) % 3, axis=1)
+    return triangles[np.lexsort(triangles.T[::-1])]
+
+
 class MeshInterface:
     def __init__(self):
         self.meshflags = None
         self.name_hash = None
         self.bounding_sphere_radius = None
 
-        self.vertices = []
+        self.vertices = VertexTable()
         self.vertex_group_bone_idxs = []
         self.polygons = []
         self.material_id = None
@@ -54,7 +138,7 @@ class MeshInterface:
 
         interface.vertices = process_posweights(meshReader.vertex_data, meshReader.max_vertex_groups_per_vertex)
         interface.vertex_group_bone_idxs = meshReader.weighted_bone_idxs
-        interface.polygons = triangle_converters[meshReader.polygon_data_type](meshReader.polygon_data)
+        interface.polygons = triangle_converters[meshReader.polygon_data_type](meshReader.polygon_data).tolist()
         interface.material_id = meshReader.material_id
 
         interface.unknown_data['bb'] = meshReader.bounding_box_lengths
@@ -66,7 +150,7 @@ class MeshInterface:
 
         return interface
 
-    def to_subfile(self, meshReader, virtual_pos, platform):
+    def to_subfile(self, meshReader, virtual_pos, platform, use_triangle_strips=False):
         meshReader.vertex_data_start_ptr = virtual_pos
 
         if platform == 'Megido':
@@ -76,18 +160,27 @@ class MeshInterface:
         else:
             raise Exception(f"Unknown platform '{platform}' encountered in MeshInterface's MeshReader generator.")
 
+        # Vertices may also have been given as a list of per-vertex dicts
+        vertices = as_vertex_table(self.vertices)
         vgroup_idxs = self.vertex_group_bone_idxs
-        meshReader.bytes_per_vertex, meshReader.vertex_components = vertex_property_calculator(self.vertices, vgroup_idxs)
-        vertex_generators = [vc.generator for vc in meshReader.vertex_components]
+        meshReader.bytes_per_vertex, meshReader.vertex_components = vertex_property_calculator(vertices, vgroup_idxs)
 
-        meshReader.vertex_data = generate_vertex_data(self.vertices, vertex_generators)
+        meshReader.vertex_data = generate_vertex_data(vertices, meshReader.vertex_components)
 
-        virtual_pos += meshReader.bytes_per_vertex * len(meshReader.vertex_data)
+        virtual_pos += meshReader.bytes_per_vertex * len(vertices)
         meshReader.weighted_bone_data_start_ptr = virtual_pos
         meshReader.weighted_bone_idxs = vgroup_idxs
         virtual_pos += 4 * len(meshReader.weighted_bone_idxs)
         meshReader.polygon_data_start_ptr = virtual_pos
         meshReader.polygon_data = polys_to_triangles(self.polygons)
+        meshReader.polygon_numeric_data_type = 4
+        if use_triangle_strips:
+            # Only use the strip if it is smaller than the triangle list
+            triangle_strip = polys_to_triangle_strips(self.polygons)
+            if triangle_strip is not None and len(triangle_strip) < len(meshReader.polygon_data):
+                meshReader.polygon_data = triangle_strip
+                polygon_type_ids = {value: key for key, value in meshReader.get_polygon_type_defs().items()}
+                meshReader.polygon_numeric_data_type = polygon_type_ids['TriangleStrips']
         virtual_pos += 2 * len(meshReader.polygon_data)
         virtual_pos += (4 - (virtual_pos % 4)) % 4  # Fix ragged chunk of size 4
         meshReader.padding_0x18 = 0
@@ -98,13 +191,12 @@ class MeshInterface:
         meshReader.num_vertex_components = len(meshReader.vertex_components)
         meshReader.always_5123 = meshReader.header_breaker
 
-        meshReader.max_vertex_groups_per_vertex = max([len(vtx['WeightedBoneID']) if vtx['WeightedBoneID'] is not None else 0 for vtx in self.vertices])
+        meshReader.max_vertex_groups_per_vertex = vertices.max_vertex_groups
         meshReader.max_vertex_groups_per_vertex = 0 if len(meshReader.weighted_bone_idxs) == 1 else meshReader.max_vertex_groups_per_vertex
         meshReader.meshflags = self.meshflags
-        meshReader.polygon_numeric_data_type = 4  # Can only write to triangles atm
         meshReader.name_hash = BE_hex_to_int(self.name_hash)
         meshReader.material_id = self.material_id
-        meshReader.num_vertices = len(meshReader.vertex_data)
+        meshReader.num_vertices = len(vertices)
 
         meshReader.num_polygon_idxs = len(meshReader.polygon_data)
         meshReader.padding_0x44 = 0
@@ -112,7 +204,8 @@ class MeshInterface:
         meshReader.bounding_sphere_radius = self.bounding_sphere_radius
 
         if self.mesh_centre is None:
-            vertices = np.array([v['Position'] for v in self.vertices])
+            # The bounding sphere radius is calculated at double precision, as positions are stored as float32
+            vertices = vertices.attributes['Position'].astype(float)
             minvs = np.min(vertices, axis=0)
             maxvs = np.max(vertices, axis=0)
             mesh_centre = (maxvs + minvs) / 2
@@ -130,29 +223,22 @@ class MeshInterface:
         return virtual_pos
 
 
-def process_posweights(vertices, max_vertex_groups_per_vertex):
-    example_vertex = vertices[0]
-    if 'WeightedBoneID' in example_vertex:
-        for vtx in vertices:
-            res_ids = []
-            res_wghts = []
-            for id, wght in zip(vtx['WeightedBoneID'], vtx['BoneWeight']):
-                if wght != 0.:
-                    res_ids.append(id//3)
-                    res_wghts.append(wght)
-            vtx['WeightedBoneID'] = res_ids
-            vtx['BoneWeight'] = res_wghts
-            if len(vtx['WeightedBoneID']) != len(vtx['BoneWeight']):
-                assert 0, f"{vtx['WeightedBoneID']} {vtx['BoneWeight']}"
+def process_posweights(vertex_attributes, max_vertex_groups_per_vertex):
+    """
+    Converts the vertex attributes decoded by a MeshReader into a VertexTable, moving the bone indices that are stored
+    in the vertex positions or implied by the mesh into the vertex groups.
+    """
+    vertices = VertexTable({key: data for key, data in vertex_attributes.items() if key not in VertexTable.vertex_group_keys})
+    if 'WeightedBoneID' in vertex_attributes:
+        # Bone ids are stored as 3x the index of the vertex group, and unused entries have zero weight
+        vertices.set_vertex_group_arrays(np.asarray(vertex_attributes['WeightedBoneID']).astype(np.int64) // 3,
+                                         vertex_attributes['BoneWeight'])
     elif max_vertex_groups_per_vertex == 0:
-        for vtx in vertices:
-            vtx['WeightedBoneID'] = [0]
-            vtx['BoneWeight'] = [1]
+        vertices.set_vertex_group_arrays(np.zeros((len(vertices), 1)), np.ones((len(vertices), 1)))
     elif max_vertex_groups_per_vertex == 1:
-        for vtx in vertices:
-            vtx['WeightedBoneID'] = [int(vtx['Position'][3]) // 3]
-            vtx['BoneWeight'] = [1]
-            vtx['Position'] = vtx['Position'][:3]
+        positions = vertices.attributes['Position']
+        vertices.set_vertex_group_arrays(positions[:, 3:4].astype(np.int64) // 3, np.ones((len(vertices), 1)))
+        vertices.set_attribute('Position', positions[:, :3])
     else:
         assert 0, "Something went seriously wrong when processing posweights."
 
@@ -167,37 +253,36 @@ def calculate_vertex_properties_dscs(vertices, num_vertex_groups):
 
     bytes_per_vertex = 0
     vertex_components = []
-    example_vertex = vertices[0]
-    max_vtx_groups = max([len(vtx['WeightedBoneID']) for vtx in vertices])
-    if 'Position' in example_vertex:
+    max_vtx_groups = vertices.max_vertex_groups
+    if 'Position' in vertices:
         if max_vtx_groups == 1 and len(num_vertex_groups) > 1:
             vertex_components.append(vertex_components_from_names['PosWeight'](bytes_per_vertex, 0))
             bytes_per_vertex += 16
         else:
             vertex_components.append(vertex_components_from_names['Position'](bytes_per_vertex, 0))
             bytes_per_vertex += 12
-    if 'Normal' in example_vertex:
+    if 'Normal' in vertices:
         vertex_components.append(vertex_components_from_names['Normal'](bytes_per_vertex, 0))
         bytes_per_vertex += 8
-    if 'UV' in example_vertex:
+    if 'UV' in vertices:
         vertex_components.append(vertex_components_from_names['UV'](bytes_per_vertex, 0))
         bytes_per_vertex += 4
-    if 'UV2' in example_vertex:
+    if 'UV2' in vertices:
         vertex_components.append(vertex_components_from_names['UV2'](bytes_per_vertex, 0))
         bytes_per_vertex += 4
-    if 'UV3' in example_vertex:
+    if 'UV3' in vertices:
         vertex_components.append(vertex_components_from_names['UV3'](bytes_per_vertex, 0))
         bytes_per_vertex += 4
-    if 'Colour' in example_vertex:
+    if 'Colour' in vertices:
         vertex_components.append(vertex_components_from_names['Colour'](bytes_per_vertex, 0))
         bytes_per_vertex += 8
-    if 'Tangent' in example_vertex:
+    if 'Tangent' in vertices:
         vertex_components.append(vertex_components_from_names['Tangent4'](bytes_per_vertex, 0))
         bytes_per_vertex += 8
-    if 'Binormal' in example_vertex:
+    if 'Binormal' in vertices:
         vertex_components.append(vertex_components_from_names['Binormal'](bytes_per_vertex, 0))
         bytes_per_vertex += 8
-    if 'WeightedBoneID' in example_vertex and max_vtx_groups >= 2:
+    if 'WeightedBoneID' in vertices and max_vtx_groups >= 2:
         num_grps = max_vtx_groups
         vertex_components.append(vertex_components_from_names[f'Indices{num_grps}'](bytes_per_vertex, 0))
         nominal_bytes = num_grps
@@ -218,36 +303,35 @@ def calculate_vertex_properties_megido(vertices, num_vertex_groups):
 
     bytes_per_vertex = 0
     vertex_components = []
-    example_vertex = vertices[0]
-    max_vtx_groups = max([len(vtx['WeightedBoneID']) for vtx in vertices])
-    if 'Position' in example_vertex:
+    max_vtx_groups = vertices.max_vertex_groups
+    if 'Position' in vertices:
         vertex_components.append(vertex_components_from_names['Position'](bytes_per_vertex, 0))
         bytes_per_vertex += 12
-    if 'Normal' in example_vertex:
+    if 'Normal' in vertices:
         vertex_components.append(vertex_components_from_names['NormalH'](bytes_per_vertex, 1))
         vertex_components[-1].normalise = True
         bytes_per_vertex += 8
-    if 'UV' in example_vertex:
+    if 'UV' in vertices:
         vertex_components.append(vertex_components_from_names['UVH'](bytes_per_vertex, 0))
         bytes_per_vertex += 4
-    if 'UV2' in example_vertex:
+    if 'UV2' in vertices:
         vertex_components.append(vertex_components_from_names['UV2H'](bytes_per_vertex, 0))
         bytes_per_vertex += 4
-    if 'UV3' in example_vertex:
+    if 'UV3' in vertices:
         vertex_components.append(vertex_components_from_names['UV3H'](bytes_per_vertex, 0))
         bytes_per_vertex += 4
-    if 'Colour' in example_vertex:
+    if 'Colour' in vertices:
         vertex_components.append(vertex_components_from_names['ByteColour'](bytes_per_vertex, 1))
         bytes_per_vertex += 8
-    if 'Tangent' in example_vertex:
-        vertex_components.append(vertex_components_from_names['TangentH'](bytes_per_vertex, 1))
+    if 'Tangent' in vertices:
+        vertex_components.append(vertex_components_from_names['Tangent3'](bytes_per_vertex, 1))
         bytes_per_vertex += 8
-    if 'Binormal' in example_vertex:
+    if 'Binormal' in vertices:
         vertex_components.append(vertex_components_from_names['BinormalH'](bytes_per_vertex, 1))
         bytes_per_vertex += 8
-    if 'WeightedBoneID' in example_vertex and max_vtx_groups >= 1:
+    if 'WeightedBoneID' in vertices and max_vtx_groups >= 1:
         num_grps = max_vtx_groups
-        vertex_components.append(vertex_components_from_names[f'Indices{num_grps}'](bytes_per_vertex))
+        vertex_components.append(vertex_components_from_names[f'Indices{num_grps}'](bytes_per_vertex, 0))
         nominal_bytes = num_grps
         bytes_per_vertex += nominal_bytes + ((4 - (nominal_bytes % 4)) % 4)
         vertex_components[-1].normalise = True
@@ -260,12 +344,8 @@ def calculate_vertex_properties_megido(vertices, num_vertex_groups):
     return bytes_per_vertex, vertex_components
 
 
-def generate_vertex_data(vertices, generators):
-    retval = []
-    for vertex in vertices:
-        vdata = [generator(vertex) for generator in generators]
-        retval.append({k: v for d in vdata for k, v in d.items()})
-    return retval
+def generate_vertex_data(vertices, vertex_components):
+    return {vertex_component.vertex_type: vertex_component.generator(vertices) for vertex_component in vertex_components}
 
 
 def polys_to_triangles(polys):
@@ -1,4 +1,6 @@
+from ...FileReaders.BaseRW import BufferWriter
 from ...FileReaders.GeomReader import GeomReader
+from ...Utilities.VertexTable import as_vertex_table
 from .MeshInterface import MeshInterface
 from .MaterialInterface import MaterialInterface
 from .LightSourceInterface import LightSourceInterface
@@ -40,10 +42,19 @@ class GeomInterface:
         return interface
 
     @classmethod
-    def from_file(cls, path, platform):
+    def from_file(cls, path, platform, validation_level='strict', profiler=None):
         with open(path, 'rb') as F:
-            readwriter = GeomReader.for_platform(F, platform)
-            readwriter.read()
+            return cls.from_bytes(F.read(), platform, validation_level, profiler)
+
+    @classmethod
+    def from_bytes(cls, data, platform, validation_level='strict', profiler=None):
+        """
+        Builds the interface from the contents of a geom file, e.g. an mmap or a blob extracted from an archive.
+        """
+        readwriter = GeomReader.for_platform(data, platform)
+        readwriter.set_validation_level(validation_level)
+        readwriter.set_profiler(profiler)
+        readwriter.read()
 
         new_interface = cls()
         new_interface.meshes = [MeshInterface.from_subfile(mesh) for mesh in readwriter.meshes]
@@ -59,9 +70,10 @@ class GeomInterface:
 
         return new_interface
 
-    def to_file(self, path, platform):
-        with open(path, 'wb') as F:
+    def to_file(self, path, platform, atomic=False, profiler=None, use_triangle_strips=False):
+        with BufferWriter(path, atomic) as F:
             geomReader = GeomReader.for_platform(F, platform)
+            geomReader.set_profiler(profiler)
 
             geomReader.filetype = 100
             geomReader.num_meshes = len(self.meshes)
@@ -72,7 +84,8 @@ class GeomInterface:
 
             geomReader.num_bytes_in_texture_names_section = 32 * len(self.texture_data)
 
-            vertices = np.array([v['Position'] for mesh in self.meshes for v in mesh.vertices])
+            positions = [as_vertex_table(mesh.vertices).attributes['Position'] for mesh in self.meshes if len(mesh.vertices)]
+            vertices = np.concatenate(positions) if len(positions) else np.zeros((0, 3))
             if len(vertices) > 0:
                 minvs = np.min(vertices, axis=0)
                 maxvs = np.max(vertices, axis=0)
@@ -99,7 +112,7 @@ class GeomInterface:
             geomReader.meshes_start_ptr = virtual_pos if len(self.meshes) > 0 else 0
             virtual_pos += 104 * geomReader.num_meshes
             for mesh, meshReader in zip(self.meshes, geomReader.meshes):
-                virtual_pos = mesh.to_subfile(meshReader, virtual_pos, platform)
+                virtual_pos = mesh.to_subfile(meshReader, virtual_pos, platform, use_triangle_strips)
 
             # Dump materials
             geomReader.materials_start_ptr = virtual_pos if len(self.material_data) > 0 else 0
@@ -127,13 +140,14 @@ class GeomInterface:
 
             # Dump inverse bind pose matrices
             geomReader.bone_matrices_start_ptr = virtual_pos if len(self.inverse_bind_pose_matrices) > 0 else 0
-            geomReader.inverse_bind_pose_matrices = self.inverse_bind_pose_matrices
+            geomReader.inverse_bind_pose_matrices = list(self.inverse_bind_pose_matrices)
             virtual_pos += geomReader.num_bones * 12 * 4
 
             geomReader.padding_0x58 = 0
             # Dump the footer data
             geomReader.unknown_footer_data = self.unknown_footer_data
             geomReader.footer_data_start_offset = virtual_pos if len(geomReader.unknown_footer_data) else 0
+            F.reserve(virtual_pos + len(geomReader.unknown_footer_data))
             geomReader.write()
 
 
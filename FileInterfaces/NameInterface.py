@@ -1,3 +1,4 @@
+from ..FileReaders.BaseRW import BufferWriter
 from ..FileReaders.NameReader import NameReader
 
 
@@ -7,10 +8,16 @@ class NameInterface:
         self.material_names = []
 
     @classmethod
-    def from_file(cls, path):
+    def from_file(cls, path, validation_level='strict', profiler=None):
         with open(path, 'rb') as F:
-            namereader = NameReader(F)
-            namereader.read()
+            return cls.from_bytes(F.read(), validation_level, profiler)
+
+    @classmethod
+    def from_bytes(cls, data, validation_level='strict', profiler=None):
+        namereader = NameReader(data)
+        namereader.set_validation_level(validation_level)
+        namereader.set_profiler(profiler)
+        namereader.read()
 
         new_name_interface = cls()
         new_name_interface.bone_names = namereader.bone_names
@@ -18,9 +25,10 @@ class NameInterface:
 
         return new_name_interface
 
-    def to_file(self, path):
-        with open(path, 'wb') as F:
+    def to_file(self, path, atomic=False, profiler=None):
+        with BufferWriter(path, atomic) as F:
             readwriter = NameReader(F)
+            readwriter.set_profiler(profiler)
 
             bone_names = self.bone_names
             material_names = self.material_names
@@ -38,4 +46,5 @@ class NameInterface:
             readwriter.bone_names = bone_names
             readwriter.material_names = material_names
 
+            F.reserve(8 + 4 * num_ptrs + sum([len(name) for name in bone_names + material_names]))
             readwriter.write()
@@ -1,3 +1,4 @@
+from ..FileReaders.BaseRW import BufferWriter
 from ..FileReaders.PhysReader import PhysReader
 
 
@@ -12,10 +13,16 @@ class PhysInterface:
             ColliderMeshInterface(position, scaled_quaternion, vertex_positions, triangles, material_index, bone_index))
 
     @classmethod
-    def from_file(cls, path):
+    def from_file(cls, path, validation_level='strict', profiler=None):
         with open(path, 'rb') as F:
-            physreader = PhysReader(F)
-            physreader.read()
+            return cls.from_bytes(F.read(), validation_level, profiler)
+
+    @classmethod
+    def from_bytes(cls, data, validation_level='strict', profiler=None):
+        physreader = PhysReader(data)
+        physreader.set_validation_level(validation_level)
+        physreader.set_profiler(profiler)
+        physreader.read()
 
         new_phys_interface = cls()
 
@@ -78,9 +85,10 @@ class PhysInterface:
 
         return new_phys_interface
 
-    def to_file(self, path):
-        with open(path, 'wb') as F:
+    def to_file(self, path, atomic=False, profiler=None):
+        with BufferWriter(path, atomic) as F:
             physwriter = PhysReader(F)
+            physwriter.set_profiler(profiler)
 
             joint_colliders = {i: [] for i in range(len(self.bone_names))}
             for collider in self.colliders:
@@ -138,6 +146,7 @@ class PhysInterface:
             physwriter.bone_names_offset = virtual_pointer
             virtual_pointer += physwriter.bone_names_count * 0x40
 
+            F.reserve(virtual_pointer)
             physwriter.write()
 
     @staticmethod
@@ -1,3 +1,4 @@
+from ..FileReaders.BaseRW import BufferWriter
 from ..FileReaders.SkelReader import SkelReader
 from ..Utilities.Rounding import roundup
 
@@ -19,10 +20,16 @@ class SkelInterface:
         return len(self.parent_bones)
 
     @classmethod
-    def from_file(cls, path):
+    def from_file(cls, path, validation_level='strict', profiler=None):
         with open(path, 'rb') as F:
-            readwriter = SkelReader(F)
-            readwriter.read()
+            return cls.from_bytes(F.read(), validation_level, profiler)
+
+    @classmethod
+    def from_bytes(cls, data, validation_level='strict', profiler=None):
+        readwriter = SkelReader(data)
+        readwriter.set_validation_level(validation_level)
+        readwriter.set_profiler(profiler)
+        readwriter.read()
 
         new_interface = cls()
         new_interface.num_uv_channels = readwriter.num_uv_channels
@@ -36,9 +43,10 @@ class SkelInterface:
 
         return new_interface
 
-    def to_file(self, path):
-        with open(path, 'wb') as F:
+    def to_file(self, path, atomic=False, profiler=None):
+        with BufferWriter(path, atomic) as F:
             readwriter = SkelReader(F)
+            readwriter.set_profiler(profiler)
 
             readwriter.filetype = '20SE'
             readwriter.num_bones = len(self.rest_pose)
@@ -79,6 +87,7 @@ class SkelInterface:
             readwriter.padding_0x2E = 0
             readwriter.padding_0x32 = 0
 
+            F.reserve(readwriter.total_bytes)
             readwriter.write()
 
 
@@ -1,7 +1,7 @@
 import numpy as np
 import struct
 
-from .BaseRW import BaseRW
+from .BaseRW import BaseRW, FieldSchema
 from ..Utilities.Exceptions import BadAnimationBoneCount, BadAnimationUVChannels
 from ..Utilities.Rounding import roundup
 
@@ -32,7 +32,7 @@ class AnimReader(BaseRW):
     1.  The fourth data type - other than rotations, locations, and bones - looks like it might be UV coord shifts
     """
 
-    def __init__(self, bytestream, sk):
+    def __init__(self, bytestream, sk=None):
         super().__init__(bytestream)
 
         # Header variables
@@ -79,8 +79,9 @@ class AnimReader(BaseRW):
         self.abs_ptr_static_pose_bone_locations = None
         self.abs_ptr_static_pose_bone_scales = None
         self.abs_ptr_static_shader_uniform_values = None
-        self.num_uv_channels = sk.num_uv_channels
-        self.sk_num_bones = sk.num_bones
+        # The skeleton is only optional for scan(), which doesn't read anything that depends on it
+        self.num_uv_channels = None if sk is None else sk.num_uv_channels
+        self.sk_num_bones = None if sk is None else sk.num_bones
 
         # Data holders
         self.static_pose_rotations_bone_idxs = None
@@ -105,13 +106,27 @@ class AnimReader(BaseRW):
     def read(self):
         self.read_write(self.read_buffer, self.read_raw, self.read_ascii, "read", self.prepare_read_op, self.cleanup_ragged_chunk_read)
         self.interpret_animdata()
+        self.report_violations()
+
+    def scan(self):
+        """
+        Reads only the file header, which is enough to catalogue a file without decoding any keyframes.
+
+        Returns
+        ------
+        A dict of the header fields.
+        """
+        self.rw_header(self.read_schema, self.read_ascii)
+        self.report_violations()
+
+        return self.schema_record(self.header_schema)
 
     def write(self):
         self.reinterpret_animdata()
         self.read_write(self.write_buffer, self.write_raw, self.write_ascii, "write", lambda: None, self.cleanup_ragged_chunk_write)
 
     def read_write(self, rw_operator, rw_operator_raw, rw_operator_ascii, rw_method_name, preparation_op, chunk_cleanup_operator):
-        self.rw_header(rw_operator, rw_operator_ascii)
+        self.rw_header(getattr(self, f'{rw_method_name}_schema'), rw_operator_ascii)
         preparation_op()
         self.rw_bone_idx_lists(rw_operator, chunk_cleanup_operator)
         self.rw_initial_pose_bone_rotations(rw_operator_raw, chunk_cleanup_operator)
@@ -123,64 +138,67 @@ class AnimReader(BaseRW):
         self.rw_unused_channel_masks(rw_operator, chunk_cleanup_operator)
         self.rw_keyframe_chunks(rw_method_name)
 
-    def rw_header(self, rw_operator, rw_operator_ascii):
+    # Everything in the header after the 4-byte filetype string
+    header_schema = FieldSchema([('animation_duration', 'f'),
+                                 ('playback_rate', 'f'),
+
+                                 ('setup_and_static_data_size', 'H'),
+                                 ('num_bones', 'H'),
+                                 ('total_frames', 'H'),
+                                 ('num_keyframe_chunks', 'H'),
+                                 ('always_16384', 'H'),  # Maybe this is the precision of the quaternions?
+
+                                 ('static_pose_bone_rotations_count', 'H'),
+                                 ('static_pose_bone_locations_count', 'H'),
+                                 ('static_pose_bone_scales_count', 'H'),
+                                 ('static_pose_shader_uniform_channels_count', 'H'),
+                                 ('animated_bone_rotations_count', 'H'),
+                                 ('animated_bone_locations_count', 'H'),
+                                 ('animated_bone_scales_count', 'H'),
+                                 ('animated_shader_uniform_channels_count', 'H'),
+                                 ('padding_0x26', 'H'),
+
+                                 ('bone_mask_bytes', 'I'),
+                                 ('abs_ptr_bone_mask', 'I'),
+
+                                 ('rel_ptr_keyframe_chunks_ptrs', 'I'),
+                                 ('rel_ptr_keyframe_chunks_counts', 'I'),
+                                 ('rel_ptr_static_pose_bone_rotations', 'I'),
+                                 ('rel_ptr_static_pose_bone_locations', 'I'),
+                                 ('rel_ptr_static_pose_bone_scales', 'I'),
+                                 ('rel_ptr_static_unknown_4', 'I'),
+
+                                 ('padding_0x48', 'I'),
+                                 ('padding_0x4C', 'I'),
+                                 ('padding_0x50', 'I'),
+                                 ('padding_0x54', 'I'),
+                                 ('padding_0x58', 'I'),
+                                 ('padding_0x5C', 'I')])
+
+    def rw_header(self, rw_schema_operator, rw_operator_ascii):
         self.assert_file_pointer_now_at(0)
         rw_operator_ascii('filetype', 4)
 
-        rw_operator('animation_duration', 'f')
-        rw_operator('playback_rate', 'f')
+        header_pos = self.bytestream.tell()
+        rw_schema_operator(self.header_schema)
 
-        rw_operator('setup_and_static_data_size', 'H')
-        rw_operator('num_bones', 'H')
-        rw_operator('total_frames', 'H')
-        rw_operator('num_keyframe_chunks', 'H')
-        rw_operator('always_16384', 'H')  # Maybe this is the precision of the quaternions?
         self.assert_equal('always_16384', 16384)
         assert self.always_16384 == 16384, self.always_16384
-        if self.num_bones != self.sk_num_bones:
+        if self.sk_num_bones is not None and self.num_bones != self.sk_num_bones:
             raise BadAnimationBoneCount("BadAnimationBoneCount")
 
-        rw_operator('static_pose_bone_rotations_count', 'H')
-        rw_operator('static_pose_bone_locations_count', 'H')
-        rw_operator('static_pose_bone_scales_count', 'H')
-        rw_operator('static_pose_shader_uniform_channels_count', 'H')
-        rw_operator('animated_bone_rotations_count', 'H')
-        rw_operator('animated_bone_locations_count', 'H')
-        rw_operator('animated_bone_scales_count', 'H')
-        rw_operator('animated_shader_uniform_channels_count', 'H')
-        rw_operator('padding_0x26', 'H')
         self.assert_is_zero('padding_0x26')
-
-        rw_operator('bone_mask_bytes', 'I')
-        rw_operator('abs_ptr_bone_mask', 'I')
         if self.bone_mask_bytes != 0:
             self.assert_equal('abs_ptr_bone_mask', self.setup_and_static_data_size)
 
-        pos = self.bytestream.tell()
-        rw_operator('rel_ptr_keyframe_chunks_ptrs', 'I')
-        self.abs_ptr_keyframe_chunks_ptrs = pos + self.rel_ptr_keyframe_chunks_ptrs
-        pos = self.bytestream.tell()
-        rw_operator('rel_ptr_keyframe_chunks_counts', 'I')
-        self.abs_ptr_keyframe_chunks_counts = pos + self.rel_ptr_keyframe_chunks_counts
-        pos = self.bytestream.tell()
-        rw_operator('rel_ptr_static_pose_bone_rotations', 'I')
-        self.abs_ptr_static_pose_bone_rotations = pos + self.rel_ptr_static_pose_bone_rotations
-        pos = self.bytestream.tell()
-        rw_operator('rel_ptr_static_pose_bone_locations', 'I')
-        self.abs_ptr_static_pose_bone_locations = pos + self.rel_ptr_static_pose_bone_locations
-        pos = self.bytestream.tell()
-        rw_operator('rel_ptr_static_pose_bone_scales', 'I')
-        self.abs_ptr_static_pose_bone_scales = pos + self.rel_ptr_static_pose_bone_scales
-        pos = self.bytestream.tell()
-        rw_operator('rel_ptr_static_unknown_4', 'I')
-        self.abs_ptr_static_shader_uniform_values = pos + self.rel_ptr_static_unknown_4
-
-        rw_operator('padding_0x48', 'I')
-        rw_operator('padding_0x4C', 'I')
-        rw_operator('padding_0x50', 'I')
-        rw_operator('padding_0x54', 'I')
-        rw_operator('padding_0x58', 'I')
-        rw_operator('padding_0x5C', 'I')
+        # The relative pointers are relative to their own positions in the header
+        offsets = self.header_schema.offsets
+        self.abs_ptr_keyframe_chunks_ptrs = header_pos + offsets['rel_ptr_keyframe_chunks_ptrs'] + self.rel_ptr_keyframe_chunks_ptrs
+        self.abs_ptr_keyframe_chunks_counts = header_pos + offsets['rel_ptr_keyframe_chunks_counts'] + self.rel_ptr_keyframe_chunks_counts
+        self.abs_ptr_static_pose_bone_rotations = header_pos + offsets['rel_ptr_static_pose_bone_rotations'] + self.rel_ptr_static_pose_bone_rotations
+        self.abs_ptr_static_pose_bone_locations = header_pos + offsets['rel_ptr_static_pose_bone_locations'] + self.rel_ptr_static_pose_bone_locations
+        self.abs_ptr_static_pose_bone_scales = header_pos + offsets['rel_ptr_static_pose_bone_scales'] + self.rel_ptr_static_pose_bone_scales
+        self.abs_ptr_static_shader_uniform_values = header_pos + offsets['rel_ptr_static_unknown_4'] + self.rel_ptr_static_unknown_4
 
     def rw_bone_idx_lists(self, rw_operator, chunk_cleanup_operator):
         """
@@ -302,8 +320,7 @@ class AnimReader(BaseRW):
         self.keyframe_chunks = [KeyframeChunk(self.bytestream) for _ in range(self.num_keyframe_chunks)]
 
     def interpret_animdata(self):
-        self.static_pose_bone_rotations = self.chunk_list(self.static_pose_bone_rotations, 6)
-        self.static_pose_bone_rotations = [deserialise_quaternion(elem) for elem in self.static_pose_bone_rotations]
+        self.static_pose_bone_rotations = list(deserialise_quaternions(self.static_pose_bone_rotations))
         self.static_pose_bone_locations = self.chunk_list(self.static_pose_bone_locations, 3)
         self.static_pose_bone_scales = self.chunk_list(self.static_pose_bone_scales, 3)
 
@@ -315,8 +332,7 @@ class AnimReader(BaseRW):
             self.total_frames = self.keyframe_counts[-1][0] + 1
 
     def reinterpret_animdata(self):
-        self.static_pose_bone_rotations = [serialise_quaternion(elem) for elem in self.static_pose_bone_rotations]
-        self.static_pose_bone_rotations = b''.join(self.static_pose_bone_rotations)
+        self.static_pose_bone_rotations = serialise_quaternions(self.static_pose_bone_rotations)
         self.static_pose_bone_locations = self.flatten_list(self.static_pose_bone_locations)
         self.static_pose_bone_scales = self.flatten_list(self.static_pose_bone_scales)
 
@@ -392,15 +408,15 @@ class KeyframeChunk(BaseRW):
         self.nframes = nframes
 
     def read(self):
-        self.read_write(self.read_buffer, self.read_raw, self.cleanup_ragged_chunk_read)
+        self.read_write(self.read_buffer, self.read_raw, self.read_schema, self.cleanup_ragged_chunk_read)
         self.interpret_keyframe_chunk()
 
     def write(self):
         self.reinterpret_keyframe_chunk()
-        self.read_write(self.write_buffer, self.write_raw, self.cleanup_ragged_chunk_write)
+        self.read_write(self.write_buffer, self.write_raw, self.write_schema, self.cleanup_ragged_chunk_write)
 
-    def read_write(self, rw_operator, rw_operator_raw, cleanup_chunk_operator):
-        self.rw_header(rw_operator)
+    def read_write(self, rw_operator, rw_operator_raw, rw_schema_operator, cleanup_chunk_operator):
+        self.rw_header(rw_schema_operator)
         self.rw_frame_0_rotations(rw_operator_raw)
         self.rw_frame_0_locations(rw_operator)
         self.rw_frame_0_scales(rw_operator, cleanup_chunk_operator)
@@ -414,19 +430,21 @@ class KeyframeChunk(BaseRW):
 
         cleanup_chunk_operator(self.bytestream.tell(), 16)
 
-    def rw_header(self, rw_operator):
-        self.assert_file_pointer_now_at(self.start_pointer)
-        rw_operator('frame_0_rotations_bytecount', 'H')
-        rw_operator('frame_0_locations_bytecount', 'H')
-        rw_operator('frame_0_scales_bytecount', 'H')
-        rw_operator('frame_0_shader_uniform_channels_bytecount', 'H')
+    header_schema = FieldSchema([('frame_0_rotations_bytecount', 'H'),
+                                 ('frame_0_locations_bytecount', 'H'),
+                                 ('frame_0_scales_bytecount', 'H'),
+                                 ('frame_0_shader_uniform_channels_bytecount', 'H'),
+
+                                 ('keyframed_rotations_bytecount', 'H'),
+                                 ('keyframed_locations_bytecount', 'H'),
+                                 ('keyframed_scales_bytecount', 'H'),
+                                 ('keyframed_shader_uniform_channels_bytecount', 'H')])
 
-        rw_operator('keyframed_rotations_bytecount', 'H')
-        rw_operator('keyframed_locations_bytecount', 'H')
-        rw_operator('keyframed_scales_bytecount', 'H')
-        rw_operator('keyframed_shader_uniform_channels_bytecount', 'H')
+    def rw_header(self, rw_schema_operator):
+        self.assert_file_pointer_now_at(self.start_pointer)
+        rw_schema_operator(self.header_schema)
 
-        self.bytes_read += 16
+        self.bytes_read += self.header_schema.size
 
     def rw_frame_0_rotations(self, rw_operator):
         rw_operator('frame_0_rotations', self.frame_0_rotations_bytecount)
@@ -481,115 +499,100 @@ class KeyframeChunk(BaseRW):
     def interpret_keyframe_chunk(self):
         self.keyframes_in_use: bytes
 
-        self.frame_0_rotations = self.chunk_list(self.frame_0_rotations, 6)
-        self.frame_0_rotations = [deserialise_quaternion(elem) for elem in self.frame_0_rotations]
+        self.frame_0_rotations = list(deserialise_quaternions(self.frame_0_rotations))
         self.frame_0_locations = self.chunk_list(self.frame_0_locations, 3)
         self.frame_0_scales = self.chunk_list(self.frame_0_scales, 3)
         if len(self.keyframes_in_use):
-            self.keyframes_in_use = bytes_to_bits(self.keyframes_in_use)
+            self.keyframes_in_use = np.unpackbits(np.frombuffer(self.keyframes_in_use, dtype=np.uint8)).astype(bool)
             # Chop off padding bits
             self.keyframes_in_use = self.keyframes_in_use[:self.nframes * (len(self.keyframes_in_use) // self.nframes)]
         else:
-            self.keyframes_in_use = ''
+            self.keyframes_in_use = np.zeros(0, dtype=bool)
 
-        self.keyframed_rotations = self.chunk_list(self.keyframed_rotations, 6)
-        self.keyframed_rotations = [deserialise_quaternion(elem) for elem in self.keyframed_rotations]
+        self.keyframed_rotations = list(deserialise_quaternions(self.keyframed_rotations))
         self.keyframed_locations = self.chunk_list(self.keyframed_locations, 3)
         self.keyframed_scales = self.chunk_list(self.keyframed_scales, 3)
 
     def reinterpret_keyframe_chunk(self):
-        self.keyframes_in_use: str
-        self.frame_0_rotations = [serialise_quaternion(elem) for elem in self.frame_0_rotations]
-        self.frame_0_rotations = b''.join(self.frame_0_rotations)
+        self.keyframes_in_use: np.ndarray
+        self.frame_0_rotations = serialise_quaternions(self.frame_0_rotations)
         self.frame_0_locations = self.flatten_list(self.frame_0_locations)
         self.frame_0_scales = self.flatten_list(self.frame_0_scales)
 
-        if len(self.keyframes_in_use):
-            # Add back padding bits
-            self.keyframes_in_use += '0' * ((8 - len(self.keyframes_in_use) % 8) % 8)
-            self.keyframes_in_use = bits_to_bytes(self.keyframes_in_use)
-        else:
-            self.keyframes_in_use = b''
-        self.keyframed_rotations = [serialise_quaternion(elem) for elem in self.keyframed_rotations]
-        self.keyframed_rotations = b''.join(self.keyframed_rotations)
+        # Packing the bits adds back the padding bits
+        self.keyframes_in_use = np.packbits(np.asarray(self.keyframes_in_use, dtype=bool)).tobytes()
+        self.keyframed_rotations = serialise_quaternions(self.keyframed_rotations)
         self.keyframed_locations = self.flatten_list(self.keyframed_locations)
         self.keyframed_scales = self.flatten_list(self.keyframed_scales)
 
 
-def chunks(lst, n):
-    """Yield successive n-sized chunks from lst."""
-    for i in range(0, len(lst), n):
-        yield lst[i:i + n]
-
-
-def bytes_to_bits(bytelist):
-    return ("{:0" + str(len(bytelist) * 8) + "b}").format(int(bytelist.hex(), 16))
-
-
-def bits_to_bytes(bitstring):
-    return b''.join([struct.pack('B', (int(elem, 2))) for elem in chunks(bitstring, 8)])
+def deserialise_quaternions(dscs_rotations):
+    """
+    Decodes a run of 6-byte smallest-three quaternions into an array of shape (num_quaternions, 4), in WXYZ ordering.
 
+    Each quaternion is a big-endian 48-bit integer holding a padding bit, three uint15s that are the components other
+    than the largest mapped from [-1/sqrt(2), 1/sqrt(2)] to [0, 32767], and a uint2 that is the index of the largest
+    component in the XYZW ordering.
+    """
+    data = np.frombuffer(bytes(dscs_rotations), dtype=np.uint8).reshape((-1, 6)).astype(np.int64)
+    packed = np.zeros(len(data), dtype=np.int64)
+    for byte_idx in range(6):
+        packed = (packed << 8) | data[:, byte_idx]
 
-def deserialise_quaternion(dscs_rotation):
-    bit_representation = bytes_to_bits(dscs_rotation)
-    largest_index = struct.unpack('B', bits_to_bytes('000000' + bit_representation[46:48]))
-    component_bits = bit_representation[1:46]
-    component_bits = ''.join(['0'+component_bits[15*i:15*(i+1)] for i in range(3)])
-    components = np.array(struct.unpack('>HHH', bits_to_bytes(component_bits)))
+    largest_idxs = packed & 0b11
+    components = np.stack([(packed >> 32) & 0x7FFF, (packed >> 17) & 0x7FFF, (packed >> 2) & 0x7FFF], axis=1)
 
     components -= 16383
     components = components/16384
     components *= 1/np.sqrt(2)
 
-    square_vector_length = np.sum(components**2)
-    largest_component = np.sqrt(1 - square_vector_length)
+    square_vector_lengths = np.sum(components**2, axis=1)
+    largest_components = np.sqrt(1 - square_vector_lengths)
 
-    # This is in the XYZW ordering
-    components = np.insert(components, largest_index, largest_component)
+    # Build the quaternions in the XYZW ordering, with the largest component inserted at its index
+    quaternions = np.zeros((len(data), 4))
+    is_largest = np.arange(4) == largest_idxs[:, np.newaxis]
+    quaternions[is_largest] = largest_components
+    quaternions[~is_largest] = components.ravel()
 
-    # Now it's in the WXYZ ordering
-    quaternion = np.roll(components, 1)
+    # Now put them in the WXYZ ordering
+    return np.roll(quaternions, 1, axis=1)
 
-    return quaternion
 
-
-def serialise_quaternion(quat):
+def serialise_quaternions(quats):
+    """
+    The inverse of deserialise_quaternions: encodes an array of quaternions of shape (num_quaternions, 4), in WXYZ
+    ordering, as a run of 6-byte smallest-three quaternions.
+    """
     # Start from WXYZ ordering, put it into XYZW
-    components = np.roll(quat, -1)
-    abs_components = np.abs(components)
-    abs_largest_component = np.amax(abs_components)
-    largest_index = np.where(abs_components == abs_largest_component)[0][0]
-    largest_component = components[largest_index]
-    largest_component_sign = np.sign(largest_component)
+    components = np.roll(np.asarray(quats, dtype=float).reshape((-1, 4)), -1, axis=1)
+    largest_idxs = np.argmax(np.abs(components), axis=1)
+    is_largest = np.arange(4) == largest_idxs[:, np.newaxis]
+    largest_component_signs = np.sign(components[is_largest])
 
     # Get rid of the largest component
     # No need to store the sign of the largest component, because
     # (W, X, Y, Z) = (-W, -X, -Y, -Z)
     # So just multiply through by the sign of the removed component to create an equivalent quaternion
     # In this way, the largest component is always +ve
-    components = largest_component_sign*np.delete(components, largest_index)
+    components = largest_component_signs[:, np.newaxis]*components[~is_largest].reshape((-1, 3))
 
     # No other component can be larger than 1/sqrt(2) due to normalisation
     # So map the remaining components from the interval [-1/sqrt(2), 1/sqrt(2)] to [0, 32767] to gain ~1.4x precision
     components *= np.sqrt(2)
     components *= 16384
-    components = np.around(components).astype(np.int)
+    components = np.around(components).astype(np.int64)
     components += 16383
+    components = np.clip(components, 0, 32767)
 
-    for i, elem in enumerate(components):
-        if elem < 0:
-            components[i] = 0
-        elif elem > 32767:
-            components[i] = 32767
+    # Pack a zero bit, the three uint15s, and the largest index as a uint2 into a big-endian 48-bit integer
+    packed = (components[:, 0] << 32) | (components[:, 1] << 17) | (components[:, 2] << 2) | largest_idxs
+    return packed.astype('>u8').view(np.uint8).reshape((-1, 8))[:, 2:].tobytes()
 
-    # Now convert to big-endian uint15s
-    component_bits = bytes_to_bits(struct.pack('>HHH', *components))
-    component_bits = ''.join([component_bits[16*i + 1:16*(i+1)] for i in range(3)])
 
-    # Store the largest index as a uint2
-    largest_index_bits = bytes_to_bits(struct.pack('B', largest_index))[6:]
+def deserialise_quaternion(dscs_rotation):
+    return deserialise_quaternions(dscs_rotation)[0]
 
-    # Put everything together
-    component_bits = '0' + component_bits + largest_index_bits
 
-    return bits_to_bytes(component_bits)
+def serialise_quaternion(quat):
+    return serialise_quaternions([quat])
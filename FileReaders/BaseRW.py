@@ -1,11 +1,243 @@
+import functools
 import struct
 import io
+import mmap
+import os
+import tempfile
 
 
 class ViolatedAssumptionError(Exception):
     pass
 
 
+# How the structural assumptions checked by BaseRW.assert_* are enforced:
+# strict -- raise a ViolatedAssumptionError at the first violation.
+# deferred -- collect every violation, and raise a single ViolatedAssumptionError listing them all once the file has
+#             been read.
+# trusted -- skip the checks entirely. Only use this for data known to be well-formed.
+validation_levels = ('strict', 'deferred', 'trusted')
+
+
+class BaseStream:
+    """
+    State shared by every reader parsing the same bytestream.
+    """
+    def __init__(self):
+        self.validation_level = 'strict'
+        self.violations = []
+        self.profiler = None
+
+
+class FileStream(BaseStream):
+    """
+    A thin wrapper around a file opened in 'rb' or 'wb' mode, exposing the same interface as BufferStream so that
+    BaseRW can treat both identically.
+    """
+    def __init__(self, io_object):
+        super().__init__()
+        self.io_object = io_object
+
+    def read(self, size=-1):
+        return self.io_object.read(size)
+
+    def write(self, data):
+        return self.io_object.write(data)
+
+    def tell(self):
+        return self.io_object.tell()
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        return self.io_object.seek(offset, whence)
+
+    def unpack(self, compiled_struct):
+        return compiled_struct.unpack(self.io_object.read(compiled_struct.size))
+
+    def pack(self, compiled_struct, values):
+        self.io_object.write(compiled_struct.pack(*values))
+
+
+class BufferStream(BaseStream):
+    """
+    A read-only bytestream over an in-memory buffer (bytes, bytearray, memoryview, or mmap).
+
+    Fields are parsed in-place by offset with struct.unpack_from, so there is no system call or intermediate copy per
+    field. Raw reads still return a bytes object, since the readers expect to be able to decode and strip these.
+    """
+    def __init__(self, buffer):
+        super().__init__()
+        if isinstance(buffer, memoryview):
+            buffer = buffer.cast('B')
+        self.buffer = buffer
+        self.size = len(buffer)
+        self.position = 0
+
+    def read(self, size=-1):
+        start = self.position
+        end = self.size if size is None or size < 0 else min(start + size, self.size)
+        self.position = end
+        return bytes(self.buffer[start:end])
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            self.position = offset
+        elif whence == io.SEEK_CUR:
+            self.position += offset
+        elif whence == io.SEEK_END:
+            self.position = self.size + offset
+        else:
+            raise ValueError(f"Invalid whence value {whence}.")
+        return self.position
+
+    def unpack(self, compiled_struct):
+        result = compiled_struct.unpack_from(self.buffer, self.position)
+        self.position += compiled_struct.size
+        return result
+
+
+class BufferWriter(BaseStream):
+    """
+    A write-only bytestream backed by a single bytearray, which should be preallocated to the final size of the file
+    with reserve(). Fields are packed in-place with struct.pack_into, and the finished file is flushed to disk in a
+    single call with dump().
+
+    Can be used as a drop-in replacement for open(path, 'wb'): when used as a context manager, the buffer is dumped to
+    'path' on leaving the block, unless an exception was raised.
+    """
+    def __init__(self, path=None, atomic=False, size=0):
+        super().__init__()
+        self.path = path
+        self.atomic = atomic
+        self.buffer = bytearray(size)
+        self.position = 0
+        self.end = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None and self.path is not None:
+            self.dump(self.path, self.atomic)
+
+    def reserve(self, size):
+        if size > len(self.buffer):
+            self.buffer.extend(bytes(size - len(self.buffer)))
+
+    def ensure_capacity(self, size):
+        # Grow geometrically if the preallocated size was an underestimate
+        if size > len(self.buffer):
+            self.reserve(max(size, 2 * len(self.buffer)))
+
+    def write(self, data):
+        size = len(data)
+        end = self.position + size
+        self.ensure_capacity(end)
+        self.buffer[self.position:end] = data
+        self.position = end
+        self.end = max(self.end, end)
+        return size
+
+    def pack(self, compiled_struct, values):
+        end = self.position + compiled_struct.size
+        self.ensure_capacity(end)
+        compiled_struct.pack_into(self.buffer, self.position, *values)
+        self.position = end
+        self.end = max(self.end, end)
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            self.position = offset
+        elif whence == io.SEEK_CUR:
+            self.position += offset
+        elif whence == io.SEEK_END:
+            self.position = self.end + offset
+        else:
+            raise ValueError(f"Invalid whence value {whence}.")
+        return self.position
+
+    def getvalue(self):
+        return bytes(self.buffer[:self.end])
+
+    def dump(self, path, atomic=False):
+        """
+        Writes the contents of the buffer to 'path'. If 'atomic' is True, the data is first written to a temporary file
+        in the same directory, which then replaces 'path', so that a failed export never leaves a truncated file.
+        """
+        with memoryview(self.buffer)[:self.end] as data:
+            if not atomic:
+                with open(path, 'wb') as F:
+                    F.write(data)
+                return
+
+            directory, filename = os.path.split(os.path.abspath(path))
+            fd, temp_path = tempfile.mkstemp(prefix=f'.{filename}.', suffix='.tmp', dir=directory)
+            try:
+                with os.fdopen(fd, 'wb') as F:
+                    F.write(data)
+                os.replace(temp_path, path)
+            except BaseException:
+                os.remove(temp_path)
+                raise
+
+
+@functools.lru_cache(maxsize=512)
+def get_struct(struct_format):
+    """
+    Returns a compiled struct.Struct for the given format string, so that repeated reads and writes of the same
+    fields do not need to re-parse the format.
+    """
+    return struct.Struct(struct_format)
+
+
+class FieldSchema:
+    """
+    A fixed-layout sequence of fields, compiled once into a single struct.Struct so that a whole header can be read or
+    written in one call.
+
+    Inputs
+    ------
+    fields -- a list of (variable, dtype) pairs, with dtypes as would be passed to BaseRW.read_buffer.
+    endianness -- the data type endianness of every field.
+    """
+    def __init__(self, fields, endianness='<'):
+        self.fields = fields
+        self.struct = struct.Struct(endianness + ''.join([dtype for _, dtype in fields]))
+        self.size = self.struct.size
+
+        # Position of each variable in the unpacked tuple, and its offset in bytes from the start of the schema
+        self.slices = []
+        self.offsets = {}
+        value_idx = 0
+        byte_offset = 0
+        for variable, dtype in fields:
+            self.slices.append((variable, value_idx, value_idx + len(dtype)))
+            self.offsets[variable] = byte_offset
+            value_idx += len(dtype)
+            byte_offset += struct.calcsize(endianness + dtype)
+
+
+def open_bytestream(io_object):
+    """
+    Wraps a file opened in 'rb'/'wb' mode or an in-memory buffer in the appropriate bytestream class. Objects that
+    are already wrapped are returned unchanged, so that subreaders share the position of their parent reader.
+    """
+    if isinstance(io_object, BaseStream):
+        return io_object
+    elif isinstance(io_object, (bytes, bytearray, memoryview, mmap.mmap)):
+        return BufferStream(io_object)
+
+    assert (type(io_object) == io.BufferedReader) or (type(io_object) == io.BufferedWriter), \
+        f"Read-write object was instantiated with a {type(io_object)}, not a {io.BufferedReader}, " \
+        f"{io.BufferedWriter}, or bytes-like object. Ensure you are instantiating this object with a file opened in " \
+        f"'rb' or 'wb' mode, or with the contents of a file."
+    return FileStream(io_object)
+
+
 class BaseRW:
     """
     This is a base class for bytestream parsing, intended to be able to read/write (RW) these bytestreams to/from files.
@@ -15,11 +247,14 @@ class BaseRW:
         """
         Inputs
         ------
-        A filestream opened with 'read-binary' (rb) or 'write-binary' (wb) permissions.
+        A filestream opened with 'read-binary' (rb) or 'write-binary' (wb) permissions, or a bytes-like object or mmap
+        containing the file to be read.
         """
         self.bytestream = None
         self.subreaders = []
         self.set_file_rw(io_object)
+        if self.bytestream.profiler is not None:
+            self.bytestream.profiler.instrument(self)
         self.header = []
         self.endianness = '<'
 
@@ -45,13 +280,41 @@ class BaseRW:
         }
 
     def set_file_rw(self, io_object):
-        assert (type(io_object) == io.BufferedReader) or (type(io_object) == io.BufferedWriter), \
-            f"Read-write object was instantiated with a {type(io_object)}, not a {io.BufferedReader} or " \
-            f"{io.BufferedWriter}. Ensure you are instantiating this object with a file opened in 'rb' or 'wb' mode."
-        self.bytestream = io_object
+        self.bytestream = open_bytestream(io_object)
         for lst in self.subreaders:
             for subreader in lst:
-                subreader.set_file_rw(io_object)
+                subreader.set_file_rw(self.bytestream)
+
+    def set_validation_level(self, level):
+        """
+        Sets how the structural assumptions checked while parsing the bytestream are enforced. The level is stored on
+        the bytestream, and so applies to every subreader sharing it. See 'validation_levels'.
+        """
+        assert level in validation_levels, f"Unknown validation level '{level}'; options are {validation_levels}."
+        self.bytestream.validation_level = level
+        self.bytestream.violations = []
+
+    def set_profiler(self, profiler):
+        """
+        Attaches a FileReaders.Profiler.Profiler to the bytestream, which will then time this reader, its subreaders,
+        and any readers created for the bytestream afterwards. Passing None leaves profiling switched off.
+        """
+        self.bytestream.profiler = profiler
+        if profiler is not None:
+            profiler.instrument(self)
+            for lst in self.subreaders:
+                for subreader in lst:
+                    subreader.set_profiler(profiler)
+
+    def report_violations(self):
+        """
+        Raises a single ViolatedAssumptionError listing every violation collected in 'deferred' validation mode.
+        """
+        violations = self.bytestream.violations
+        if len(violations):
+            self.bytestream.violations = []
+            raise ViolatedAssumptionError(f"{len(violations)} violations of data structure assumptions:\n" +
+                                          '\n'.join([f"'{violation}'" for violation in violations]))
 
     def unset_file_rw(self):
         self.bytestream = None
@@ -81,8 +344,7 @@ class BaseRW:
         if endianness is None:
             endianness = self.endianness
 
-        buf = sum([self.type_buffers[dt] for dt in dtype])
-        result = struct.unpack(endianness + dtype, self.bytestream.read(buf))
+        result = self.bytestream.unpack(get_struct(endianness + dtype))
 
         if len(result) == 1 and not force_1d:
             result = result[0]
@@ -108,8 +370,7 @@ class BaseRW:
         if endianness is None:
             endianness = self.endianness
 
-        buf = sum([self.type_buffers[dt] for dt in dtype])
-        result = struct.unpack(endianness + dtype, self.bytestream.read(buf))
+        result = self.bytestream.unpack(get_struct(endianness + dtype))
 
         return result
 
@@ -132,6 +393,17 @@ class BaseRW:
         val = self.chunk_list(self.unpack(dtype, endianness), item_size)
         setattr(self, variable, val)
 
+    def read_schema(self, schema):
+        """
+        Reads every field of a FieldSchema in a single call. Single-element fields are set as values and multi-element
+        fields as tuples, matching BaseRW.read_buffer.
+        """
+        result = self.bytestream.unpack(schema.struct)
+        for variable, start, stop in schema.slices:
+            val = result[start] if stop - start == 1 else result[start:stop]
+            setattr(self, variable, val)
+            self.header.append(val)
+
     def read_ascii(self, variable, num_bytes=None):
         bytes_to_read = [] if num_bytes is None else [num_bytes]
         val = self.bytestream.read(*bytes_to_read).decode('ascii')
@@ -145,7 +417,15 @@ class BaseRW:
     def pack(self, value, dtype, endianness=None):
         if endianness is None:
             endianness = self.endianness
-        return struct.pack(endianness + dtype, *value)
+        return get_struct(endianness + dtype).pack(*value)
+
+    def write_packed(self, value, dtype, endianness=None):
+        """
+        Packs 'value' directly into the bytestream, which avoids an intermediate bytes object for buffered writers.
+        """
+        if endianness is None:
+            endianness = self.endianness
+        self.bytestream.pack(get_struct(endianness + dtype), value)
 
     def write_buffer(self, variable, dtype, endianness=None, force_1d=False):
         """
@@ -155,23 +435,36 @@ class BaseRW:
         # If it's not a tuple/list/, turn it into a tuple
         if not (hasattr(val, '__len__') and not isinstance(val, str)):
             val = (val,)
-        to_write = self.pack(val, dtype, endianness)
-        self.bytestream.write(to_write)
+        self.write_packed(val, dtype, endianness)
 
     def write_single(self, variable, dtype, endianness=None):
         val = getattr(self, variable)
-        to_write = self.pack((val,), dtype, endianness)
-        self.bytestream.write(to_write)
+        self.write_packed((val,), dtype, endianness)
 
     def write_list(self, variable, dtype, endianness=None):
         val = getattr(self, variable)
-        to_write = self.pack(val, dtype, endianness)
-        self.bytestream.write(to_write)
+        self.write_packed(val, dtype, endianness)
 
     def write_listoflists(self, variable, dtype, item_size, endianness=None):
         val = getattr(self, variable)
-        to_write = self.pack(self.flatten_list(val), dtype, endianness)
-        self.bytestream.write(to_write)
+        self.write_packed(self.flatten_list(val), dtype, endianness)
+
+    def write_schema(self, schema):
+        values = []
+        for variable, start, stop in schema.slices:
+            val = getattr(self, variable)
+            # If it's a tuple/list, splat it into the values to pack
+            if hasattr(val, '__len__') and not isinstance(val, str):
+                values.extend(val)
+            else:
+                values.append(val)
+        self.bytestream.pack(schema.struct, values)
+
+    def schema_record(self, schema):
+        """
+        Returns the values of the fields in 'schema' as a dict, leaving out any padding fields.
+        """
+        return {variable: getattr(self, variable) for variable, _ in schema.fields if not variable.startswith('padding')}
 
     def write_ascii(self, variable, num_bytes=None):
         val = getattr(self, variable)
@@ -242,11 +535,16 @@ class BaseRW:
     # Stream validation functions
     # Should add a context arg to these
     def assert_file_pointer_now_at(self, location):
-        self.check_assertion_now(lambda location: self.bytestream.tell() == location,
-                                 lambda location: f"File pointer at {self.bytestream.tell()}, not at {location}.",
-                                 location)
+        if self.bytestream.validation_level == 'trusted':
+            return
+        self.make_assertion(lambda location: self.bytestream.tell() == location,
+                            lambda location: f"File pointer at {self.bytestream.tell()}, not at {location}.",
+                            location)
 
     def assert_equal(self, varname, value):
+        # Return before building the closures below, since this is called for a large number of fields
+        if self.bytestream.validation_level == 'trusted':
+            return
         self.make_assertion(lambda varname, value: getattr(self, varname) == value,
                             lambda varname, value: f"{varname} == {value}, value is {getattr(self, varname)}",
                             varname, value)
@@ -259,8 +557,12 @@ class BaseRW:
             self.assert_equal(varname, value)
 
     def make_assertion(self, check, message, *args):
-        # self.assumptions_CT.append((check, message, args))
-        self.check_assertion_now(check, message, *args)
+        if self.bytestream.validation_level == 'deferred':
+            # Evaluate the check now, since the readers go on to overwrite the variables it refers to
+            if not check(*args):
+                self.bytestream.violations.append(message(*args))
+        else:
+            self.check_assertion_now(check, message, *args)
 
     def check_assertion_now(self, check, message, *args):
         if not check(*args):
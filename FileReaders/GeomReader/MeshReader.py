@@ -1,7 +1,25 @@
-from ..BaseRW import BaseRW
-from .VertexComponents import vertex_components_from_defn_dscs, vertex_components_from_defn_megido
+from ..BaseRW import BaseRW, FieldSchema
+from .VertexComponents import vertex_components_from_defn_dscs, vertex_components_from_defn_megido, TangentH
 import numpy as np
-import struct
+
+
+class LazyMeshData:
+    """
+    A data holder of a MeshReader. If the mesh was read lazily, the mesh data is read from the bytestream the first time
+    a data holder is accessed.
+    """
+    def __set_name__(self, owner, name):
+        self.attribute_name = f'_{name}'
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        if instance.is_lazy and not instance.is_loaded:
+            instance.load()
+        return getattr(instance, self.attribute_name)
+
+    def __set__(self, instance, value):
+        setattr(instance, self.attribute_name, value)
 
 
 class MeshReaderBase(BaseRW):
@@ -20,8 +38,20 @@ class MeshReaderBase(BaseRW):
     (o) MeshReader can fully interpret all mesh data in geom files in DSDB archive.
     (o) MeshReader can write data to geom files.
 
+    Lazy reading
+    ------
+    If the parent GeomReader is read lazily, only the header of each mesh is read up front. The vertex, bone index,
+    polygon, and vertex component data are read from the bytestream on first access, and can be discarded again with
+    release().
     """
+    vertex_data = LazyMeshData()
+    weighted_bone_idxs = LazyMeshData()
+    polygon_data = LazyMeshData()
+    vertex_components = LazyMeshData()
+
     def __init__(self, io_stream):
+        self.is_lazy = False
+        self.is_loaded = False
         super().__init__(io_stream)
 
         # Header variables
@@ -59,49 +89,87 @@ class MeshReaderBase(BaseRW):
         # Utility data
         self.polygon_data_type = None
 
+    header_schema = FieldSchema([('vertex_data_start_ptr', 'Q'),
+                                 ('polygon_data_start_ptr', 'Q'),
+                                 ('weighted_bone_data_start_ptr', 'Q'),
+                                 ('padding_0x18', 'Q'),  # Always 0
+
+                                 ('vertex_components_start_ptr', 'Q'),
+                                 ('num_weighted_bone_idxs', 'H'),  # Lists a set of bones near the mesh
+                                 ('num_vertex_components', 'H'),
+                                 ('bytes_per_vertex', 'H'),
+                                 ('always_5123', 'H'),  # Matches GL_UNSIGNED_SHORT value
+
+                                 # takes values 0, 1, 2, 3, 4: 0 means map everything to idx 0, 1 means the idxs are in the position vector
+                                 ('max_vertex_groups_per_vertex', 'B'),
+                                 # Mesh flags: >>0 - isRendered, >>1 - isWireframe, >>2 - skinning indices are consecutive
+                                 ('meshflags', 'B'),
+                                 ('polygon_numeric_data_type', 'H'),  # 4 or 5: 4 is Triangles, 5 is TriangleStrips
+                                 ('name_hash', 'I'),
+
+                                 ('material_id', 'I'),
+                                 ('num_vertices', 'I'),
+
+                                 ('num_polygon_idxs', 'I'),
+                                 ('padding_0x44', 'I'),
+                                 ('padding_0x48', 'I'),
+                                 ('bounding_sphere_radius', 'f'),
+                                 ('mesh_centre', 'fff'),
+                                 ('bounding_box_lengths', 'fff')])
+
     def read_header(self):
-        self.rw_header(self.read_buffer, self.read_raw)
+        self.rw_header(self.read_schema)
 
     def write_header(self):
-        self.rw_header(self.write_buffer, self.write_raw)
+        self.rw_header(self.write_schema)
 
-    def rw_header(self, rw_operator, rw_operator_raw):
-        rw_operator('vertex_data_start_ptr', 'Q')
-        rw_operator('polygon_data_start_ptr', 'Q')
-        rw_operator('weighted_bone_data_start_ptr', 'Q')
-        rw_operator('padding_0x18', 'Q')  # Always 0
-        self.assert_is_zero('padding_0x18')
+    def rw_header(self, rw_schema_operator):
+        rw_schema_operator(self.header_schema)
 
-        rw_operator('vertex_components_start_ptr', 'Q')
-        rw_operator('num_weighted_bone_idxs', 'H')  # Lists a set of bones near the mesh
-        rw_operator('num_vertex_components', 'H')
-        rw_operator('bytes_per_vertex', 'H')
-        rw_operator('always_5123', 'H')  # Matches GL_UNSIGNED_SHORT value
+        self.assert_is_zero('padding_0x18')
         self.assert_equal('always_5123', self.header_breaker)
         # PS4: self.assert_equal('always_5123', 0)
-
-        rw_operator('max_vertex_groups_per_vertex', 'B')  # takes values 0, 1, 2, 3, 4: 0 means map everything to idx 0, 1 means the idxs are in the position vector
-        rw_operator('meshflags', 'B')  # Mesh flags: >>0 - isRendered, >>1 - isWireframe, >>2 - skinning indices are consecutive
-        rw_operator('polygon_numeric_data_type', 'H')  # 4 or 5: 4 is Triangles, 5 is TriangleStrips
-        rw_operator('name_hash', 'I')
-
-        rw_operator('material_id', 'I')
-        rw_operator('num_vertices', 'I')
-
-        rw_operator('num_polygon_idxs', 'I')
-        rw_operator('padding_0x44', 'I')
         self.assert_is_zero('padding_0x44')
-        rw_operator('padding_0x48', 'I')
         self.assert_is_zero('padding_0x48')
-        rw_operator('bounding_sphere_radius', 'f')
-        rw_operator('mesh_centre', 'fff')
-        rw_operator('bounding_box_lengths', 'fff')
 
         self.polygon_data_type = self.get_polygon_type_defs()[self.polygon_numeric_data_type]
 
+    def scan_record(self):
+        record = self.schema_record(self.header_schema)
+        record['polygon_data_type'] = self.polygon_data_type
+        return record
+
     def read(self):
         self.read_write(self.read_buffer, self.read_raw, self.cleanup_ragged_chunk_read)
         self.interpret_mesh_data()
+        self.is_loaded = True
+
+    def load(self):
+        """
+        Reads the mesh data of a lazily-read mesh from the bytestream, if it has not been read already.
+        """
+        if self.is_loaded:
+            return
+        # Mark the mesh as loaded first, so that the data holders can be accessed while they are being read
+        self.is_loaded = True
+        try:
+            self.bytestream.seek(self.vertex_data_start_ptr)
+            self.read()
+            self.report_violations()
+        except BaseException:
+            self.is_loaded = False
+            raise
+
+    def release(self):
+        """
+        Discards the mesh data of a lazily-read mesh, to free its memory. The data is read again on next access.
+        """
+        assert self.is_lazy, "Only meshes that were read lazily can be released, since the mesh data cannot be read again."
+        self.vertex_data = None
+        self.weighted_bone_idxs = None
+        self.polygon_data = None
+        self.vertex_components = None
+        self.is_loaded = False
 
     def write(self):
         self.reinterpret_mesh_data()
@@ -131,41 +199,79 @@ class MeshReaderBase(BaseRW):
     def rw_vertex_components(self, rw_operator):
         rw_operator('vertex_components', 'BBHBBH'*self.num_vertex_components)
 
+    def get_vertex_struct_dtype(self):
+        """
+        Returns a structured numpy dtype with one field per vertex component, laid out as in the raw vertex data.
+        """
+        return np.dtype({'names': [vertex_component.vertex_type for vertex_component in self.vertex_components],
+                         'formats': [(f'{self.endianness}{vertex_component.vertex_dtype}', (vertex_component.num_elements,))
+                                     for vertex_component in self.vertex_components],
+                         'offsets': [vertex_component.data_start_ptr for vertex_component in self.vertex_components],
+                         'itemsize': self.bytes_per_vertex})
+
+    def get_vertex_padding_mask(self):
+        """
+        Returns a boolean mask of the bytes of each vertex that are not covered by any vertex component.
+        """
+        padding_mask = np.ones(self.bytes_per_vertex, dtype=bool)
+        for vertex_component in self.vertex_components:
+            used_data = vertex_component.num_elements * self.type_buffers[vertex_component.vertex_dtype]
+            padding_mask[vertex_component.data_start_ptr:vertex_component.data_start_ptr + used_data] = False
+        return padding_mask
+
+    def check_vertex_padding(self):
+        if self.bytestream.validation_level == 'trusted':
+            return
+        raw_vertices = np.frombuffer(self.vertex_data, dtype=np.uint8).reshape((self.num_vertices, self.bytes_per_vertex))
+        padding = raw_vertices[:, self.get_vertex_padding_mask()]
+        pad_value = self.pad_byte[0]
+        self.make_assertion(lambda padding: np.all(padding == pad_value),
+                            lambda padding: f"Presumed junk data is non-zero: {bytes(padding[np.any(padding != pad_value, axis=1)][0])}",
+                            padding)
+
+    def decode_vertex_attributes(self):
+        """
+        Decodes the raw vertex data in one pass, returning a dict of vertex attribute name -> array of shape
+        (num_vertices, num_elements).
+        """
+        vertices = np.frombuffer(self.vertex_data, dtype=self.get_vertex_struct_dtype(), count=self.num_vertices)
+        return {vertex_component.vertex_type: self.decode_vertex_component(vertex_component, vertices[vertex_component.vertex_type])
+                for vertex_component in self.vertex_components}
+
+    def decode_vertex_component(self, vertex_component, data):
+        """
+        Converts the raw values of a vertex component, as stored in the file, into the values of the vertex attribute.
+        """
+        # Match the types that struct.unpack produces: floats for float data, ints for integer data
+        data_type = np.float64 if vertex_component.vertex_dtype in 'ef' else np.int64
+        return data.astype(data_type)
+
+    def encode_vertex_component(self, vertex_component, data):
+        """
+        The inverse of decode_vertex_component.
+        """
+        return data
+
     def interpret_vertices(self):
-        for i, raw_vertex_data in enumerate(self.vertex_data):
-            interpreted_vertex = {}
-            bounds = [vertex_component.data_start_ptr for vertex_component in self.vertex_components]
-            bounds.append(len(raw_vertex_data))
-            for j, vertex_component in enumerate(self.vertex_components):
-                lo_bnd = bounds[j]
-                hi_bnd = bounds[j + 1]
-                raw_vertex_subdata = raw_vertex_data[lo_bnd:hi_bnd]
-                used_data = vertex_component.num_elements * self.type_buffers[vertex_component.vertex_dtype]
-
-                dtype = f'{vertex_component.num_elements}{vertex_component.vertex_dtype}'
-
-                interpreted_data = np.array(struct.unpack(dtype, raw_vertex_subdata[:used_data]))
-                interpreted_vertex[vertex_component.vertex_type] = interpreted_data
-
-                unused_data = raw_vertex_subdata[used_data:]
-                if len(unused_data) > 0:
-                    assert unused_data == self.pad_byte * len(unused_data), f"Presumed junk data is non-zero: {unused_data}"
-            self.vertex_data[i] = interpreted_vertex
+        self.check_vertex_padding()
+        self.vertex_data = self.decode_vertex_attributes()
+
+    def encode_vertex_attributes(self, attributes):
+        """
+        Encodes a dict of vertex attribute name -> array of shape (num_vertices, num_elements) into the raw,
+        interleaved vertex data. Any bytes not covered by a vertex component are left as padding.
+        """
+        num_vertices = len(next(iter(attributes.values()))) if len(attributes) else 0
+        vertices = np.zeros(num_vertices, dtype=self.get_vertex_struct_dtype())
+        for vertex_component in self.vertex_components:
+            data = self.encode_vertex_component(vertex_component, np.asarray(attributes[vertex_component.vertex_type]))
+            field_dtype = vertices.dtype.fields[vertex_component.vertex_type][0].base
+            check_encodable(data, field_dtype, vertex_component.vertex_type)
+            vertices[vertex_component.vertex_type] = data
+        return vertices.tobytes()
 
     def reinterpret_vertices(self):
-        reinterpreted_vertices = []
-        for i, vertex_data in enumerate(self.vertex_data):
-            reinterpreted_vertex = b''
-            bounds = [vertex_component.data_start_ptr for vertex_component in self.vertex_components]
-            bounds.append(self.bytes_per_vertex)
-
-            for j, vertex_component in enumerate(self.vertex_components):
-                reinterpreted_vertex += struct.pack(f'{vertex_component.num_elements}{vertex_component.vertex_dtype}',
-                                                   *vertex_data[vertex_component.vertex_type])
-                reinterpreted_vertex += self.pad_byte * (bounds[j+1] - len(reinterpreted_vertex))
-            
-            reinterpreted_vertices.append(reinterpreted_vertex)
-        self.vertex_data = b''.join(reinterpreted_vertices)
+        self.vertex_data = self.encode_vertex_attributes(self.vertex_data)
 
     @classmethod
     def vertex_component_factory(cls, vtype, normalise, num_elements, dtype, vertex_attr_value, data_start_ptr):
@@ -185,7 +291,6 @@ class MeshReaderBase(BaseRW):
 
     def interpret_mesh_data(self):
         self.vertex_components = [self.vertex_component_factory(*data) for data in self.chunk_list(self.vertex_components, 6)]
-        self.vertex_data = self.chunk_list(self.vertex_data, self.bytes_per_vertex)
         self.interpret_vertices()
 
     def reinterpret_mesh_data(self):
@@ -306,60 +411,64 @@ class MeshReaderMegido(MeshReaderBase):
                 2: 'h',
                 1: 'B'}
 
-    def interpret_vertices(self):
-        for i, raw_vertex_data in enumerate(self.vertex_data):
-            interpreted_vertex = {}
-            bounds = [vertex_component.data_start_ptr for vertex_component in self.vertex_components]
-            bounds.append(len(raw_vertex_data))
-            for j, vertex_component in enumerate(self.vertex_components):
-                lo_bnd = bounds[j]
-                hi_bnd = bounds[j + 1]
-                raw_vertex_subdata = raw_vertex_data[lo_bnd:hi_bnd]
-                used_data = vertex_component.num_elements * self.type_buffers[vertex_component.vertex_dtype]
-
-                dtype = f'{vertex_component.num_elements}{vertex_component.vertex_dtype}'
-                if not(vertex_component.vertex_dtype == 'B' and not vertex_component.flag) and vertex_component.vertex_dtype != 'f':
-                    if vertex_component.vertex_dtype == 'h' and vertex_component.flag:  # Keep as int16
-                        amplitude = (2**16) / 2 - 1
-                    elif vertex_component.vertex_dtype == 'h' and not vertex_component.flag:  # Flip to uint16, UVs
-                        # This is *CLEARLY* not right, but gets the right results...
-
-                        amplitude = (2 ** 10) - 1
-                        dtype = dtype.upper()
-
-                        for idx in [1, 3]:
-                            byte = raw_vertex_subdata[idx:idx+1]
-                            bits = bytes_to_bits(byte)
-                            raw_vertex_subdata = raw_vertex_subdata[:idx] + bits_to_bytes('000000' + bits[6:]) + raw_vertex_subdata[idx+1:]
-
-                    elif vertex_component.vertex_dtype == 'B':  # Keep as int8
-                        amplitude = (2 ** 8) - 1
-                    else:
-                        assert 0, "Unexpected integer-float."
-
-                    interpreted_data = np.array(struct.unpack(dtype, raw_vertex_subdata[:used_data]))
-                    interpreted_data = interpreted_data / amplitude
-                else:
-                    interpreted_data = np.array(struct.unpack(dtype, raw_vertex_subdata[:used_data]))
-
-                interpreted_vertex[vertex_component.vertex_type] = interpreted_data
-
-                unused_data = raw_vertex_subdata[used_data:]
-                if len(unused_data) > 0:
-                    assert unused_data == self.pad_byte * len(unused_data), f"Presumed junk data is non-zero: {unused_data}"
-
-            self.vertex_data[i] = interpreted_vertex
-
-
-def chunks(lst, n):
-    """Yield successive n-sized chunks from lst."""
-    for i in range(0, len(lst), n):
-        yield lst[i:i + n]
-
-
-def bytes_to_bits(bytelist):
-    return ("{:0" + str(len(bytelist) * 8) + "b}").format(int(bytelist.hex(), 16))
-
-
-def bits_to_bytes(bitstring):
-    return b''.join([struct.pack('B', (int(elem, 2))) for elem in chunks(bitstring, 8)])
+    @classmethod
+    def vertex_component_data_factory(cls, vertex_component):
+        vtype, flag, num_elements, dtype, vertex_attr_value, data_start_ptr = super().vertex_component_data_factory(vertex_component)
+        # Tangents are declared as having 3 elements in Megido files, although 4 are stored
+        if isinstance(vertex_component, TangentH):
+            num_elements = 3
+        return vtype, flag, num_elements, dtype, vertex_attr_value, data_start_ptr
+
+    def encode_vertex_component(self, vertex_component, data):
+        vertex_dtype = vertex_component.vertex_dtype
+        if vertex_dtype == 'f' or (vertex_dtype == 'B' and not vertex_component.flag):
+            return data
+        elif vertex_dtype == 'h' and vertex_component.flag:
+            return np.round(data * 32767.)
+        elif vertex_dtype == 'h':
+            # Only the lower 10 bits are read back, so anything outside 0-1023 would wrap around to the other side
+            # of the UV tile
+            quantised = np.round(data * 1023.)
+            if quantised.size and (np.any(quantised < 0) or np.any(quantised > 0x3FF)):
+                raise ValueError(f"Vertex '{vertex_component.vertex_type}' has values outside of the range 0-1, "
+                                 f"which cannot be stored in 10 bits: min {np.min(data)}, max {np.max(data)}.")
+            return quantised
+        elif vertex_dtype == 'B':
+            return np.round(data * 255.)
+        else:
+            assert 0, "Unexpected integer-float."
+
+    def decode_vertex_component(self, vertex_component, data):
+        vertex_dtype = vertex_component.vertex_dtype
+        if vertex_dtype == 'f' or (vertex_dtype == 'B' and not vertex_component.flag):
+            return super().decode_vertex_component(vertex_component, data)
+        elif vertex_dtype == 'h' and vertex_component.flag:  # Keep as int16
+            return data / 32767.
+        elif vertex_dtype == 'h':  # Flip to uint16, UVs
+            # This is *CLEARLY* not right, but gets the right results...
+            # Only the lower 10 bits of each value are used
+            return (data.astype(np.uint16) & 0x3FF) / 1023.
+        elif vertex_dtype == 'B':  # Keep as int8
+            return data / 255.
+        else:
+            assert 0, "Unexpected integer-float."
+
+
+def check_encodable(data, dtype, vertex_type):
+    """
+    Raises a ValueError if 'data' cannot be stored as 'dtype' without being silently wrapped or overflowing, which
+    numpy would otherwise allow.
+    """
+    if dtype.kind in 'ui':
+        dtype_info = np.iinfo(dtype)
+        if data.size and (np.any(data < dtype_info.min) or np.any(data > dtype_info.max)):
+            raise ValueError(f"Vertex '{vertex_type}' has values outside of the range of {dtype}: "
+                             f"min {np.min(data)}, max {np.max(data)}.")
+        if data.dtype.kind == 'f' and np.any(data != np.round(data)):
+            raise ValueError(f"Vertex '{vertex_type}' has non-integer values, which cannot be stored as {dtype}.")
+    elif dtype.kind == 'f':
+        with np.errstate(over='ignore'):
+            overflowed = np.isinf(data.astype(dtype)) & np.isfinite(data)
+        if np.any(overflowed):
+            raise ValueError(f"Vertex '{vertex_type}' has values too large to be stored as {dtype}: "
+                             f"{data[overflowed][:5]}.")
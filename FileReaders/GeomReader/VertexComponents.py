@@ -1,3 +1,6 @@
+import numpy as np
+
+
 class BaseVertexComponent:
     vertex_type = None
     num_elements = None
@@ -9,9 +12,13 @@ class BaseVertexComponent:
         self.flag = flag
 
     @classmethod
-    def generator(cls, vtx):
-        assert len(vtx[cls.vertex_type]) == cls.num_elements, f"Vertex \'{cls.vertex_type}\' has an invalid number of elements: {len(vtx[cls.vertex_type])}, should have {cls.num_elements}. Full vertex is:\n {vtx}"
-        return {cls.vertex_type: vtx[cls.vertex_type]}
+    def generator(cls, vertices):
+        """
+        Returns the data for this component from a VertexTable, as an array of shape (num_vertices, num_elements).
+        """
+        data = vertices.attributes[cls.vertex_type]
+        assert data.shape[1] == cls.num_elements, f"Vertex \'{cls.vertex_type}\' has an invalid number of elements: {data.shape[1]}, should have {cls.num_elements}."
+        return data
 
 
 class Position(BaseVertexComponent):
@@ -25,8 +32,9 @@ class PosWeight(BaseVertexComponent):
     num_elements = 4
     vertex_dtype = 'f'
 
-    def generator(self, vtx):
-        return {'Position': [*vtx['Position'], float(3 * vtx['WeightedBoneID'][0])]}
+    @classmethod
+    def generator(cls, vertices):
+        return np.hstack([vertices.attributes['Position'], 3. * vertices.bone_ids[:, :1]])
 
 
 class Normal(BaseVertexComponent):
@@ -121,22 +129,22 @@ class ByteColour(BaseVertexComponent):
 
 class BaseIndexComponent(BaseVertexComponent):
     @classmethod
-    def generator(cls, vtx):
-        num_missing_items = cls.num_elements - len(vtx[cls.vertex_type])
-        current_items = [item*3 for item in vtx[cls.vertex_type]]
-        current_items.extend([0] * num_missing_items)
-        assert len(current_items) == cls.num_elements, "Something went wrong extending vertex indices."
-        return {cls.vertex_type: current_items}
+    def generator(cls, vertices):
+        num_items = vertices.bone_ids.shape[1]
+        assert num_items <= cls.num_elements, "Something went wrong extending vertex indices."
+        current_items = np.zeros((len(vertices), cls.num_elements), dtype=np.int64)
+        current_items[:, :num_items] = 3 * vertices.bone_ids
+        return current_items
 
 
 class BaseWeightComponent(BaseVertexComponent):
     @classmethod
-    def generator(cls, vtx):
-        num_missing_items = cls.num_elements - len(vtx[cls.vertex_type])
-        current_items = [item for item in vtx[cls.vertex_type]]
-        current_items.extend([0.] * num_missing_items)
-        assert len(current_items) == cls.num_elements, "Something went wrong extending vertex weights."
-        return {cls.vertex_type: current_items}
+    def generator(cls, vertices):
+        num_items = vertices.bone_weights.shape[1]
+        assert num_items <= cls.num_elements, "Something went wrong extending vertex weights."
+        current_items = np.zeros((len(vertices), cls.num_elements))
+        current_items[:, :num_items] = vertices.bone_weights
+        return current_items
 
 
 class Indices2(BaseIndexComponent):
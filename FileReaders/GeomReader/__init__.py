@@ -1,7 +1,8 @@
-from ..BaseRW import BaseRW
+from ..BaseRW import BaseRW, FieldSchema
 from .MeshReader import MeshReaderPC, MeshReaderPS4, MeshReaderMegido
 from .MaterialReader import MaterialReader
 
+import io
 import numpy as np
 import typing
 
@@ -57,6 +58,8 @@ class GeomReader(BaseRW):
         self.texture_names_start_ptr = None
         self.footer_data_start_offset = None
 
+        self.lazy_meshes = False
+
         # Data storage variables
         self.meshes = []
         self.material_data = []
@@ -75,16 +78,44 @@ class GeomReader(BaseRW):
                           'Megido': GeomReaderMegido}
         return platform_table[platform](bytestream)
 
-    def read(self):
+    def read(self, lazy=False):
+        """
+        Reads the file. If 'lazy' is True, only the header of each mesh is read, and the remaining mesh data is read
+        from the bytestream when it is first accessed: see MeshReaderBase. The bytestream must then stay open for as
+        long as the meshes are in use.
+        """
+        self.lazy_meshes = lazy
         self.read_write(self.read_buffer, 'read', self.read_raw, self.prepare_read_op, self.cleanup_ragged_chunk_read)
         self.interpret_geom_data()
+        self.report_violations()
+
+    def scan(self):
+        """
+        Reads only the file header and the mesh headers, which is enough to catalogue a file without decoding any
+        vertex or material data.
+
+        Returns
+        ------
+        A dict of the header fields, with the header fields of each mesh in a list under 'meshes'.
+        """
+        self.rw_header(self.read_schema)
+        self.prepare_read_op()
+        if not self.is_ndef(self.meshes_start_ptr, 'num_meshes'):
+            self.assert_file_pointer_now_at(self.meshes_start_ptr)
+            for meshReader in self.meshes:
+                meshReader.read_header()
+        self.report_violations()
+
+        record = self.schema_record(self.header_schema)
+        record['meshes'] = [meshReader.scan_record() for meshReader in self.meshes]
+        return record
 
     def write(self):
         self.reinterpret_geom_data()
         self.read_write(self.write_buffer, 'write', self.write_raw, lambda: None, self.cleanup_ragged_chunk_write)
 
     def read_write(self, rw_operator, rw_method_name, rw_operator_raw, preparation_op, chunk_cleanup_operator):
-        self.rw_header(rw_operator)
+        self.rw_header(getattr(self, f'{rw_method_name}_schema'))
         preparation_op()
         self.rw_meshes(rw_operator, rw_method_name)
         self.rw_material_data(rw_method_name)
@@ -95,7 +126,29 @@ class GeomReader(BaseRW):
         self.rw_bone_data(rw_operator)
         self.rw_footer_data(rw_operator_raw)
 
-    def rw_header(self, rw_operator):
+    header_schema = FieldSchema([('filetype', 'I'),  # Always 100.
+                                 ('num_meshes', 'H'),
+                                 ('num_materials', 'H'),
+                                 ('num_light_sources', 'H'),  # 0, 1, 2, 3, 4 ,5
+                                 ('num_cameras', 'H'),  # 0, 1, 2, 3, 4, 9
+                                 ('num_bones', 'I'),
+
+                                 ('num_bytes_in_texture_names_section', 'I'),
+                                 ('geom_centre', 'fff'),
+                                 ('geom_bounding_box_lengths', 'fff'),
+                                 ('padding_0x2C', 'I'),  # Always 0
+
+                                 ('meshes_start_ptr', 'Q'),
+                                 ('materials_start_ptr', 'Q'),
+                                 ('light_sources_ptr', 'Q'),
+                                 ('cameras_ptr', 'Q'),
+
+                                 ('bone_matrices_start_ptr', 'Q'),
+                                 ('padding_0x58', 'Q'),
+                                 ('texture_names_start_ptr', 'Q'),
+                                 ('footer_data_start_offset', 'Q')])
+
+    def rw_header(self, rw_schema_operator):
         """
 
         Returns
@@ -106,30 +159,10 @@ class GeomReader(BaseRW):
         # Header
         self.assert_file_pointer_now_at(0)
 
-        rw_operator('filetype', 'I')  # Always 100.
+        rw_schema_operator(self.header_schema)
         self.assert_equal('filetype', 100)
-        rw_operator('num_meshes', 'H')
-        rw_operator('num_materials', 'H')
-        rw_operator('num_light_sources', 'H')  # 0, 1, 2, 3, 4 ,5
-        rw_operator('num_cameras', 'H')  # 0, 1, 2, 3, 4, 9
-        rw_operator('num_bones', 'I')
-
-        rw_operator('num_bytes_in_texture_names_section', 'I')
-        rw_operator('geom_centre', 'fff')
-        rw_operator('geom_bounding_box_lengths', 'fff')
-        rw_operator('padding_0x2C', 'I')  # Always 0
         self.assert_is_zero('padding_0x2C')
-
-        rw_operator('meshes_start_ptr', 'Q')
-        rw_operator('materials_start_ptr', 'Q')
-        rw_operator('light_sources_ptr', 'Q')
-        rw_operator('cameras_ptr', 'Q')
-
-        rw_operator('bone_matrices_start_ptr', 'Q')
-        rw_operator('padding_0x58', 'Q')
         self.assert_is_zero("padding_0x58")
-        rw_operator('texture_names_start_ptr', 'Q')
-        rw_operator('footer_data_start_offset', 'Q')
 
     def is_ndef(self, offset, numValues):
         """
@@ -158,9 +191,26 @@ class GeomReader(BaseRW):
 
         for meshReader in self.meshes:
             getattr(meshReader, f'{rw_method_name}_header')()
+        if rw_method_name == 'read' and self.lazy_meshes:
+            for meshReader in self.meshes:
+                meshReader.is_lazy = True
+            self.bytestream.seek(self.get_next_section_ptr(self.meshes_start_ptr))
+            return
         for i, meshReader in enumerate(self.meshes):
             getattr(meshReader, rw_method_name)()
 
+    def get_next_section_ptr(self, section_ptr):
+        """
+        Returns the file pointer of the first section after the one starting at 'section_ptr', or the end of the file if
+        there are no later sections.
+        """
+        section_ptrs = [self.materials_start_ptr, self.texture_names_start_ptr, self.light_sources_ptr,
+                        self.cameras_ptr, self.bone_matrices_start_ptr, self.footer_data_start_offset]
+        later_ptrs = [ptr for ptr in section_ptrs if ptr > section_ptr]
+        if len(later_ptrs):
+            return min(later_ptrs)
+        return self.bytestream.seek(0, io.SEEK_END)
+
     def rw_material_data(self, rw_method_name):
         if self.is_ndef(self.materials_start_ptr, 'num_materials'):
             return
@@ -302,33 +352,35 @@ class LightSource(BaseRW):
         self.padding_0x30 = None
         self.padding_0x38 = None
 
-    def read(self):
-        self.rw_header(self.read_buffer)
+    header_schema = FieldSchema([('bone_name_hash', 'I'),
+                                 ('mode', 'H'),  # 0 = POINT, 2 = AMBIENT, 3 = DIRECTIONAL, 4 = UNKNOWN: Fog?
+                                 ('light_id', 'H'),  # Runs from 0 - 4
 
-    def write(self):
-        self.rw_header(self.write_buffer)
+                                 ('intensity', 'f'),
+                                 ('unknown_fog_param', 'f'),  # Fog height?
 
-    def rw_header(self, rw_operator):
-        rw_operator('bone_name_hash', 'I')
-        rw_operator('mode', 'H')  # 0 = POINT, 2 = AMBIENT, 3 = DIRECTIONAL, 4 = UNKNOWN: Fog?
-        rw_operator('light_id', 'H')  # Runs from 0 - 4
+                                 ('red', 'f'),
+                                 ('blue', 'f'),
+                                 ('green', 'f'),
+                                 ('alpha', 'f'),
 
-        rw_operator('intensity', 'f')
-        rw_operator('unknown_fog_param', 'f')  # Fog height?
+                                 # Not sure.
+                                 ('unknown_0x20', 'i'),
+                                 ('unknown_0x24', 'i'),
+                                 ('unknown_0x28', 'i'),
 
-        rw_operator('red', 'f')
-        rw_operator('blue', 'f')
-        rw_operator('green', 'f')
-        rw_operator('alpha', 'f')
+                                 ('padding_0x2C', 'I'),
+                                 ('padding_0x30', 'Q'),
+                                 ('padding_0x38', 'Q')])
 
-        # Not sure.
-        rw_operator('unknown_0x20', 'i')
-        rw_operator('unknown_0x24', 'i')
-        rw_operator('unknown_0x28', 'i')
+    def read(self):
+        self.rw_header(self.read_schema)
 
-        rw_operator('padding_0x2C', 'I')
-        rw_operator('padding_0x30', 'Q')
-        rw_operator('padding_0x38', 'Q')
+    def write(self):
+        self.rw_header(self.write_schema)
+
+    def rw_header(self, rw_schema_operator):
+        rw_schema_operator(self.header_schema)
 
 
 class CameraData(BaseRW):
@@ -348,24 +400,26 @@ class CameraData(BaseRW):
         self.padding_0x20 = None
         self.padding_0x28 = None
 
-    def read(self):
-        self.rw_header(self.read_buffer)
+    header_schema = FieldSchema([('bone_name_hash', 'I'),
 
-    def write(self):
-        self.rw_header(self.write_buffer)
+                                 # Some parameters...
+                                 ('fov', 'f'),
+                                 ('maybe_aspect_ratio', 'f'),
+                                 ('zNear', 'f'),
 
-    def rw_header(self, rw_operator):
-        rw_operator('bone_name_hash', 'I')
+                                 ('zFar', 'f'),
+                                 ('orthographic_scale', 'f'),
+                                 ('projection', 'I'),  # 0 = Perspective, 1 = Ortho
+                                 ('padding_0x1C', 'I'),
 
-        # Some parameters...
-        rw_operator('fov', 'f')
-        rw_operator('maybe_aspect_ratio', 'f')
-        rw_operator('zNear', 'f')
+                                 ('padding_0x20', 'Q'),
+                                 ('padding_0x28', 'Q')])
 
-        rw_operator('zFar', 'f')
-        rw_operator('orthographic_scale', 'f')
-        rw_operator('projection', 'I')  # 0 = Perspective, 1 = Ortho
-        rw_operator('padding_0x1C', 'I')
+    def read(self):
+        self.rw_header(self.read_schema)
+
+    def write(self):
+        self.rw_header(self.write_schema)
 
-        rw_operator('padding_0x20', 'Q')
-        rw_operator('padding_0x28', 'Q')
+    def rw_header(self, rw_schema_operator):
+        rw_schema_operator(self.header_schema)
@@ -31,6 +31,17 @@ class NameReader(BaseRW):
         """
         self.read_write(self.read_buffer, self.read_ascii)
         self.interpret_name_data()
+        self.report_violations()
+
+    def scan(self):
+        """
+        Reads only the file header, which is enough to catalogue a file without decoding the names.
+        """
+        self.rw_header(self.read_buffer)
+        self.report_violations()
+
+        return {'num_bone_names': self.num_bone_names,
+                'num_material_names': self.num_material_names}
 
     def write(self):
         """
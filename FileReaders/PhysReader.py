@@ -28,6 +28,7 @@ class PhysReader(BaseRW):
         self.read_write(self.read_buffer, 'read', self.init_structs, self.read_ascii, self.read_raw, self.cleanup_ragged_chunk_read)
         assert self.bytestream.read(1) == b''
         self.interpret_phys_data()
+        self.report_violations()
 
     def write(self):
         self.reinterpret_phys_data()
@@ -0,0 +1,151 @@
+import functools
+import inspect
+import json
+import threading
+import time
+import types
+
+
+class Profiler:
+    """
+    Records the number of calls, wall time, and bytes read or written by each section of a file as it is parsed or
+    written, e.g. 'GeomReaderPC.rw_meshes' -> 'MeshReaderPC.read' -> 'MeshReaderPC.rw_vertices'.
+
+    A profiler is attached to a bytestream with BaseRW.set_profiler, after which the rw_*, interpret_*, and
+    reinterpret_* methods, plus read() and write(), of every reader of that bytestream are timed. Timings are recorded
+    per call stack, so the same method called from two different sections is recorded twice.
+
+    The results can be exported as JSON with to_json(), or as folded stacks with to_folded(), which can be passed
+    directly to flame graph tools such as flamegraph.pl or speedscope.
+    """
+    instrumented_prefixes = ('rw_', 'interpret_', 'reinterpret_')
+    instrumented_methods = ('read', 'write', 'read_write', 'read_header', 'write_header', 'scan')
+
+    def __init__(self):
+        # Call stack -> [number of calls, total time in seconds, total bytes]
+        self.stats = {}
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def get_stack(self):
+        # Each thread parsing a file needs its own call stack
+        if not hasattr(self.local, 'stack'):
+            self.local.stack = []
+        return self.local.stack
+
+    def instrument(self, readwriter):
+        """
+        Replaces the methods of 'readwriter' that correspond to file sections with timed versions.
+        """
+        class_name = type(readwriter).__name__
+        for method_name in dir(type(readwriter)):
+            if method_name not in self.instrumented_methods and not method_name.startswith(self.instrumented_prefixes):
+                continue
+            # Skip static methods and attributes, and methods that have already been instrumented
+            if method_name in vars(readwriter):
+                continue
+            if not isinstance(inspect.getattr_static(readwriter, method_name), types.FunctionType):
+                continue
+            method = getattr(readwriter, method_name)
+            setattr(readwriter, method_name, self.wrap_method(readwriter, method, f'{class_name}.{method_name}'))
+
+    def wrap_method(self, readwriter, method, frame_name):
+        @functools.wraps(method)
+        def profiled_method(*args, **kwargs):
+            stack = self.get_stack()
+            stack.append(frame_name)
+            bytestream = readwriter.bytestream
+            start_position = bytestream.tell()
+            start_time = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                elapsed_time = time.perf_counter() - start_time
+                num_bytes = bytestream.tell() - start_position
+                self.record(tuple(stack), elapsed_time, num_bytes)
+                stack.pop()
+
+        return profiled_method
+
+    def record(self, stack, elapsed_time, num_bytes):
+        with self.lock:
+            stats = self.stats.get(stack)
+            if stats is None:
+                stats = [0, 0., 0]
+                self.stats[stack] = stats
+            stats[0] += 1
+            stats[1] += elapsed_time
+            stats[2] += num_bytes
+
+    def reset(self):
+        with self.lock:
+            self.stats = {}
+
+    def get_self_times(self):
+        """
+        Returns the time spent in each call stack, excluding the time spent in the sections it calls.
+        """
+        self_times = {stack: stats[1] for stack, stats in self.stats.items()}
+        for stack, stats in self.stats.items():
+            if len(stack) > 1 and stack[:-1] in self_times:
+                self_times[stack[:-1]] -= stats[1]
+        return self_times
+
+    def get_records(self):
+        """
+        Returns a list of dicts, one per call stack, sorted by call stack. Times are in seconds, and include the time
+        spent in the sections each stack calls except for 'self_time'.
+        """
+        self_times = self.get_self_times()
+        return [{'stack': list(stack),
+                 'calls': calls,
+                 'time': total_time,
+                 'self_time': self_times[stack],
+                 'bytes': num_bytes}
+                for stack, (calls, total_time, num_bytes) in sorted(self.stats.items())]
+
+    def get_totals(self, method_name):
+        """
+        Returns the total calls, time, and bytes of every section whose name ends with 'method_name', e.g.
+        'interpret_mesh_data' or 'MeshReaderPC.interpret_mesh_data'. Sections which are called from inside themselves
+        are only counted once.
+        """
+        calls = 0
+        total_time = 0.
+        num_bytes = 0
+        for stack, stats in self.stats.items():
+            if not self.frame_matches(stack[-1], method_name):
+                continue
+            calls += stats[0]
+            if any([self.frame_matches(frame, method_name) for frame in stack[:-1]]):
+                continue
+            total_time += stats[1]
+            num_bytes += stats[2]
+        return {'calls': calls, 'time': total_time, 'bytes': num_bytes}
+
+    @staticmethod
+    def frame_matches(frame_name, method_name):
+        return frame_name == method_name or frame_name.endswith('.' + method_name)
+
+    def to_json(self, path=None):
+        """
+        Returns the records from get_records() as a JSON string, and writes it to 'path' if one is given.
+        """
+        output = json.dumps(self.get_records(), indent=4)
+        if path is not None:
+            with open(path, 'w') as F:
+                F.write(output)
+        return output
+
+    def to_folded(self, path=None):
+        """
+        Returns the self time of each call stack in microseconds, in the folded stack format used by flame graph tools,
+        and writes it to 'path' if one is given.
+        """
+        self_times = self.get_self_times()
+        output = '\n'.join([f"{';'.join(stack)} {max(int(round(self_times[stack] * 1e6)), 0)}"
+                            for stack in sorted(self.stats)])
+        if path is not None:
+            with open(path, 'w') as F:
+                F.write(output)
+        return output
@@ -71,6 +71,23 @@ class SkelReader(BaseRW):
     def read(self):
         self.read_write(self.read_buffer, self.read_ascii, self.read_raw, self.cleanup_ragged_chunk_read)
         self.interpret_skel_data()
+        self.report_violations()
+
+    def scan(self):
+        """
+        Reads only the file header, which is enough to catalogue a file without decoding any bone data.
+
+        Returns
+        ------
+        A dict of the header fields.
+        """
+        self.rw_header(self.read_buffer, self.read_ascii)
+        self.report_violations()
+
+        return {'total_bytes': self.total_bytes,
+                'num_bones': self.num_bones,
+                'num_uv_channels': self.num_uv_channels,
+                'num_bone_hierarchy_data_lines': self.num_bone_hierarchy_data_lines}
 
     def write(self):
         self.reinterpret_skel_data()
@@ -0,0 +1,145 @@
+from collections.abc import MutableMapping
+
+import numpy as np
+
+
+class KeyframeTrack:
+    """
+    The keyframes of a single animated channel, such as the rotation of one bone, stored as an int32 array of frame
+    indices in ascending order and a float32 array of the value at each frame.
+
+    The values are an array of shape (num_keyframes, num_components), or of shape (num_keyframes,) for channels with
+    a single scalar value per frame.
+    """
+    def __init__(self, frames=None, values=None, num_components=None):
+        frames = [] if frames is None else frames
+        values = [] if values is None else values
+        self.frames = np.asarray(frames, dtype=np.int32).reshape(-1)
+        self.values = np.asarray(values, dtype=np.float32)
+        if num_components is not None:
+            self.values = self.values.reshape((-1, num_components))
+        if len(self.frames) != len(self.values):
+            raise ValueError(f"Keyframe track has {len(self.frames)} frames but {len(self.values)} values.")
+
+    @classmethod
+    def from_dict(cls, keyframes, num_components=None):
+        """
+        Builds a KeyframeTrack from a dict of {frame: value} pairs, which is sorted by frame.
+        """
+        items = sorted(keyframes.items(), key=lambda item: item[0])
+        return cls([frame for frame, _ in items], [value for _, value in items], num_components)
+
+    def __len__(self):
+        return len(self.frames)
+
+    @property
+    def num_components(self):
+        return self.values.shape[1] if self.values.ndim == 2 else None
+
+    @property
+    def nbytes(self):
+        return self.frames.nbytes + self.values.nbytes
+
+    def to_dict(self):
+        return dict(zip(self.frames.tolist(), self.values.tolist()))
+
+    def __repr__(self):
+        return f"KeyframeTrack({len(self)} keyframes)"
+
+
+class TrackTable(MutableMapping):
+    """
+    A dict of KeyframeTracks indexed by bone or channel index, all with the same number of components per value.
+
+    Assigning a dict of {frame: value} pairs converts it into a KeyframeTrack, so that the table can be filled in the
+    same way as the nested dicts it replaces.
+    """
+    def __init__(self, num_components=None):
+        self.num_components = num_components
+        self.tracks = {}
+
+    @classmethod
+    def from_keyframes(cls, channel_idxs, frames, values, num_components=None, num_channels=0):
+        """
+        Builds a TrackTable from flat arrays holding the channel index, frame, and value of every keyframe, in any
+        order. If a channel has more than one value for the same frame, the last one is kept. Channels 0 to
+        'num_channels' - 1 are always present, even if they have no keyframes.
+        """
+        channel_idxs = np.asarray(channel_idxs, dtype=np.int64).reshape(-1)
+        frames = np.asarray(frames, dtype=np.int64).reshape(-1)
+        values = np.asarray(values, dtype=np.float32)
+        if num_components is not None:
+            values = values.reshape((-1, num_components))
+        else:
+            values = values.reshape(-1)
+
+        table = cls(num_components)
+        for channel_idx in range(num_channels):
+            table.tracks[channel_idx] = KeyframeTrack(num_components=num_components)
+        if not len(frames):
+            return table
+
+        # Searching the reversed keys for the first occurrence of each key keeps the last value given for each frame
+        keys = channel_idxs * (int(np.max(frames)) + 1) + frames
+        _, reversed_idxs = np.unique(keys[::-1], return_index=True)
+        # np.unique sorts the keys, so each channel is now a contiguous run of keyframes in frame order
+        order = len(keys) - 1 - reversed_idxs
+        channel_idxs = channel_idxs[order]
+        frames = frames[order]
+        values = values[order]
+
+        starts = [0, *(np.flatnonzero(np.diff(channel_idxs)) + 1).tolist()]
+        ends = [*starts[1:], len(channel_idxs)]
+        for start, end in zip(starts, ends):
+            table.tracks[int(channel_idxs[start])] = KeyframeTrack(frames[start:end], values[start:end], num_components)
+        return table
+
+    def __getitem__(self, channel_idx):
+        return self.tracks[channel_idx]
+
+    def __setitem__(self, channel_idx, track):
+        self.tracks[channel_idx] = as_keyframe_track(track, self.num_components)
+
+    def __delitem__(self, channel_idx):
+        del self.tracks[channel_idx]
+
+    def __iter__(self):
+        return iter(self.tracks)
+
+    def __len__(self):
+        return len(self.tracks)
+
+    @property
+    def last_frame(self):
+        """
+        The last keyframe of any track in the table, or 0 if there are no keyframes.
+        """
+        return max([int(track.frames[-1]) for track in self.tracks.values() if len(track)], default=0)
+
+    @property
+    def nbytes(self):
+        return sum([track.nbytes for track in self.tracks.values()])
+
+    def __repr__(self):
+        return f"TrackTable({len(self)} tracks)"
+
+
+def as_keyframe_track(track, num_components=None):
+    """
+    Returns 'track' as a KeyframeTrack, converting it from a dict of {frame: value} pairs if necessary.
+    """
+    if isinstance(track, KeyframeTrack):
+        return track
+    return KeyframeTrack.from_dict(track, num_components)
+
+
+def as_track_table(tracks, num_components=None):
+    """
+    Returns 'tracks' as a TrackTable, converting it from a dict of {channel_idx: {frame: value}} dicts if necessary.
+    """
+    if isinstance(tracks, TrackTable):
+        return tracks
+    table = TrackTable(num_components)
+    for channel_idx, track in tracks.items():
+        table[channel_idx] = track
+    return table
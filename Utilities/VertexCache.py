@@ -0,0 +1,151 @@
+from collections import deque
+
+import numpy as np
+
+
+# Scoring parameters from Tom Forsyth's "Linear-Speed Vertex Cache Optimisation"
+cache_decay_power = 1.5
+last_triangle_score = 0.75
+valence_boost_scale = 2.
+valence_boost_power = 0.5
+
+
+def get_acmr(triangles, cache_size=16):
+    """
+    Simulates a FIFO post-transform vertex cache of 'cache_size' entries, and returns the average number of cache
+    misses per triangle (ACMR). This lies between roughly 0.5 for a perfectly-ordered regular mesh and 3.
+    """
+    idxs = np.asarray(triangles, dtype=np.int64).ravel().tolist()
+    num_triangles = len(idxs) // 3
+    if not num_triangles:
+        return 0.
+
+    cache = deque()
+    in_cache = set()
+    misses = 0
+    for idx in idxs:
+        if idx in in_cache:
+            continue
+        misses += 1
+        cache.append(idx)
+        in_cache.add(idx)
+        if len(cache) > cache_size:
+            in_cache.remove(cache.popleft())
+    return misses / num_triangles
+
+
+def get_vertex_scores(cache_size):
+    """
+    Returns the score of a vertex at each position of the cache, plus the score of a vertex outside it at the end.
+    """
+    scores = []
+    for cache_position in range(cache_size):
+        if cache_position < 3:
+            # The vertices of the last triangle get a fixed score, so that the next triangle doesn't just reuse them
+            scores.append(last_triangle_score)
+        else:
+            scores.append((1. - (cache_position - 3) / (cache_size - 3)) ** cache_decay_power)
+    scores.append(0.)
+    return scores
+
+
+def optimise_triangle_order(triangles, num_vertices=None, cache_size=32):
+    """
+    Reorders 'triangles' so that consecutive triangles share as many vertices as possible, using Tom Forsyth's
+    algorithm with an LRU cache model of 'cache_size' entries. The vertices of each triangle are not changed.
+
+    Returns the order of the triangles as an array of indices into 'triangles'.
+    """
+    triangles = np.asarray(triangles, dtype=np.int64).reshape((-1, 3))
+    num_triangles = len(triangles)
+    if num_vertices is None:
+        num_vertices = int(np.max(triangles, initial=-1)) + 1
+    triangle_list = [list(dict.fromkeys(triangle)) for triangle in triangles.tolist()]
+
+    vertex_triangles = [[] for _ in range(num_vertices)]
+    for triangle_idx, triangle in enumerate(triangle_list):
+        for idx in triangle:
+            vertex_triangles[idx].append(triangle_idx)
+    remaining_valences = [len(triangle_idxs) for triangle_idxs in vertex_triangles]
+
+    position_scores = get_vertex_scores(cache_size)
+    cache_positions = [cache_size] * num_vertices
+
+    def score_vertex(idx):
+        if not remaining_valences[idx]:
+            return -1.
+        valence_boost = valence_boost_scale * remaining_valences[idx] ** -valence_boost_power
+        return position_scores[cache_positions[idx]] + valence_boost
+
+    vertex_scores = [score_vertex(idx) for idx in range(num_vertices)]
+    triangle_scores = [sum([vertex_scores[idx] for idx in triangle]) for triangle in triangle_list]
+    added = [False] * num_triangles
+
+    order = []
+    cache = []
+    best_triangle = int(np.argmax(triangle_scores)) if num_triangles else None
+    next_unadded = 0
+    while len(order) < num_triangles:
+        if best_triangle is None:
+            # Nothing in the cache can be continued, so start again from the next triangle in the original order
+            while added[next_unadded]:
+                next_unadded += 1
+            best_triangle = next_unadded
+        triangle = triangle_list[best_triangle]
+        added[best_triangle] = True
+        order.append(best_triangle)
+        for idx in triangle:
+            remaining_valences[idx] -= 1
+
+        # Move the vertices of the triangle to the front of the cache
+        cache = triangle + [idx for idx in cache if idx not in triangle]
+        evicted = cache[cache_size:]
+        cache = cache[:cache_size]
+        for idx in evicted:
+            cache_positions[idx] = cache_size
+        for cache_position, idx in enumerate(cache):
+            cache_positions[idx] = cache_position
+
+        for idx in cache + evicted:
+            vertex_scores[idx] = score_vertex(idx)
+
+        # Only triangles with a vertex in the cache can have changed score
+        best_triangle = None
+        best_score = -1.
+        for idx in cache + evicted:
+            for triangle_idx in vertex_triangles[idx]:
+                if added[triangle_idx]:
+                    continue
+                score = sum([vertex_scores[vertex_idx] for vertex_idx in triangle_list[triangle_idx]])
+                triangle_scores[triangle_idx] = score
+                if score > best_score and cache_positions[idx] < cache_size:
+                    best_triangle = triangle_idx
+                    best_score = score
+    return np.array(order, dtype=np.int64)
+
+
+def get_first_use_order(triangles, num_vertices):
+    """
+    Returns the vertex indices in the order they are first used by 'triangles'. Vertices that are not used by any
+    triangle follow in their original order.
+    """
+    idxs = np.asarray(triangles, dtype=np.int64).ravel()
+    first_use = np.full(num_vertices, len(idxs), dtype=np.int64)
+    # Assigning in reverse leaves the earliest position of each vertex
+    first_use[idxs[::-1]] = np.arange(len(idxs))[::-1]
+    return np.argsort(first_use, kind='stable')
+
+
+def optimise_vertex_cache(vertices, triangles, cache_size=32):
+    """
+    Reorders the triangles of a mesh for the post-transform vertex cache, and then renumbers the vertices in the order
+    the reordered triangles first use them, so that the vertex data is also read in order.
+
+    Returns the reordered VertexTable and the renumbered triangles as an array of shape (num_triangles, 3).
+    """
+    triangles = np.asarray(triangles, dtype=np.int64).reshape((-1, 3))
+    triangles = triangles[optimise_triangle_order(triangles, len(vertices), cache_size)]
+    vertex_order = get_first_use_order(triangles, len(vertices))
+    new_idxs = np.empty_like(vertex_order)
+    new_idxs[vertex_order] = np.arange(len(vertex_order))
+    return vertices.take(vertex_order), new_idxs[triangles]
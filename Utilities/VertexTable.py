@@ -0,0 +1,299 @@
+from collections.abc import MutableMapping
+
+import numpy as np
+
+
+class VertexTable:
+    """
+    A table of vertices stored as one array per vertex attribute, rather than as one dict per vertex.
+
+    Each attribute ('Position', 'Normal', 'UV', 'UV2', 'UV3', 'Colour', 'Tangent', 'Binormal') is an array of shape
+    (num_vertices, num_elements) in 'attributes'. Vertices can belong to different numbers of vertex groups, so the
+    vertex group data is stored in two zero-padded arrays of shape (num_vertices, max_vertex_groups), 'bone_ids' and
+    'bone_weights', plus the number of vertex groups of each vertex in 'vertex_group_counts'.
+
+    Indexing the table with an integer returns a VertexView, which behaves like the per-vertex dicts the table
+    replaces: it has the keys of each attribute plus 'WeightedBoneID' and 'BoneWeight', and assigning to a key writes
+    through to the table.
+    """
+    vertex_group_keys = ('WeightedBoneID', 'BoneWeight')
+
+    def __init__(self, attributes=None, num_vertices=None):
+        attributes = {} if attributes is None else attributes
+        if num_vertices is None:
+            num_vertices = len(next(iter(attributes.values()))) if len(attributes) else 0
+        self.num_vertices = num_vertices
+        self.attributes = {}
+        self.bone_ids = None
+        self.bone_weights = None
+        self.vertex_group_counts = None
+
+        for key, data in attributes.items():
+            self.set_attribute(key, data)
+
+    @classmethod
+    def from_dicts(cls, vertices):
+        """
+        Builds a VertexTable from a list of per-vertex dicts. Vertex groups of None are treated as empty.
+        """
+        table = cls(num_vertices=len(vertices))
+        if not len(vertices):
+            return table
+        for key in vertices[0].keys():
+            if key in cls.vertex_group_keys:
+                continue
+            table.set_attribute(key, [vertex[key] for vertex in vertices])
+        if 'WeightedBoneID' in vertices[0]:
+            table.set_vertex_groups([vertex['WeightedBoneID'] for vertex in vertices],
+                                    [vertex.get('BoneWeight') for vertex in vertices])
+        return table
+
+    def __len__(self):
+        return self.num_vertices
+
+    def __iter__(self):
+        for idx in range(self.num_vertices):
+            yield VertexView(self, idx)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, (int, np.integer)):
+            if idx < 0:
+                idx += self.num_vertices
+            if not 0 <= idx < self.num_vertices:
+                raise IndexError(f"Vertex index {idx} is out of range for a table of {self.num_vertices} vertices.")
+            return VertexView(self, int(idx))
+        return self.take(idx)
+
+    def __setitem__(self, idx, vertex):
+        view = self[idx]
+        for key, value in list(vertex.items()):
+            view[key] = value
+
+    def __contains__(self, key):
+        return key in self.keys()
+
+    def keys(self):
+        keys = list(self.attributes.keys())
+        if self.has_vertex_groups:
+            keys.extend(self.vertex_group_keys)
+        return keys
+
+    @property
+    def has_vertex_groups(self):
+        return self.vertex_group_counts is not None
+
+    @property
+    def max_vertex_groups(self):
+        if not self.has_vertex_groups:
+            return 0
+        return int(np.max(self.vertex_group_counts, initial=0))
+
+    @property
+    def nbytes(self):
+        arrays = [*self.attributes.values(), self.bone_ids, self.bone_weights, self.vertex_group_counts]
+        return sum([array.nbytes for array in arrays if array is not None])
+
+    def set_attribute(self, key, data):
+        if key in self.vertex_group_keys:
+            raise KeyError(f"Vertex groups must be set with set_vertex_groups, not as the attribute '{key}'.")
+        data = np.array(data, dtype=np.float32)
+        if data.ndim == 1:
+            data = data.reshape((-1, 1))
+        if len(data) != self.num_vertices:
+            raise ValueError(f"Vertex attribute '{key}' has {len(data)} values, but the table has "
+                             f"{self.num_vertices} vertices.")
+        self.attributes[key] = data
+
+    def set_vertex_groups(self, bone_ids, bone_weights):
+        """
+        Sets the vertex groups of every vertex from a ragged list of bone ids and a ragged list of weights per
+        vertex. Entries of None are treated as empty lists.
+        """
+        bone_ids = [[] if ids is None else ids for ids in bone_ids]
+        bone_weights = [[] if weights is None else weights for weights in bone_weights]
+        counts = np.array([len(ids) for ids in bone_ids], dtype=np.int32)
+        weight_counts = np.array([len(weights) for weights in bone_weights], dtype=np.int32)
+        if len(counts) != self.num_vertices or len(weight_counts) != self.num_vertices:
+            raise ValueError(f"Vertex groups were given for {len(counts)} vertices, but the table has "
+                             f"{self.num_vertices} vertices.")
+        if np.any(counts != weight_counts):
+            idx = int(np.flatnonzero(counts != weight_counts)[0])
+            raise ValueError(f"Vertex {idx} has {counts[idx]} bone ids but {weight_counts[idx]} weights.")
+
+        width = int(np.max(counts, initial=0))
+        # Entries are filled in row-major order, so the mask selects each vertex's entries in the order given
+        mask = np.arange(width) < counts[:, np.newaxis]
+        self.bone_ids = np.zeros((self.num_vertices, width), dtype=np.int32)
+        self.bone_weights = np.zeros((self.num_vertices, width), dtype=np.float32)
+        if width > 0:
+            self.bone_ids[mask] = np.concatenate([np.asarray(ids, dtype=np.int32).ravel() for ids in bone_ids])
+            self.bone_weights[mask] = np.concatenate([np.asarray(weights, dtype=np.float32).ravel() for weights in bone_weights])
+        self.vertex_group_counts = counts
+
+    def set_vertex_group_arrays(self, bone_ids, bone_weights, mask=None):
+        """
+        Sets the vertex groups of every vertex from arrays of bone ids and weights of shape (num_vertices, width).
+        Entries outside 'mask', which defaults to the entries with non-zero weights, are removed, and the remaining
+        entries of each vertex are moved to the front in their original order.
+        """
+        bone_ids = np.asarray(bone_ids, dtype=np.int32)
+        bone_weights = np.asarray(bone_weights, dtype=np.float32)
+        if bone_ids.ndim == 1:
+            bone_ids = bone_ids.reshape((-1, 1))
+        if bone_weights.ndim == 1:
+            bone_weights = bone_weights.reshape((-1, 1))
+        if len(bone_ids) != self.num_vertices:
+            raise ValueError(f"Vertex groups were given for {len(bone_ids)} vertices, but the table has "
+                             f"{self.num_vertices} vertices.")
+        if bone_ids.shape != bone_weights.shape:
+            raise ValueError(f"Bone ids of shape {bone_ids.shape} do not match bone weights of shape "
+                             f"{bone_weights.shape}.")
+        mask = bone_weights != 0. if mask is None else np.asarray(mask, dtype=bool)
+
+        # A stable sort of the removed entries to the back keeps the order of the remaining entries
+        order = np.argsort(~mask, axis=1, kind='stable')
+        counts = np.sum(mask, axis=1).astype(np.int32)
+        width = int(np.max(counts, initial=0))
+        in_use = np.arange(width) < counts[:, np.newaxis]
+        self.bone_ids = np.where(in_use, np.take_along_axis(bone_ids, order, axis=1)[:, :width], 0)
+        self.bone_weights = np.where(in_use, np.take_along_axis(bone_weights, order, axis=1)[:, :width], 0.)
+        self.vertex_group_counts = counts
+
+    def get_vertex_group_mask(self):
+        """
+        Returns a boolean array of the same shape as 'bone_ids' that is True for the entries in use by each vertex.
+        """
+        return np.arange(self.bone_ids.shape[1]) < self.vertex_group_counts[:, np.newaxis]
+
+    def get_vertex_group_members(self, num_vertex_groups):
+        """
+        Returns a list of the vertex indices and weights of the vertices in each of 'num_vertex_groups' vertex groups,
+        in vertex order, reading the bone ids of each vertex as indices into the vertex groups.
+        """
+        if not self.has_vertex_groups:
+            return [([], []) for _ in range(num_vertex_groups)]
+
+        # Gather the (vertex, weight) pairs of every vertex group at once, in vertex order
+        vertex_indices, columns = np.nonzero(self.get_vertex_group_mask())
+        vertex_group_idxs = self.bone_ids[vertex_indices, columns]
+        weights = self.bone_weights[vertex_indices, columns]
+        if np.any(vertex_group_idxs >= num_vertex_groups):
+            raise IndexError(f"Mesh has vertices assigned to vertex group {np.max(vertex_group_idxs)}, but only "
+                             f"{num_vertex_groups} vertex groups.")
+        order = np.argsort(vertex_group_idxs, kind='stable')
+        bounds = np.searchsorted(vertex_group_idxs[order], np.arange(num_vertex_groups + 1))
+        return [(vertex_indices[order[lo_bnd:hi_bnd]].tolist(), weights[order[lo_bnd:hi_bnd]].tolist())
+                for lo_bnd, hi_bnd in zip(bounds, bounds[1:])]
+
+    def pad_vertex_groups(self, width):
+        """
+        Pads the vertex groups of every vertex with zero-weighted entries for bone 0 up to 'width' entries. Vertices
+        with more vertex groups than this are unchanged.
+        """
+        self.resize_vertex_groups(max(width, self.bone_ids.shape[1] if self.has_vertex_groups else 0))
+        self.vertex_group_counts = np.maximum(self.vertex_group_counts, width)
+
+    def normalise_vertex_weights(self):
+        """
+        Scales the weights of each vertex so that they sum to one. Vertices with no weight are left unchanged.
+        """
+        if not self.has_vertex_groups:
+            return
+        totals = np.sum(self.bone_weights, axis=1, keepdims=True)
+        np.divide(self.bone_weights, totals, out=self.bone_weights, where=totals > 0.)
+
+    def resize_vertex_groups(self, width):
+        """
+        Pads the vertex group arrays with zeros, or truncates them, to 'width' columns.
+        """
+        if not self.has_vertex_groups:
+            self.set_vertex_groups([[]] * self.num_vertices, [[]] * self.num_vertices)
+        current_width = self.bone_ids.shape[1]
+        if width > current_width:
+            padding = ((0, 0), (0, width - current_width))
+            self.bone_ids = np.pad(self.bone_ids, padding)
+            self.bone_weights = np.pad(self.bone_weights, padding)
+        else:
+            self.bone_ids = self.bone_ids[:, :width]
+            self.bone_weights = self.bone_weights[:, :width]
+            self.vertex_group_counts = np.minimum(self.vertex_group_counts, width)
+
+    def set_vertex_value(self, idx, key, value):
+        if key in self.vertex_group_keys:
+            value = [] if value is None else np.asarray(value).ravel()
+            if not self.has_vertex_groups or len(value) > self.bone_ids.shape[1]:
+                self.resize_vertex_groups(len(value))
+            target = self.bone_ids if key == 'WeightedBoneID' else self.bone_weights
+            target[idx, :len(value)] = value
+            target[idx, len(value):] = 0
+            self.vertex_group_counts[idx] = len(value)
+        else:
+            if key not in self.attributes:
+                self.attributes[key] = np.zeros((self.num_vertices, len(value)), dtype=np.float32)
+            self.attributes[key][idx] = value
+
+    def get_vertex_value(self, idx, key):
+        if key in self.attributes:
+            return self.attributes[key][idx]
+        elif key in self.vertex_group_keys and self.has_vertex_groups:
+            source = self.bone_ids if key == 'WeightedBoneID' else self.bone_weights
+            return source[idx, :self.vertex_group_counts[idx]]
+        raise KeyError(key)
+
+    def take(self, idxs):
+        """
+        Returns a new VertexTable containing the vertices at 'idxs', in that order.
+        """
+        idxs = np.arange(self.num_vertices)[idxs]
+        table = VertexTable(num_vertices=len(idxs))
+        table.attributes = {key: data[idxs] for key, data in self.attributes.items()}
+        if self.has_vertex_groups:
+            table.bone_ids = self.bone_ids[idxs]
+            table.bone_weights = self.bone_weights[idxs]
+            table.vertex_group_counts = self.vertex_group_counts[idxs]
+        return table
+
+    def copy(self):
+        return self.take(slice(None))
+
+    def to_dicts(self):
+        return [dict(vertex) for vertex in self]
+
+    def __repr__(self):
+        return f"VertexTable({self.num_vertices} vertices: {', '.join(self.keys())})"
+
+
+class VertexView(MutableMapping):
+    """
+    A dict-like view of a single vertex in a VertexTable. Values are views of the table's arrays.
+    """
+    def __init__(self, table, idx):
+        self.table = table
+        self.idx = idx
+
+    def __getitem__(self, key):
+        return self.table.get_vertex_value(self.idx, key)
+
+    def __setitem__(self, key, value):
+        self.table.set_vertex_value(self.idx, key, value)
+
+    def __delitem__(self, key):
+        raise TypeError("Attributes cannot be removed from a single vertex of a VertexTable.")
+
+    def __iter__(self):
+        return iter(self.table.keys())
+
+    def __len__(self):
+        return len(self.table.keys())
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+def as_vertex_table(vertices):
+    """
+    Returns 'vertices' as a VertexTable, converting it from a list of per-vertex dicts if necessary.
+    """
+    if isinstance(vertices, VertexTable):
+        return vertices
+    return VertexTable.from_dicts(vertices)
@@ -0,0 +1,52 @@
+import numpy as np
+
+
+def weld_loops(loop_vertex_idxs, loop_attributes):
+    """
+    Finds the loops of a mesh that can share a single exported vertex: the loops of the same mesh vertex with identical
+    values of every per-loop attribute. The attribute values should already be rounded, so that values which only
+    differ by floating-point noise are welded.
+
+    Inputs
+    ------
+    loop_vertex_idxs -- the index of the mesh vertex of each loop.
+    loop_attributes -- a list of arrays of shape (num_loops, num_elements) of per-loop attribute values.
+
+    Returns
+    ------
+    The loop that each exported vertex takes its attribute values from, with the exported vertices in the order that
+    the loops first use them, and the exported vertex of each loop.
+    """
+    loop_vertex_idxs = np.asarray(loop_vertex_idxs, dtype=np.int64)
+    keys = np.column_stack([loop_vertex_idxs, *[np.asarray(data, dtype=float) for data in loop_attributes]]).astype(float)
+    # Adding zero turns -0. into 0., which would otherwise give a different key
+    keys = np.ascontiguousarray(keys + 0.)
+
+    # Pack the values of each loop into a single opaque key, so that loops are compared with one byte comparison
+    packed_keys = keys.view(np.dtype((np.void, keys.dtype.itemsize * keys.shape[1]))).reshape(-1)
+    _, first_loops, loop_keys = np.unique(packed_keys, return_index=True, return_inverse=True)
+
+    order = np.argsort(first_loops)
+    new_idxs = np.empty_like(order)
+    new_idxs[order] = np.arange(len(order))
+    return first_loops[order], new_idxs[loop_keys.reshape(-1)]
+
+
+def assign_local_vertex_groups(vertices):
+    """
+    Replaces the bone ids in the vertex groups of a VertexTable with indices into a list of the bones used by the
+    vertices, in the order the vertices first use them.
+
+    Returns
+    ------
+    The list of bone ids used by the vertices.
+    """
+    if not vertices.has_vertex_groups:
+        return []
+    in_use = vertices.get_vertex_group_mask()
+    bone_ids, first_uses, local_idxs = np.unique(vertices.bone_ids[in_use], return_index=True, return_inverse=True)
+    order = np.argsort(first_uses)
+    new_idxs = np.empty_like(order)
+    new_idxs[order] = np.arange(len(order))
+    vertices.bone_ids[in_use] = new_idxs[local_idxs.reshape(-1)]
+    return bone_ids[order].tolist()